@@ -0,0 +1,290 @@
+"""
+Asyncio versions of Queries and MongoDBAggregations, to run many queries concurrently.
+
+AsyncQueries runs the SQL of mysql_queries.sql_query through an aiomysql pool and
+AsyncMongoDBAggregations the pipelines of mongodb_queries.build_pipeline through Motor. A single
+event loop keeps as many queries in flight as the concurrency allows, which is how a server is
+loaded by many clients, instead of waiting for every result before sending the next query.
+
+fan_out runs a list of calls, the Q1-Q7 suite or many parameterized Q2/Q3 calls, under a bounded
+semaphore and times every call. The runner reports the latency statistics of every query, as
+benchmark.summarize, next to the aggregate throughput in queries per second:
+
+    python async_queries.py -b mysql mongodb -p <password> -c 8 -r 20
+        --microorganisms MIC-64254-KRV MIC-17098-ZUZ --diseases "Respiratory infections" Tuberculosis
+
+aiomysql and motor are only needed by the backend that uses them.
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import pandas as pd
+
+from benchmark import MONGO_ARGUMENTS, QUERIES, QUERY_ARGUMENTS, summarize
+from id_codec import ID_MODES, encode_id
+from mongodb_queries import build_pipeline
+from mysql_queries import sql_query
+
+ASYNC_BACKENDS = ("mysql", "mongodb")
+
+
+class AsyncQueries:
+    """
+    Runs the seven MySQL queries on an aiomysql connection pool.
+
+    Attributes:
+        password (str): Password of the MySQL user.
+        database (str): Database to query.
+        id_mode (str): Storage of the identifiers, "char" or "int".
+        pool_size (int): Connections of the pool, the largest number of queries in flight.
+
+    Methods:
+        open(self): Creates the pool.
+        query(self, num_qry, *args): Runs a query and returns its rows.
+        close(self): Closes the pool.
+    """
+
+    name = "mysql"
+
+    def __init__(self, password: str, database: str, id_mode: str = "char", host: str = "localhost",
+                 user: str = "root", pool_size: int = 10) -> None:
+        if id_mode not in ID_MODES:
+            raise ValueError(f"Unknown id mode {id_mode!r}, expected one of {ID_MODES}")
+        self.password = password
+        self.database = database
+        self.id_mode = id_mode
+        self.host = host
+        self.user = user
+        self.pool_size = pool_size
+        self._pool = None
+
+    async def open(self) -> None:
+        try:
+            import aiomysql
+        except ImportError as err:
+            raise ImportError("AsyncQueries requires aiomysql (pip install aiomysql)") from err
+        self._pool = await aiomysql.create_pool(host=self.host, user=self.user, password=self.password,
+                                                db=self.database, minsize=1, maxsize=self.pool_size)
+
+    async def query(self, num_qry: int, *args) -> List[tuple]:
+        """
+        Runs one of the seven queries.
+
+        Args:
+            num_qry (int): Query number, 1 to 7.
+            *args: The microorganism ID of query 2 or the disease of query 3.
+
+        Returns:
+            list: The rows of the result.
+        """
+        if num_qry == 2 and self.id_mode == "int":
+            args = (encode_id(args[0]),)
+        async with self._pool.acquire() as connection:
+            async with connection.cursor() as cursor:
+                # without parameters the query is sent as is, so it needs no % escaping
+                await cursor.execute(sql_query(num_qry, self.id_mode), args or None)
+                return await cursor.fetchall()
+
+    async def close(self) -> None:
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+
+class AsyncMongoDBAggregations:
+    """
+    Runs the seven MongoDB aggregations with Motor.
+
+    Attributes:
+        mongo_uri (str): Connection string of the server.
+        db_name (str): Database to query.
+        collection_patients (str): Collection of queries 1 to 6.
+        collection_microorganisms (str): Collection of query 7.
+        pool_size (int): Connections of the client, the largest number of queries in flight.
+
+    Methods:
+        open(self): Creates the client.
+        query(self, num_qry, *args): Runs a query and returns its documents.
+        close(self): Closes the client.
+    """
+
+    name = "mongodb"
+
+    def __init__(self, mongo_uri: str, db_name: str, collection_patients: str = "Patients",
+                 collection_microorganisms: str = "Microorganism", pool_size: int = 10) -> None:
+        self.mongo_uri = mongo_uri
+        self.db_name = db_name
+        self.collection_patients = collection_patients
+        self.collection_microorganisms = collection_microorganisms
+        self.pool_size = pool_size
+        self._client = None
+
+    async def open(self) -> None:
+        try:
+            from motor.motor_asyncio import AsyncIOMotorClient
+        except ImportError as err:
+            raise ImportError("AsyncMongoDBAggregations requires motor (pip install motor)") from err
+        self._client = AsyncIOMotorClient(self.mongo_uri, maxPoolSize=self.pool_size)
+
+    async def query(self, num_qry: int, *args) -> List[Dict[str, Any]]:
+        """
+        Runs one of the seven aggregations.
+
+        Args:
+            num_qry (int): Query number, 1 to 7.
+            *args: Parameters of the query, see mongodb_queries.build_pipeline.
+
+        Returns:
+            list: The documents of the result.
+        """
+        collection = self.collection_microorganisms if num_qry == 7 else self.collection_patients
+        cursor = self._client[self.db_name][collection].aggregate(build_pipeline(num_qry, *args))
+        return await cursor.to_list(length=None)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+
+async def fan_out(calls: List[Tuple[str, Callable[[], Awaitable]]], concurrency: int = 8) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Runs calls concurrently, at most concurrency at a time.
+
+    Args:
+        calls (list): (label, function returning the awaitable of the call) pairs. The awaitables
+            are created once a slot is free, so the latencies do not include the wait for it.
+        concurrency (int): Size of the semaphore.
+
+    Returns:
+        tuple: One record per call (label, latency_ns, rows) in the order of calls, and the wall
+        time in seconds of the whole fan-out.
+    """
+    if concurrency < 1:
+        raise ValueError(f"The concurrency must be positive, got {concurrency}")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(label, call):
+        async with semaphore:
+            start = time.perf_counter_ns()
+            result = await call()
+            return {"label": label, "latency_ns": time.perf_counter_ns() - start, "rows": len(result)}
+
+    start = time.perf_counter()
+    records = await asyncio.gather(*(timed(label, call) for label, call in calls))
+    return list(records), time.perf_counter() - start
+
+
+def suite_calls(backend, queries=QUERIES, repetitions: int = 1, arguments: Dict[int, List[tuple]] = None) -> List[Tuple[str, Callable[[], Awaitable]]]:
+    """
+    Calls of a suite: every query repetitions times with each of its argument tuples.
+
+    Args:
+        backend: An AsyncQueries or AsyncMongoDBAggregations.
+        queries: Query numbers to run.
+        repetitions (int): Runs of every query and argument tuple.
+        arguments (dict): Query number to the list of its argument tuples, queries without an
+            entry run without arguments.
+    """
+    arguments = arguments or {}
+    calls = []
+    for _ in range(repetitions):
+        for num_qry in queries:
+            for args in arguments.get(num_qry, [()]):
+                calls.append((f"Q{num_qry}", lambda num_qry=num_qry, args=args: backend.query(num_qry, *args)))
+    return calls
+
+
+async def run_suite(backend, queries=QUERIES, repetitions: int = 10, concurrency: int = 8,
+                    arguments: Dict[int, List[tuple]] = None) -> pd.DataFrame:
+    """
+    Fans out a suite on an open backend and summarizes it.
+
+    Returns:
+        DataFrame: One row per query with the latency statistics of summarize and its throughput,
+        plus an "all" row with the aggregate queries per second of the run.
+    """
+    records, wall = await fan_out(suite_calls(backend, queries, repetitions, arguments), concurrency)
+    latencies = pd.DataFrame(records)
+    rows = []
+    for label, group in latencies.groupby("label", sort=False):
+        rows.append({"Backend": backend.name, "Query": label, "Concurrency": concurrency,
+                     **summarize(group["latency_ns"].tolist()), "queries_per_s": len(group) / wall})
+    rows.append({"Backend": backend.name, "Query": "all", "Concurrency": concurrency,
+                 **summarize(latencies["latency_ns"].tolist()), "queries_per_s": len(latencies) / wall})
+    print(f"{backend.name}: {len(latencies)} queries in {wall:.2f}s, {len(latencies) / wall:.1f} queries/s "
+          f"with concurrency {concurrency}")
+    return pd.DataFrame(rows)
+
+
+async def _run(backends: list, queries, repetitions: int, concurrency: int,
+               arguments: Dict[str, Dict[int, List[tuple]]]) -> pd.DataFrame:
+    reports = []
+    for backend in backends:
+        async with backend:
+            reports.append(await run_suite(backend, queries, repetitions, concurrency, arguments[backend.name]))
+    return pd.concat(reports, ignore_index=True)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the seven queries concurrently on MySQL and MongoDB.")
+    parser.add_argument('-b', '--backends', nargs='+', choices=ASYNC_BACKENDS, default=list(ASYNC_BACKENDS),
+                        help='Backends to run')
+    parser.add_argument('-q', '--queries', nargs='+', type=int, choices=QUERIES, default=list(QUERIES),
+                        help='Queries to run')
+    parser.add_argument('-r', '--repetitions', type=int, default=10, help='Runs of every query and parameter')
+    parser.add_argument('-c', '--concurrency', type=int, default=8, help='Queries in flight at once')
+    parser.add_argument('--microorganisms', nargs='+', default=list(QUERY_ARGUMENTS[2]),
+                        help='Microorganism IDs query 2 runs with')
+    parser.add_argument('--diseases', nargs='+', default=list(QUERY_ARGUMENTS[3]),
+                        help='Diseases query 3 runs with')
+    parser.add_argument('-p', '--password', type=str, help='MySQL password')
+    parser.add_argument('-d', '--database', type=str, default='microbiomeDB', help='MySQL database')
+    parser.add_argument('--id-mode', choices=ID_MODES, default='char', help='Identifier storage of the MySQL schema')
+    parser.add_argument('--mongo-uri', type=str, default='mongodb://localhost:27017', help='MongoDB URI')
+    parser.add_argument('--mongo-db', type=str, default='BDB2023', help='MongoDB database')
+    parser.add_argument('-o', '--output', type=str,
+                        default=os.path.join("query_optimization", "async_throughput.csv"),
+                        help='CSV receiving the latencies and throughput')
+    args = parser.parse_args()
+
+    parameterized = {2: [(microorganism,) for microorganism in args.microorganisms],
+                     3: [(disease,) for disease in args.diseases]}
+    arguments = {"mysql": parameterized,
+                 "mongodb": {**parameterized, 6: [MONGO_ARGUMENTS[6]]}}
+    backends = []
+    if "mysql" in args.backends:
+        if args.password is None:
+            parser.error("the mysql backend needs --password")
+        backends.append(AsyncQueries(args.password, args.database, args.id_mode, pool_size=args.concurrency))
+    if "mongodb" in args.backends:
+        backends.append(AsyncMongoDBAggregations(args.mongo_uri, args.mongo_db, pool_size=args.concurrency))
+
+    report = asyncio.run(_run(backends, args.queries, args.repetitions, args.concurrency, arguments))
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    report.to_csv(args.output, index=False)
+    print(report[["Backend", "Query", "p50_ms", "p95_ms", "queries_per_s"]].to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
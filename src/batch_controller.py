@@ -0,0 +1,219 @@
+"""
+Batch sizing for the bulk loads of DbCreation.
+
+A batch is the unit of generation and the unit of transaction: its rows are inserted and committed
+together with its checkpoint. Small batches pay the commit (log flush) too often, large ones build
+statements that exceed max_allowed_packet and hold locks for seconds. The controller picks the
+number of samples of the next batch from the rows and bytes the previous batches produced per
+sample, caps it by the packet size and, when a commit latency target is set, grows or shrinks it
+multiplicatively after every commit. The packet cap only applies once a batch has been measured,
+so statement_slices splits the statements of any batch, the first one included, that would still
+exceed the packet.
+"""
+
+import time
+from typing import Dict, List
+
+import numpy as np
+
+# share of max_allowed_packet a single multi-row statement may take, the rest is protocol overhead
+_PACKET_SHARE = 0.8
+# multiplicative steps of the commit latency loop
+_GROW = 1.25
+_SHRINK = 0.5
+# weight of the last batch in the rows and bytes per sample estimates
+_SMOOTHING = 0.3
+# bytes of SQL text around every value of a multi-row statement: quotes, comma and parentheses
+_VALUE_OVERHEAD = 4
+
+
+def payload_bytes(columns) -> int:
+    """
+    Estimates the bytes a batch sends to the server.
+
+    Fixed width text columns count their width, object columns the length of every value and the
+    numeric and date columns 8 bytes per value.
+
+    Args:
+        columns: A dictionary of column arrays or a DataFrame.
+
+    Returns:
+        int: Approximate payload size.
+    """
+    total = 0
+    for name in columns:
+        values = np.asarray(columns[name])
+        if values.dtype.kind == "U":
+            total += values.size * values.dtype.itemsize // 4
+        elif values.dtype.kind in "OS":
+            total += int(np.char.str_len(values.astype(str)).sum())
+        else:
+            total += values.size * 8
+    return total
+
+
+def statement_slices(columns, max_packet: int = None) -> List[slice]:
+    """
+    Splits the rows of a batch into slices whose multi-row statements fit in max_allowed_packet.
+
+    The controller sizes the batches from the statements of the previous ones, so the first batch of
+    a load, or one whose rows are larger than estimated, could still exceed the packet. Its rows are
+    sent in several statements instead, within the same transaction.
+
+    Args:
+        columns: A dictionary of column arrays or a DataFrame.
+        max_packet (int): max_allowed_packet of the server, None to send the batch in one statement.
+
+    Returns:
+        list: Slices of the rows, one per statement.
+    """
+    names = list(columns)
+    count = len(columns[names[0]]) if names else 0
+    if not max_packet or count == 0:
+        return [slice(0, count)]
+    row_bytes = payload_bytes(columns) / count + _VALUE_OVERHEAD * len(names)
+    rows = max(1, int(_PACKET_SHARE * max_packet / row_bytes))
+    return [slice(start, start + rows) for start in range(0, count, rows)]
+
+
+class BatchSizeController:
+    """
+    Chooses the number of samples of every batch of a load and records its throughput.
+
+    Without targets the batch size stays at its initial value, which keeps the generated data of a
+    seed identical to the fixed size loads.
+
+    Attributes:
+        batch_size (int): Samples of the next batch.
+        min_size (int): Smallest batch size.
+        max_size (int): Largest batch size.
+        target_rows (int): Rows per transaction to aim for, over all the tables.
+        target_bytes (int): Payload bytes per transaction to aim for.
+        target_commit (float): Commit latency in seconds to steer towards.
+        max_packet (int): max_allowed_packet of the server, caps the largest multi-row statement.
+        history (list): One telemetry record per committed batch.
+
+    Methods:
+        next_size(self, remaining): Number of samples of the next batch.
+        record(self, samples, rows, nbytes, statement_bytes, seconds, commit_seconds): Updates the estimates and the batch size.
+        summary(self): Text with the throughput of the last batch.
+    """
+
+    def __init__(self, batch_size: int = 100, min_size: int = 10, max_size: int = 100000,
+                 target_rows: int = None, target_bytes: int = None, target_commit: float = None,
+                 max_packet: int = None) -> None:
+        """
+        Initializes the controller.
+
+        Args:
+            batch_size (int): Samples of the first batch.
+            min_size (int): Smallest batch size.
+            max_size (int): Largest batch size.
+            target_rows (int): Rows per transaction to aim for.
+            target_bytes (int): Payload bytes per transaction to aim for.
+            target_commit (float): Commit latency in seconds to steer towards.
+            max_packet (int): max_allowed_packet of the server, None when statements are not limited
+                by it (row by row inserts, LOAD DATA streams the file).
+        """
+        if not 0 < min_size <= batch_size <= max_size:
+            raise ValueError(f"Batch size {batch_size} out of the range [{min_size}, {max_size}]")
+        self.batch_size = batch_size
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_rows = target_rows
+        self.target_bytes = target_bytes
+        self.target_commit = target_commit
+        self.max_packet = max_packet
+        self.history = []
+        self._rows_per_sample = None
+        self._bytes_per_sample = None
+        self._statement_bytes_per_sample = None
+
+    def next_size(self, remaining: int) -> int:
+        """
+        Number of samples of the next batch.
+
+        Args:
+            remaining (int): Samples left to insert.
+
+        Returns:
+            int: The batch size, never more than remaining.
+        """
+        return max(1, min(remaining, self._bounded(self.batch_size)))
+
+    def _bounded(self, size: float) -> int:
+        """
+        Caps a batch size by the row and byte targets, the packet size and the size range.
+        """
+        if self.target_rows and self._rows_per_sample:
+            size = min(size, self.target_rows / self._rows_per_sample)
+        if self.target_bytes and self._bytes_per_sample:
+            size = min(size, self.target_bytes / self._bytes_per_sample)
+        if self.max_packet and self._statement_bytes_per_sample:
+            size = min(size, _PACKET_SHARE * self.max_packet / self._statement_bytes_per_sample)
+        return int(min(self.max_size, max(self.min_size, size)))
+
+    def record(self, samples: int, rows: int, nbytes: int, statement_bytes: int,
+               seconds: float, commit_seconds: float) -> Dict[str, float]:
+        """
+        Updates the per sample estimates with a committed batch and adapts the batch size.
+
+        The size grows towards the row and byte targets and, with a commit latency target, is halved
+        when a commit takes more than 1.5 times the target and grown by a quarter when it takes less
+        than half of it.
+
+        Args:
+            samples (int): Samples of the batch.
+            rows (int): Rows inserted over all the tables.
+            nbytes (int): Payload bytes of the batch.
+            statement_bytes (int): Payload bytes of its largest statement.
+            seconds (float): Time spent generating and inserting the batch, commit included.
+            commit_seconds (float): Time spent in the commit.
+
+        Returns:
+            dict: The telemetry record of the batch.
+        """
+        def smooth(estimate, value):
+            return value if estimate is None else (1 - _SMOOTHING) * estimate + _SMOOTHING * value
+
+        self._rows_per_sample = smooth(self._rows_per_sample, rows / samples)
+        self._bytes_per_sample = smooth(self._bytes_per_sample, nbytes / samples)
+        self._statement_bytes_per_sample = smooth(self._statement_bytes_per_sample, statement_bytes / samples)
+
+        if self.target_commit:
+            if commit_seconds > 1.5 * self.target_commit:
+                self.batch_size *= _SHRINK
+            elif commit_seconds < 0.5 * self.target_commit:
+                self.batch_size *= _GROW
+        elif self.target_rows or self.target_bytes:
+            # ramp up until the targets bound the size
+            self.batch_size *= _GROW
+        self.batch_size = self._bounded(self.batch_size)
+
+        record = {
+            "timestamp": time.time(),
+            "samples": samples,
+            "rows": rows,
+            "bytes": nbytes,
+            "seconds": seconds,
+            "commit_seconds": commit_seconds,
+            "rows_per_second": rows / seconds if seconds else 0.0,
+            "bytes_per_second": nbytes / seconds if seconds else 0.0,
+            "next_batch_size": self.batch_size,
+        }
+        self.history.append(record)
+        return record
+
+    def summary(self) -> Dict[str, str]:
+        """
+        Throughput of the last committed batch, formatted for a progress bar.
+        """
+        if not self.history:
+            return {}
+        last = self.history[-1]
+        return {
+            "batch": str(last["samples"]),
+            "rows/s": f"{last['rows_per_second']:.0f}",
+            "MB/s": f"{last['bytes_per_second'] / 1e6:.2f}",
+            "commit": f"{last['commit_seconds'] * 1000:.0f}ms",
+        }
@@ -0,0 +1,475 @@
+"""
+Benchmark harness that runs the seven queries against MySQL, MongoDB and the XML document with the
+same methodology.
+
+Every repetition is split into four phases timed with perf_counter_ns:
+
+    connect  obtaining a connection (MySQL pool checkout, MongoDB database handle, XML parse)
+    execute  running the query (cursor.execute, aggregate up to the first batch, XPath evaluation,
+             iterparse pass of xml_queries)
+    fetch    retrieving the result rows (fetchall, draining the cursor, walking the matched nodes)
+    decode   turning the rows into a DataFrame, the form every module exports
+
+Each query is first run warmup times without recording, then repetitions times. The report has
+the mean, min, p50, p95, p99 and max milliseconds of every phase and of the whole repetition and,
+when plans are captured, the index, rows examined and returned and plan fingerprint of the query
+(see query_plans).
+"""
+
+import argparse
+import os
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from id_codec import ID_MODES, encode_id
+from query_plans import mongo_plan, mysql_plan
+
+PHASES = ("connect", "execute", "fetch", "decode")
+BACKENDS = ("mysql", "mongodb", "xml", "xml_stream", "xml_index")
+QUERIES = tuple(range(1, 8))
+# Parameters of the queries that take them, shared by the three backends
+QUERY_ARGUMENTS = {2: ("MIC-64254-KRV",), 3: ("Respiratory infections",)}
+# The MongoDB version of query 6 takes the disease and the kingdom of its microorganism
+MONGO_ARGUMENTS = {**QUERY_ARGUMENTS, 6: ("Hepatitis B", "Virus")}
+
+
+def summarize(samples_ns: List[int]) -> Dict[str, float]:
+    """
+    Latency statistics of a list of nanosecond timings.
+
+    Returns:
+        dict: Number of samples and mean, min, p50, p95, p99 and max in milliseconds.
+    """
+    values = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"n": len(values), "mean_ms": values.mean(), "min_ms": values.min(),
+            "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "max_ms": values.max()}
+
+
+class PhaseTimer:
+    """
+    Accumulates the nanoseconds spent in each phase of one repetition.
+
+    Attributes:
+        times (dict): Phase name to nanoseconds.
+    """
+
+    def __init__(self) -> None:
+        self.times = dict.fromkeys(PHASES, 0)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.times[name] += time.perf_counter_ns() - start
+
+
+class MySQLBackend:
+    """
+    Runs the queries of mysql_queries.sql_query through the shared connection pool. With summary
+    the aggregate queries read the summary tables and the backend reports as "mysql_summary".
+    """
+
+    name = "mysql"
+
+    def __init__(self, password: str, database: str, id_mode: str = "char",
+                 arguments: Dict[int, tuple] = None, summary: bool = False) -> None:
+        if id_mode not in ID_MODES:
+            raise ValueError(f"Unknown id mode {id_mode!r}, expected one of {ID_MODES}")
+        self.password = password
+        self.database = database
+        self.id_mode = id_mode
+        self.summary = summary
+        if summary:
+            self.name = "mysql_summary"
+        self.arguments = QUERY_ARGUMENTS if arguments is None else arguments
+
+    def _arguments(self, num_qry: int) -> tuple:
+        arguments = self.arguments.get(num_qry, ())
+        if num_qry == 2 and self.id_mode == "int":
+            arguments = (encode_id(arguments[0]),)
+        return arguments
+
+    def plan(self, num_qry: int, analyze: bool = False) -> Dict[str, object]:
+        import mysql_pool
+        from mysql_queries import sql_query
+
+        connection = mysql_pool.connect(self.password, self.database)
+        cursor = connection.cursor()
+        try:
+            return mysql_plan(cursor, sql_query(num_qry, self.id_mode, self.summary), self._arguments(num_qry), analyze)
+        finally:
+            cursor.close()
+            connection.close()
+
+    def run(self, num_qry: int, timer: PhaseTimer) -> pd.DataFrame:
+        import mysql_pool
+        from mysql_queries import sql_query
+
+        arguments = self._arguments(num_qry)
+        with timer.phase("connect"):
+            connection = mysql_pool.connect(self.password, self.database)
+        cursor = connection.cursor()
+        try:
+            with timer.phase("execute"):
+                cursor.execute(sql_query(num_qry, self.id_mode, self.summary), arguments)
+            with timer.phase("fetch"):
+                rows = cursor.fetchall()
+            with timer.phase("decode"):
+                return pd.DataFrame.from_records(rows, columns=[d[0] for d in cursor.description])
+        finally:
+            cursor.close()
+            connection.close()
+
+
+class MongoBackend:
+    """
+    Runs the pipelines of mongodb_queries.build_pipeline. The client keeps its own connection pool,
+    so the connect phase of a repetition only resolves the database and collection handles.
+    """
+
+    name = "mongodb"
+
+    def __init__(self, mongo_uri: str, db_name: str, collection_patients: str = "Patients",
+                 collection_microorganisms: str = "Microorganism", arguments: Dict[int, tuple] = None) -> None:
+        from pymongo import MongoClient
+
+        self.client = MongoClient(mongo_uri)
+        self.db_name = db_name
+        self.collection_patients = collection_patients
+        self.collection_microorganisms = collection_microorganisms
+        self.arguments = MONGO_ARGUMENTS if arguments is None else arguments
+
+    def _collection(self, num_qry: int):
+        name = self.collection_microorganisms if num_qry == 7 else self.collection_patients
+        return self.client.get_database(self.db_name).get_collection(name)
+
+    def plan(self, num_qry: int, analyze: bool = False) -> Dict[str, object]:
+        from mongodb_queries import build_pipeline
+
+        # executionStats always runs the pipeline, analyze makes no difference
+        return mongo_plan(self._collection(num_qry), build_pipeline(num_qry, *self.arguments.get(num_qry, ())))
+
+    def run(self, num_qry: int, timer: PhaseTimer) -> pd.DataFrame:
+        from mongodb_queries import build_pipeline
+
+        pipeline = build_pipeline(num_qry, *self.arguments.get(num_qry, ()))
+        with timer.phase("connect"):
+            collection = self._collection(num_qry)
+        with timer.phase("execute"):
+            cursor = collection.aggregate(pipeline)
+        with timer.phase("fetch"):
+            documents = list(cursor)
+        with timer.phase("decode"):
+            return pd.DataFrame(documents)
+
+
+def _xml_text(element, path: str) -> str:
+    return element.findtext(path)
+
+
+class XmlBackend:
+    """
+    Evaluates the seven queries over the XML document with lxml XPath. Every query is an XPath
+    expression, timed as the execute phase, and a reduction of the matched elements to rows, timed
+    as the fetch phase.
+
+    Attributes:
+        path (str): The XML document.
+        reparse (bool): Parses the document in the connect phase of every repetition, as doc()
+            does in an XQuery engine. Otherwise the tree is parsed once and reused.
+    """
+
+    name = "xml"
+
+    def __init__(self, path: str, reparse: bool = False, arguments: Dict[int, tuple] = None) -> None:
+        self.path = path
+        self.reparse = reparse
+        self.arguments = QUERY_ARGUMENTS if arguments is None else arguments
+        self._tree = None
+
+    def run(self, num_qry: int, timer: PhaseTimer) -> pd.DataFrame:
+        from lxml import etree
+
+        with timer.phase("connect"):
+            if self._tree is None or self.reparse:
+                self._tree = etree.parse(self.path)
+        select, reduce, columns = _XML_QUERIES[num_qry]
+        with timer.phase("execute"):
+            matched = select(self._tree, *self.arguments.get(num_qry, ()))
+        with timer.phase("fetch"):
+            rows = reduce(matched)
+        with timer.phase("decode"):
+            return pd.DataFrame.from_records(rows, columns=columns)
+
+
+class XmlStreamBackend:
+    """
+    Evaluates the seven queries with xml_queries, one iterparse pass with hash aggregation per
+    repetition. The pass is timed as the execute phase and the reduction of the aggregation to
+    rows as the fetch phase, there is no tree to keep between repetitions.
+
+    Attributes:
+        path (str): The XML document.
+    """
+
+    name = "xml_stream"
+
+    def __init__(self, path: str, arguments: Dict[int, tuple] = None) -> None:
+        self.path = path
+        self.arguments = QUERY_ARGUMENTS if arguments is None else arguments
+
+    def run(self, num_qry: int, timer: PhaseTimer) -> pd.DataFrame:
+        from xml_queries import COLUMNS, XmlQueries
+
+        with timer.phase("execute"):
+            aggregation = XmlQueries(self.path, self.arguments).aggregate([num_qry])[num_qry]
+        with timer.phase("fetch"):
+            rows = aggregation.rows()
+        with timer.phase("decode"):
+            return pd.DataFrame.from_records(rows, columns=COLUMNS[num_qry])
+
+
+class XmlIndexBackend(XmlStreamBackend):
+    """
+    Answers Q2 and Q3 through the byte offset index of xml_index, parsing only the matching
+    <patient> elements, and the other queries with the single pass of XmlStreamBackend. Loading the
+    index and mapping the document is timed as the connect phase of the first repetition, parsing
+    the matching elements as the execute phase, reading their rows as the fetch phase and building
+    the DataFrame as the decode phase.
+
+    Attributes:
+        path (str): The XML document, indexed in <path>.idx.json.
+    """
+
+    name = "xml_index"
+
+    def __init__(self, path: str, arguments: Dict[int, tuple] = None) -> None:
+        super().__init__(path, arguments)
+        self._index = None
+
+    def run(self, num_qry: int, timer: PhaseTimer) -> pd.DataFrame:
+        if num_qry not in (2, 3):
+            return super().run(num_qry, timer)
+        from xml_index import XmlIndex, q2_rows, q3_rows
+        from xml_queries import COLUMNS
+
+        with timer.phase("connect"):
+            if self._index is None:
+                self._index = XmlIndex(self.path)
+        with timer.phase("execute"):
+            if num_qry == 2:
+                patients = self._index.lookup("Microorganism_ID", *self.arguments[2])
+            else:
+                patients = self._index.lookup("Disease", *self.arguments[3])
+        with timer.phase("fetch"):
+            rows = q2_rows(patients, *self.arguments[2]) if num_qry == 2 else q3_rows(patients)
+        with timer.phase("decode"):
+            return pd.DataFrame.from_records(rows, columns=COLUMNS[num_qry])
+
+
+_MICROORGANISMS = "/microbiome/patient/sample_list/sample/microorganism_list/microorganism"
+
+
+def _xml_q1(matched):
+    counts = [(_xml_text(patient, "Patient_ID"),
+               len(set(patient.xpath("sample_list/sample/microorganism_list/microorganism/Microorganism_ID/text()"))))
+              for patient in matched]
+    return sorted(counts, key=lambda row: row[1], reverse=True)[:10]
+
+
+def _xml_q2(matched):
+    rows = [(_xml_text(microorganism.getparent().getparent(), "Sample_ID"), int(_xml_text(microorganism, "qPCR")))
+            for microorganism in matched]
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def _xml_q3(matched):
+    rows = [(_xml_text(patient, "Patient_ID"), _xml_text(sample, "Sample_ID"), _xml_text(sample, "Date"),
+             _xml_text(sample, "Body_Part"), _xml_text(sample, "Sample_Type"))
+            for patient in matched for sample in patient.iterfind("sample_list/sample")]
+    return sorted(rows, key=lambda row: row[2])
+
+
+def _xml_q5(matched):
+    groups = defaultdict(lambda: [0, 0, 0])
+    for microorganism in matched:
+        qpcr = int(_xml_text(microorganism, "qPCR"))
+        group = groups[(_xml_text(microorganism, "Microorganism_ID"),
+                        _xml_text(microorganism.getparent().getparent(), "Sample_Type"))]
+        group[0] += 1
+        group[1] += qpcr
+        group[2] += qpcr * qpcr
+    rows = []
+    for (microorganism_id, sample_type), (count, total, squares) in groups.items():
+        mean = total / count
+        rows.append((microorganism_id, sample_type, count, mean, max(squares / count - mean * mean, 0.0) ** 0.5))
+    return sorted(rows, key=lambda row: row[0], reverse=True)
+
+
+def _xml_q6(matched):
+    return [(_xml_text(patient, "Patient_ID"),
+             max(int(q) for q in patient.xpath("sample_list/sample/microorganism_list/microorganism"
+                                               "[Species='Hepatitis B virus']/qPCR/text()")))
+            for patient in matched]
+
+
+def _xml_q7(matched):
+    microorganisms = {_xml_text(m, "Microorganism_ID"): (_xml_text(m, "Species"), int(_xml_text(m, "Seq_length")))
+                      for m in matched}
+    species = defaultdict(list)
+    for name, length in microorganisms.values():
+        species[name].append(length)
+    return [(name, len(lengths), sum(lengths) / len(lengths)) for name, lengths in species.items() if len(lengths) > 1]
+
+
+# query number -> (XPath selection, reduction to rows, column names)
+_XML_QUERIES: Dict[int, Tuple[Callable, Callable, List[str]]] = {
+    1: (lambda tree: tree.xpath("/microbiome/patient"), _xml_q1, ["Patient_ID", "Num_Microorganisms"]),
+    2: (lambda tree, microorganism_id: tree.xpath(f"{_MICROORGANISMS}[Microorganism_ID=$id]", id=microorganism_id),
+        _xml_q2, ["Sample_ID", "qPCR"]),
+    3: (lambda tree, disease: tree.xpath("/microbiome/patient[Disease=$disease]", disease=disease),
+        _xml_q3, ["Patient_ID", "Sample_ID", "Date", "Body_Part", "Sample_Type"]),
+    4: (lambda tree: tree.xpath("/microbiome/patient/sample_list/sample/Sample_Type/text()"),
+        lambda types: Counter(types).most_common(), ["Sample_Type", "Sample_Count"]),
+    5: (lambda tree: tree.xpath(_MICROORGANISMS), _xml_q5,
+        ["Microorganism_ID", "Sample_Type", "Sample_Count", "avg_qPCR", "stddev_qPCR"]),
+    6: (lambda tree: tree.xpath("/microbiome/patient[Disease='Hepatitis B']"
+                                "[sample_list/sample/microorganism_list/microorganism/Species='Hepatitis B virus']"),
+        _xml_q6, ["Patient_ID", "Max_qPCR"]),
+    7: (lambda tree: tree.xpath(_MICROORGANISMS), _xml_q7, ["Species", "Count", "avg_SeqLength"]),
+}
+
+
+class Benchmark:
+    """
+    Runs the queries of one or more backends with warmup and collects per phase latencies.
+
+    Attributes:
+        backends (list): Objects with a name and a run(num_qry, timer) method returning a DataFrame,
+            and optionally a plan(num_qry, analyze) method returning the fields of query_plans.
+        warmup (int): Unrecorded runs of every query before the measured ones.
+        repetitions (int): Measured runs of every query.
+        capture_plans (bool): Adds the plan of every query, captured after its timings, to its rows.
+        analyze (bool): Captures MySQL plans with EXPLAIN ANALYZE instead of the estimates only.
+
+    Methods:
+        measure(self, backend, num_qry): Timings in nanoseconds of every phase of every repetition.
+        run(self, queries): Latency statistics of every backend, query and phase.
+    """
+
+    def __init__(self, backends: list, warmup: int = 3, repetitions: int = 30,
+                 capture_plans: bool = False, analyze: bool = False) -> None:
+        if repetitions < 1 or warmup < 0:
+            raise ValueError("repetitions must be positive and warmup non negative")
+        self.backends = backends
+        self.warmup = warmup
+        self.repetitions = repetitions
+        self.capture_plans = capture_plans
+        self.analyze = analyze
+
+    def measure(self, backend, num_qry: int) -> Tuple[Dict[str, List[int]], int]:
+        """
+        Runs a query warmup + repetitions times.
+
+        Returns:
+            tuple: Phase name, plus "total", to the nanoseconds of every measured repetition, and
+            the number of rows of the result.
+        """
+        samples = {phase: [] for phase in PHASES + ("total",)}
+        rows = 0
+        for repetition in range(self.warmup + self.repetitions):
+            timer = PhaseTimer()
+            start = time.perf_counter_ns()
+            result = backend.run(num_qry, timer)
+            total = time.perf_counter_ns() - start
+            rows = len(result)
+            if repetition < self.warmup:
+                continue
+            for phase, elapsed in timer.times.items():
+                samples[phase].append(elapsed)
+            samples["total"].append(total)
+        return samples, rows
+
+    def run(self, queries=QUERIES) -> pd.DataFrame:
+        """
+        Measures every query on every backend.
+
+        Args:
+            queries: Query numbers to run.
+
+        Returns:
+            DataFrame: One row per backend, query and phase with the statistics of summarize.
+        """
+        records = []
+        for backend in self.backends:
+            for num_qry in queries:
+                timings, rows = self.measure(backend, num_qry)
+                plan = {}
+                if self.capture_plans and hasattr(backend, "plan"):
+                    # the plan is captured after the timings so explaining does not warm the measured runs
+                    plan = dict(backend.plan(num_qry, self.analyze), rows_returned=rows)
+                for phase, samples in timings.items():
+                    records.append({"Backend": backend.name, "Query": f"Q{num_qry}", "Phase": phase,
+                                    **summarize(samples), **plan})
+                total = records[-1]
+                print(f"{backend.name} Q{num_qry}: p50 {total['p50_ms']:.2f} ms, "
+                      f"p95 {total['p95_ms']:.2f} ms, p99 {total['p99_ms']:.2f} ms")
+        return pd.DataFrame(records)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the seven queries on MySQL, MongoDB and XML.")
+    parser.add_argument('-b', '--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS),
+                        help='Backends to benchmark')
+    parser.add_argument('-q', '--queries', nargs='+', type=int, choices=QUERIES, default=list(QUERIES),
+                        help='Queries to run')
+    parser.add_argument('--warmup', type=int, default=3, help='Unrecorded runs of every query')
+    parser.add_argument('-r', '--repetitions', type=int, default=30, help='Measured runs of every query')
+    parser.add_argument('-p', '--password', type=str, help='MySQL password')
+    parser.add_argument('-d', '--database', type=str, default='microbiomeDB', help='MySQL database')
+    parser.add_argument('--id-mode', choices=ID_MODES, default='char', help='Identifier storage of the MySQL schema')
+    parser.add_argument('--summary', action='store_true', help='Answer Q1, Q4, Q5 and Q7 from the MySQL summary tables')
+    parser.add_argument('--mongo-uri', type=str, default='mongodb://localhost:27017', help='MongoDB URI')
+    parser.add_argument('--mongo-db', type=str, default='BDB2023', help='MongoDB database')
+    parser.add_argument('--xml', type=str, default=os.path.join(os.getcwd(), "..", "data-files", "microbiome.xml"),
+                        help='XML document')
+    parser.add_argument('--reparse', action='store_true', help='Parse the XML document in every repetition')
+    parser.add_argument('--plans', action='store_true',
+                        help='Record the index, rows examined and returned and fingerprint of every plan')
+    parser.add_argument('--analyze', action='store_true', help='Capture MySQL plans with EXPLAIN ANALYZE')
+    parser.add_argument('-o', '--output', type=str, default='query_optimization/benchmark_results.csv',
+                        help='CSV file receiving the statistics')
+    args = parser.parse_args()
+
+    backends = []
+    if "mysql" in args.backends:
+        if not args.password:
+            parser.error("the mysql backend needs --password")
+        backends.append(MySQLBackend(args.password, args.database, args.id_mode, summary=args.summary))
+    if "mongodb" in args.backends:
+        backends.append(MongoBackend(args.mongo_uri, args.mongo_db))
+    if "xml" in args.backends:
+        backends.append(XmlBackend(args.xml, reparse=args.reparse))
+    if "xml_stream" in args.backends:
+        backends.append(XmlStreamBackend(args.xml))
+    if "xml_index" in args.backends:
+        backends.append(XmlIndexBackend(args.xml))
+
+    results = Benchmark(backends, warmup=args.warmup, repetitions=args.repetitions,
+                        capture_plans=args.plans, analyze=args.analyze).run(args.queries)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    results.to_csv(args.output, index=False)
+    print(f"Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Streaming writers that build benchmark datasets straight from the DataGenerator, without filling
+MySQL first and migrating it afterwards.
+
+Each batch is generated once with the columnar generator and handed to every requested format:
+
+    - csv: one file per table (patient, sample, microorganism, sample_microorganism), appended by chunks.
+    - parquet: one file per table, one row group per batch (requires pyarrow).
+    - ndjson: one nested patient document per line, with the layout of patients_data.json, plus
+      microorganisms.ndjson.
+    - xml: the <microbiome> document of microbiome.xml, written element by element.
+
+Only one batch is kept in memory at any time.
+"""
+
+import json
+import os
+from contextlib import ExitStack
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+from tqdm import tqdm
+
+from mysql_dbCreation import DataGenerator
+
+FORMATS = ("csv", "parquet", "ndjson", "xml")
+TABLES = ("patient", "sample", "microorganism", "sample_microorganism")
+
+
+def _rows(columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """
+    Converts column arrays into a list of row dictionaries with plain Python values.
+    """
+    names = list(columns)
+    return [dict(zip(names, values)) for values in zip(*(columns[name].tolist() for name in names))]
+
+
+def _group_bounds(keys: np.ndarray) -> np.ndarray:
+    """
+    Returns the start offsets of the runs of equal consecutive keys, followed by len(keys).
+    """
+    changes = np.flatnonzero(keys[1:] != keys[:-1]) + 1
+    return np.concatenate(([0], changes, [keys.size]))
+
+
+def iter_patients(tables: Dict[str, Dict[str, np.ndarray]]) -> Iterator[Tuple[Dict[str, Any], List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]]]:
+    """
+    Nests a generated batch. The columnar generator keeps the samples of a patient and the
+    occurrences of a sample next to each other, so the nesting is a single linear scan.
+
+    Args:
+        tables (dict): A batch as returned by DataGenerator.generate_columnar_data.
+
+    Yields:
+        tuple: The patient row and the list of its (sample row, microorganism occurrence rows).
+    """
+    samples = _rows(tables["sample"])
+    occurrences = _rows(tables["sample_microorganism"])
+    sample_bounds = _group_bounds(tables["sample"]["Patient_ID"])
+    occurrence_bounds = _group_bounds(tables["sample_microorganism"]["Sample_ID"])
+    for p, patient in enumerate(_rows(tables["patient"])):
+        nested = [(samples[s], occurrences[occurrence_bounds[s]:occurrence_bounds[s + 1]])
+                  for s in range(sample_bounds[p], sample_bounds[p + 1])]
+        yield patient, nested
+
+
+def patient_document(patient: Dict[str, Any], samples) -> Dict[str, Any]:
+    """
+    Builds the nested patient document stored in MongoDB (see mongodb_migration.Patient.to_dict).
+    """
+    return {
+        "patient_id": patient["Patient_ID"],
+        "age": patient["Age"],
+        "birth_type": patient["Birth_Type"],
+        "location": patient["Location"],
+        "lifestyle": patient["Lifestyle"],
+        "disease": patient["Disease"],
+        "sex": patient["Sex"],
+        "samples": [
+            {
+                "sample_id": sample["Sample_ID"],
+                "date": sample["Date"].isoformat(),
+                "body_part": sample["Body_Part"],
+                "sample_type": sample["Sample_Type"],
+                "microorganisms": [
+                    {"microorganism_id": occurrence["Microorganism_ID"], "qpcr": occurrence["qPCR"]}
+                    for occurrence in occurrences
+                ]
+            }
+            for sample, occurrences in samples
+        ]
+    }
+
+
+def patient_element(patient: Dict[str, Any], samples, microorganisms: Dict[str, Dict[str, Any]]) -> etree._Element:
+    """
+    Builds the <patient> element of microbiome.xml.
+
+    Args:
+        patient (dict): The patient row.
+        samples (list): The (sample row, occurrence rows) pairs of the patient.
+        microorganisms (dict): Microorganism rows by Microorganism_ID.
+
+    Returns:
+        etree._Element: The patient element with its sample_list.
+    """
+    patient_elem = etree.Element('patient')
+    for tag in ('Patient_ID', 'Age', 'Birth_Type', 'Location', 'Lifestyle', 'Disease', 'Sex'):
+        etree.SubElement(patient_elem, tag).text = str(patient[tag])
+    samples_elem = etree.SubElement(patient_elem, 'sample_list')
+    for sample, occurrences in samples:
+        sample_elem = etree.SubElement(samples_elem, 'sample')
+        etree.SubElement(sample_elem, 'Sample_ID').text = sample['Sample_ID']
+        etree.SubElement(sample_elem, 'Date').text = sample['Date'].strftime("%Y-%m-%d")
+        etree.SubElement(sample_elem, 'Body_Part').text = sample['Body_Part']
+        etree.SubElement(sample_elem, 'Sample_Type').text = sample['Sample_Type']
+        micros_elem = etree.SubElement(sample_elem, 'microorganism_list')
+        for occurrence in occurrences:
+            micro = microorganisms[occurrence['Microorganism_ID']]
+            micro_elem = etree.SubElement(micros_elem, 'microorganism')
+            etree.SubElement(micro_elem, 'Microorganism_ID').text = micro['Microorganism_ID']
+            etree.SubElement(micro_elem, 'Species').text = micro['Species']
+            etree.SubElement(micro_elem, 'Kingdom').text = micro['Kingdom']
+            etree.SubElement(micro_elem, 'FASTA').text = micro['FASTA']
+            etree.SubElement(micro_elem, 'Seq_length').text = str(micro['Seq_length'])
+            etree.SubElement(micro_elem, 'qPCR').text = str(occurrence['qPCR'])
+    return patient_elem
+
+
+class _CsvSink:
+    def __init__(self, output_dir: str, stack: ExitStack) -> None:
+        self.files = {table: stack.enter_context(open(os.path.join(output_dir, f"{table}.csv"), "w", newline=""))
+                      for table in TABLES}
+        self.header = {table: True for table in TABLES}
+
+    def write(self, table: str, columns: Dict[str, np.ndarray]) -> None:
+        pd.DataFrame(columns).to_csv(self.files[table], header=self.header[table], index=False)
+        self.header[table] = False
+
+
+class _ParquetSink:
+    def __init__(self, output_dir: str, stack: ExitStack) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as err:
+            raise ImportError("The parquet format requires pyarrow (pip install pyarrow)") from err
+        self.pa = pa
+        self.pq = pq
+        self.output_dir = output_dir
+        self.stack = stack
+        self.writers = {}
+
+    def write(self, table: str, columns: Dict[str, np.ndarray]) -> None:
+        arrow_table = self.pa.table(columns)
+        if table not in self.writers:
+            writer = self.pq.ParquetWriter(os.path.join(self.output_dir, f"{table}.parquet"), arrow_table.schema)
+            self.writers[table] = self.stack.enter_context(writer)
+        self.writers[table].write_table(arrow_table)
+
+
+class DatasetWriter:
+    """
+    Writes generated datasets to files in several formats in a single generation pass.
+
+    Attributes:
+        output_dir (str): Directory where the files are created.
+        formats (tuple): Formats to emit, any of FORMATS.
+
+    Methods:
+        write(self, num_samples: int, batch_size: int, seed: int) -> dict: Generates and writes the dataset.
+    """
+
+    def __init__(self, output_dir: str, formats=FORMATS) -> None:
+        """
+        Args:
+            output_dir (str): Directory where the files are created, it is created if missing.
+            formats (iterable): Formats to emit, any of FORMATS.
+        """
+        unknown = set(formats) - set(FORMATS)
+        if unknown:
+            raise ValueError(f"Unknown formats {sorted(unknown)}, expected some of {FORMATS}")
+        self.output_dir = output_dir
+        self.formats = tuple(formats)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, num_samples: int, batch_size: int = 10000, seed: int = 42) -> Dict[str, int]:
+        """
+        Generates num_samples samples in batches and appends every batch to all the outputs.
+
+        Args:
+            num_samples (int): Total number of samples.
+            batch_size (int): Number of samples generated and kept in memory at once.
+            seed (int): Seed of the first batch, batch i uses seed + i as insert_data_in_batches does.
+
+        Returns:
+            dict: Number of rows written per table.
+        """
+        counts = {table: 0 for table in TABLES}
+        with ExitStack() as stack:
+            table_sinks = []
+            if "csv" in self.formats:
+                table_sinks.append(_CsvSink(self.output_dir, stack))
+            if "parquet" in self.formats:
+                table_sinks.append(_ParquetSink(self.output_dir, stack))
+            ndjson = None
+            if "ndjson" in self.formats:
+                ndjson = stack.enter_context(open(os.path.join(self.output_dir, "patients_data.ndjson"), "w"))
+            xml = None
+            if "xml" in self.formats:
+                xf = stack.enter_context(etree.xmlfile(os.path.join(self.output_dir, "microbiome.xml"), encoding="UTF-8"))
+                xf.write_declaration()
+                stack.enter_context(xf.element("microbiome"))
+                xml = xf
+
+            microorganisms = DataGenerator(num_samples=0, seed=seed).generate_microorganism_columns()
+            for sink in table_sinks:
+                sink.write("microorganism", microorganisms)
+            counts["microorganism"] = microorganisms["Microorganism_ID"].size
+            microorganism_rows = {row["Microorganism_ID"]: row for row in _rows(microorganisms)}
+            if ndjson is not None:
+                with open(os.path.join(self.output_dir, "microorganisms.ndjson"), "w") as file:
+                    for row in microorganism_rows.values():
+                        file.write(json.dumps({key.lower(): value for key, value in row.items()}) + "\n")
+
+            num_batches = (num_samples + batch_size - 1) // batch_size
+            id_cursor = 0
+            for i in tqdm(range(num_batches), desc="Writing batches"):
+                datagen = DataGenerator(num_samples=min(batch_size, num_samples - i * batch_size),
+                                        seed=seed + i, id_start=id_cursor, id_seed=seed)
+                id_cursor += datagen.id_block
+                tables = datagen.generate_columnar_data()
+                for table in ("patient", "sample", "sample_microorganism"):
+                    for sink in table_sinks:
+                        sink.write(table, tables[table])
+                    counts[table] += len(next(iter(tables[table].values())))
+                if ndjson is None and xml is None:
+                    continue
+                for patient, samples in iter_patients(tables):
+                    if ndjson is not None:
+                        ndjson.write(json.dumps(patient_document(patient, samples)) + "\n")
+                    if xml is not None:
+                        xml.write(patient_element(patient, samples, microorganism_rows), pretty_print=True)
+        return counts
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write generated microbiome datasets without a database.")
+    parser.add_argument('-o', '--output', type=str, help='Output directory', required=True)
+    parser.add_argument('-s', '--samples', type=int, help='Number of samples to generate', required=True)
+    parser.add_argument('-f', '--formats', nargs='+', choices=FORMATS, default=list(FORMATS),
+                        help='Formats to write')
+    parser.add_argument('-b', '--batch-size', type=int, default=10000, help='Samples generated per batch')
+    parser.add_argument('--seed', type=int, default=42, help='Seed of the generated data')
+    args = parser.parse_args()
+
+    writer = DatasetWriter(output_dir=args.output, formats=args.formats)
+    counts = writer.write(num_samples=args.samples, batch_size=args.batch_size, seed=args.seed)
+    for table, rows in counts.items():
+        print(f"{table}: {rows} rows")
+
+
+if __name__ == "__main__":
+    main()
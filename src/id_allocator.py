@@ -0,0 +1,110 @@
+"""
+Collision free allocation of the XXX-ddddd-LLL identifiers (Patient_ID, Sample_ID, Microorganism_ID).
+
+An identifier is the text form of an integer key in [0, ID_SPACE), see id_codec. Instead of
+drawing keys at random, which collides once a few thousand rows are generated, the allocator maps a counter through a seeded permutation of the whole key space.
+Distinct counters always give distinct identifiers, so any process that owns a disjoint counter
+range (a shard, a batch) can mint identifiers on its own and the result is still unique across
+the run, while the identifiers keep looking random.
+"""
+
+import numpy as np
+
+from id_codec import ID_SPACE, decode_ids
+
+_ROUNDS = 4
+_HALF_BITS = 16
+_HALF_MASK = (1 << _HALF_BITS) - 1
+
+
+class IdAllocator:
+    """
+    Hands out unique identifiers of one prefix by walking a seeded permutation of the key space.
+
+    The permutation is a 32-bit Feistel network restricted to [0, ID_SPACE) by cycle walking, so
+    it is a bijection for every seed. Allocators with the same prefix and seed agree on the
+    permutation and only need disjoint counter ranges to never collide.
+
+    Attributes:
+        prefix (str): The identifier prefix.
+        seed (int): Seed of the permutation, shared by every allocator of the run.
+        start (int): First counter of the range owned by this allocator.
+        cursor (int): Next counter handed out by allocate.
+        stop (int): End (exclusive) of the counter range owned by this allocator.
+
+    Methods:
+        keys(self, start: int, count: int) -> np.ndarray: Permuted keys of the counters [start, start + count).
+        ids(self, start: int, count: int) -> np.ndarray: Identifiers of the counters [start, start + count).
+        allocate(self, count: int) -> np.ndarray: Identifiers of the next count counters of the range.
+        release_last(self, count: int) -> None: Gives back the last count identifiers handed out.
+    """
+
+    def __init__(self, prefix: str, seed: int = 0, start: int = 0, stop: int = ID_SPACE) -> None:
+        """
+        Args:
+            prefix (str): The identifier prefix (PAC, SMP, MIC).
+            seed (int): Seed of the permutation.
+            start (int): First counter of the range owned by this allocator.
+            stop (int): End (exclusive) of the counter range.
+        """
+        if not 0 <= start <= stop <= ID_SPACE:
+            raise ValueError(f"Invalid counter range [{start}, {stop}) for a key space of {ID_SPACE}")
+        self.prefix = prefix
+        self.seed = seed
+        self.start = start
+        self.cursor = start
+        self.stop = stop
+        entropy = [seed, int.from_bytes(prefix.encode(), "big")]
+        self._round_keys = np.random.SeedSequence(entropy).generate_state(_ROUNDS).astype(np.uint64)
+
+    def _feistel(self, values: np.ndarray) -> np.ndarray:
+        left = values >> np.uint64(_HALF_BITS)
+        right = values & np.uint64(_HALF_MASK)
+        for key in self._round_keys:
+            mixed = ((right * np.uint64(0x9E3779B1) + key) >> np.uint64(7)) & np.uint64(_HALF_MASK)
+            left, right = right, left ^ mixed
+        return (left << np.uint64(_HALF_BITS)) | right
+
+    def keys(self, start: int, count: int) -> np.ndarray:
+        """
+        Returns the permuted keys of the counters [start, start + count).
+        """
+        if start < 0 or start + count > ID_SPACE:
+            raise ValueError(f"Counters [{start}, {start + count}) are outside the key space")
+        values = self._feistel(np.arange(start, start + count, dtype=np.uint64))
+        outside = values >= ID_SPACE
+        while outside.any():
+            values[outside] = self._feistel(values[outside])
+            outside = values >= ID_SPACE
+        return values.astype(np.int64)
+
+    def ids(self, start: int, count: int) -> np.ndarray:
+        """
+        Returns the identifiers of the counters [start, start + count).
+        """
+        return decode_ids(self.prefix, self.keys(start, count))
+
+    def allocate(self, count: int) -> np.ndarray:
+        """
+        Returns the identifiers of the next count counters of the range and advances the cursor.
+
+        Raises:
+            ValueError: If the range of this allocator is exhausted.
+        """
+        if self.cursor + count > self.stop:
+            raise ValueError(f"{self.prefix} identifier range [{self.cursor}, {self.stop}) cannot hold {count} more ids")
+        identifiers = self.ids(self.cursor, count)
+        self.cursor += count
+        return identifiers
+
+    def release_last(self, count: int = 1) -> None:
+        """
+        Gives back the last count identifiers handed out, which the next allocate hands out again.
+        Only identifiers that were never stored may be released.
+
+        Raises:
+            ValueError: If fewer than count identifiers were handed out.
+        """
+        if not 0 <= count <= self.cursor - self.start:
+            raise ValueError(f"Cannot release {count} {self.prefix} ids, {self.cursor - self.start} were allocated")
+        self.cursor -= count
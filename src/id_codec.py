@@ -0,0 +1,113 @@
+"""
+Lossless codec between the XXX-ddddd-LLL identifiers and 32-bit integer keys.
+
+The prefix of an identifier is fixed per column (PAC for Patient_ID, SMP for Sample_ID, MIC for
+Microorganism_ID), so only the five digits and the three letters have to be stored:
+
+    key = ddddd * 26**3 + LLL (letters read as a base-26 number, A = 0)
+
+Keys fit in an INT UNSIGNED column and sort in the same order as the identifiers, so ORDER BY and
+GROUP BY on the keys give the same results as on the CHAR(13) columns.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+# Storage of the identifiers: CHAR(13) strings or INT UNSIGNED keys
+ID_MODES = ("char", "int")
+
+# Number of distinct XXX-ddddd-LLL identifiers for a given prefix
+ID_SPACE = 10 ** 5 * 26 ** 3
+
+# Prefix of the identifiers stored in each column
+ID_COLUMNS: Dict[str, str] = {
+    "Patient_ID": "PAC",
+    "Sample_ID": "SMP",
+    "Microorganism_ID": "MIC",
+}
+
+
+def encode_id(identifier: str) -> int:
+    """
+    Encodes an identifier such as 'PAC-00411-LNP' into its integer key.
+
+    Raises:
+        ValueError: If the identifier does not follow the XXX-ddddd-LLL format.
+    """
+    if len(identifier) != 13 or identifier[3] != "-" or identifier[9] != "-" \
+            or not identifier[4:9].isdigit() or not identifier[10:].isalpha() or not identifier[10:].isupper():
+        raise ValueError(f"Invalid identifier {identifier!r}, expected XXX-ddddd-LLL")
+    letters = 0
+    for letter in identifier[10:]:
+        letters = letters * 26 + ord(letter) - 65
+    return int(identifier[4:9]) * 26 ** 3 + letters
+
+
+def decode_id(prefix: str, key: int) -> str:
+    """
+    Decodes an integer key into the identifier with the given prefix.
+    """
+    numbers, letters = divmod(int(key), 26 ** 3)
+    return f"{prefix}-{numbers:05d}-{chr(65 + letters // 676)}{chr(65 + letters // 26 % 26)}{chr(65 + letters % 26)}"
+
+
+def encode_ids(identifiers: np.ndarray) -> np.ndarray:
+    """
+    Vectorized encode_id for an array of identifiers. The format is not validated.
+
+    Returns:
+        np.ndarray: The keys as uint32.
+    """
+    identifiers = np.asarray(identifiers)
+    if identifiers.size == 0:
+        return np.empty(0, dtype=np.uint32)
+    buffer = identifiers.astype("S13").view(np.uint8).reshape(-1, 13).astype(np.int64)
+    numbers = np.zeros(buffer.shape[0], dtype=np.int64)
+    for position in range(4, 9):
+        numbers = numbers * 10 + buffer[:, position] - 48
+    letters = np.zeros(buffer.shape[0], dtype=np.int64)
+    for position in range(10, 13):
+        letters = letters * 26 + buffer[:, position] - 65
+    return (numbers * 26 ** 3 + letters).astype(np.uint32)
+
+
+def decode_ids(prefix: str, keys: np.ndarray) -> np.ndarray:
+    """
+    Vectorized decode_id, formats integer keys in [0, ID_SPACE) without a Python loop.
+
+    Args:
+        prefix (str): The three letter prefix (PAC, SMP, MIC).
+        keys (np.ndarray): Integer keys.
+
+    Returns:
+        np.ndarray: An array of 13 character strings.
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    numbers, letters = np.divmod(keys, 26 ** 3)
+    buffer = np.empty((keys.size, 13), dtype=np.uint8)
+    buffer[:, :4] = np.frombuffer(f"{prefix}-".encode(), dtype=np.uint8)
+    for position in range(5):
+        buffer[:, 8 - position] = 48 + (numbers // 10 ** position) % 10
+    buffer[:, 9] = ord("-")
+    for position in range(3):
+        buffer[:, 12 - position] = 65 + (letters // 26 ** position) % 26
+    return buffer.view("S13").ravel().astype("U13")
+
+
+def sql_decode(column: str, name: str = None) -> str:
+    """
+    Returns the MySQL expression that rebuilds the identifier stored as an integer key.
+
+    Args:
+        column (str): The (qualified) key column, e.g. 'p.Patient_ID'. Its last part selects the prefix.
+        name (str): Alias of the expression, defaults to the unqualified column name.
+
+    The remainders use MOD() rather than the % operator, so the expression can be embedded in
+    statements whose parameters drivers such as aiomysql fill in with Python % formatting.
+    """
+    base = column.split(".")[-1]
+    prefix = ID_COLUMNS[base]
+    return (f"CONCAT('{prefix}-', LPAD({column} DIV 17576, 5, '0'), '-', "
+            f"CHAR(65 + MOD({column} DIV 676, 26), 65 + MOD({column} DIV 26, 26), 65 + MOD({column}, 26) USING ascii)) "
+            f"AS {name or base}")
@@ -0,0 +1,258 @@
+"""
+Index set selection from the optimization sweeps.
+
+The sweeps of mysql_optimization_v2 and mongodb_optimization time the seven queries under every
+index combination, encoded as I1+I2+... (N0 or empty for no indices), and record the build time
+and size of every index. This module joins both, so every measured combination gets its weighted
+latency, storage and build time, and extracts the Pareto-optimal combinations: those for which no
+other combination of the same engine is at least as good in the three measures and better in one.
+
+advise answers which index set suits a given query mix: it weights the measured latencies by the
+frequency of every query and picks the combination with the lowest expected latency whose storage
+fits a budget. Since the sweeps measure the combinations themselves, choosing among them is the
+exact knapsack solution, including the interactions between indices that an additive per-index
+model would miss. Without recorded index sizes, as for the sweeps run before they were recorded,
+the budget counts indices instead of bytes.
+
+Both sweep layouts are accepted: the MySQL one (Engine, Indices, Q1..Q7 per row) and the MongoDB
+one (one row per query and one column per combination).
+"""
+
+import argparse
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+QUERIES = [f"Q{i}" for i in range(1, 8)]
+OBJECTIVES = ("Weighted_latency", "Size_bytes", "Build_s")
+
+
+def index_set(indices) -> List[str]:
+    """Splits an encoded combination into its index codes."""
+    if not isinstance(indices, str) or indices in ("", "N0"):
+        return []
+    return indices.split("+")
+
+
+def encode_and_save_csv(input_file, output_file):
+    """
+    Encodes the raw MongoDB sweep results, whose rows are named after the queries and whose columns
+    are the index tuples, as Q1..Q7 rows and I1+I2+... columns that load_results reads.
+    """
+    # Load the CSV file
+    df = pd.read_csv(input_file)
+    
+    # Map original query names to codes
+    query_codes = {
+        "Patient with the most diverse microbiome": "Q1",
+        "Given a microorganism, identify the samples in which it is present and its concentration": "Q2",
+        "Patients who suffer from a certain disease and samples": "Q3",
+        "Number of samples per type of sample": "Q4",
+        "Number of times a microorganism appears in the same sample type": "Q5",
+        "Patients who suffer from and have been diagnosed with a disease and have that disease microorganism": "Q6",
+        "Find species of microorganism with different sequence registered": "Q7"
+    }
+
+    # Map index combinations to codes
+    index_codes = {
+        "No Indices": "N0",
+        "(('samples.sample_id', 1),)": "I1",
+        "(('samples.microorganisms.microorganism_id', 1),)": "I2",
+        "(('disease', 1),)": "I3",
+        "(('samples.sample_type', 1),)": "I4",
+        "(('microorganism_id', 1),)": "I5",
+        "(('samples.sample_id', 1), ('samples.microorganisms.microorganism_id', 1))": "I1+I2",
+        "(('samples.sample_id', 1), ('disease', 1))": "I1+I3",
+        "(('samples.sample_id', 1), ('samples.sample_type', 1))": "I1+I4",
+        "(('samples.sample_id', 1), ('microorganism_id', 1))": "I1+I5",
+        "(('samples.microorganisms.microorganism_id', 1), ('disease', 1))": "I2+I3",
+        "(('samples.microorganisms.microorganism_id', 1), ('samples.sample_type', 1))": "I2+I4",
+        "(('samples.microorganisms.microorganism_id', 1), ('microorganism_id', 1))": "I2+I5",
+        "(('disease', 1), ('samples.sample_type', 1))": "I3+I4",
+        "(('disease', 1), ('microorganism_id', 1))": "I3+I5",
+        "(('samples.sample_type', 1), ('microorganism_id', 1))": "I4+I5",
+        "(('samples.sample_id', 1), ('samples.microorganisms.microorganism_id', 1), ('disease', 1))": "I1+I2+I3",
+        "(('samples.sample_id', 1), ('samples.microorganisms.microorganism_id', 1), ('samples.sample_type', 1))": "I1+I2+I4",
+        "(('samples.sample_id', 1), ('samples.microorganisms.microorganism_id', 1), ('microorganism_id', 1))": "I1+I2+I5",
+        "(('samples.microorganisms.microorganism_id', 1), ('disease', 1), ('samples.sample_type', 1))": "I2+I3+I4",
+        "(('samples.microorganisms.microorganism_id', 1), ('disease', 1), ('microorganism_id', 1))": "I2+I3+I5",
+        "(('disease', 1), ('samples.sample_type', 1), ('microorganism_id', 1))": "I3+I4+I5",
+        "(('samples.sample_id', 1), ('samples.microorganisms.microorganism_id', 1), ('disease', 1), ('samples.sample_type', 1))": "I1+I2+I3+I4",
+        "(('samples.sample_id', 1), ('samples.microorganisms.microorganism_id', 1), ('disease', 1), ('microorganism_id', 1))": "I1+I2+I3+I5",
+        "(('samples.sample_id', 1), ('samples.microorganisms.microorganism_id', 1), ('samples.sample_type', 1), ('microorganism_id', 1))": "I1+I2+I4+I5",
+        "(('samples.microorganisms.microorganism_id', 1), ('disease', 1), ('samples.sample_type', 1), ('microorganism_id', 1))": "I2+I3+I4+I5",
+        "(('samples.sample_id', 1), ('disease', 1), ('samples.sample_type', 1))": "I1+I3+I4",
+        "(('samples.sample_id', 1), ('disease', 1), ('microorganism_id', 1))": "I1+I3+I5",
+        "(('samples.sample_id', 1), ('samples.sample_type', 1), ('microorganism_id', 1))": "I1+I4+I5",
+        "(('samples.microorganisms.microorganism_id', 1), ('samples.sample_type', 1), ('microorganism_id', 1))": "I2+I4+I5",
+        "(('samples.sample_id', 1), ('disease', 1), ('samples.sample_type', 1), ('microorganism_id', 1))": "I1+I3+I4+I5",
+        "(('samples.sample_id', 1), ('disease', 1), ('samples.sample_type', 1), ('microorganism_id', 1))": "I1+I3+I4+I5",
+        "(('samples.sample_id', 1), ('samples.microorganisms.microorganism_id', 1), ('disease', 1), ('samples.sample_type', 1), ('microorganism_id', 1))": "I1+I2+I3+I4+I5"
+    }
+
+    # Rename queries
+    df['Unnamed: 0'] = df['Unnamed: 0'].map(query_codes)
+
+    # Rename columns
+    df = df.rename(columns=index_codes)
+
+    # Rename the first column to 'Query'
+    df = df.rename(columns={'Unnamed: 0': 'Query'})
+
+    # Save the renamed dataframe to a new CSV file
+    df.to_csv(output_file, index=False)
+    print(f"Encoded CSV saved to {output_file}")
+
+
+def load_results(path: str) -> pd.DataFrame:
+    """
+    Reads the encoded results of a sweep.
+
+    Returns:
+        DataFrame: Engine, Indices and Q1..Q7 per combination. MongoDB results get the "MongoDB" engine
+        and N0 becomes the empty combination, as in the MySQL results.
+    """
+    data = pd.read_csv(path)
+    if "Engine" in data.columns:
+        data["Indices"] = data["Indices"].fillna("")
+        return data
+    data = data.set_index("Query").T.rename_axis("Indices").reset_index()
+    data.columns.name = None
+    data["Indices"] = data["Indices"].replace("N0", "")
+    data.insert(0, "Engine", "MongoDB")
+    return data[["Engine", "Indices"] + QUERIES]
+
+
+def load_index_costs(path: str) -> pd.DataFrame:
+    """
+    Reads the build time and size of every index (Engine, Index, Build_s, Size_bytes), as written by
+    the sweeps. Files without an Engine column belong to MongoDB.
+    """
+    costs = pd.read_csv(path)
+    if "Engine" not in costs.columns:
+        costs.insert(0, "Engine", "MongoDB")
+    return costs
+
+
+def evaluate(results: pd.DataFrame, costs: pd.DataFrame, weights: Dict[str, float] = None) -> pd.DataFrame:
+    """
+    Adds the weighted latency, total size and total build time of every combination.
+
+    Args:
+        results (DataFrame): Output of load_results.
+        costs (DataFrame): Output of load_index_costs.
+        weights (dict): Weight of every query in the latency, 1 for every query by default.
+
+    Returns:
+        DataFrame: The results with the OBJECTIVES columns, NaN when an index has no recorded cost.
+    """
+    weights = weights or dict.fromkeys(QUERIES, 1.0)
+    evaluated = results.copy()
+    evaluated["Weighted_latency"] = sum(evaluated[query] * weight for query, weight in weights.items())
+    lookup = costs.set_index(["Engine", "Index"])
+    for column in ("Size_bytes", "Build_s"):
+        evaluated[column] = [
+            sum(lookup[column].get((engine, code), np.nan) for code in index_set(indices))
+            for engine, indices in zip(evaluated["Engine"], evaluated["Indices"])
+        ]
+    return evaluated
+
+
+def pareto_front(evaluated: pd.DataFrame, objectives=OBJECTIVES) -> pd.DataFrame:
+    """
+    Keeps the combinations of every engine that no other combination of the same engine dominates
+    in the objectives, all of them minimized.
+
+    Returns:
+        DataFrame: The Pareto-optimal rows sorted by engine and weighted latency.
+    """
+    front = []
+    for _, group in evaluated.dropna(subset=list(objectives)).groupby("Engine"):
+        values = group[list(objectives)].to_numpy(dtype=float)
+        for i, row in enumerate(values):
+            dominated = np.any(np.all(values <= row, axis=1) & np.any(values < row, axis=1))
+            if not dominated:
+                front.append(group.index[i])
+    return evaluated.loc[front].sort_values(["Engine", "Weighted_latency"])
+
+
+def parse_frequencies(items: List[str]) -> Dict[str, float]:
+    """
+    Reads a query mix written as Q1=100 Q3=5 ... Queries left out do not run in the mix.
+    """
+    frequencies = dict.fromkeys(QUERIES, 0.0)
+    for item in items:
+        query, _, frequency = item.partition("=")
+        if query not in frequencies or not frequency:
+            raise ValueError(f"Expected Q1..Q7=<frequency>, got {item!r}")
+        frequencies[query] = float(frequency)
+    if not any(frequencies.values()):
+        raise ValueError("The query mix needs a positive frequency")
+    return frequencies
+
+
+def advise(results: pd.DataFrame, frequencies: Dict[str, float], budget: float = None,
+           costs: pd.DataFrame = None, top: int = 5) -> pd.DataFrame:
+    """
+    Ranks the measured index combinations of every engine by expected latency under a query mix.
+
+    Args:
+        results (DataFrame): Output of load_results.
+        frequencies (dict): Relative frequency of every query, see parse_frequencies.
+        budget (float): Largest storage of the selected indices: bytes with costs, number of
+            indices without them. None leaves the storage unbounded.
+        costs (DataFrame): Output of load_index_costs, None when the sizes were not recorded.
+        top (int): Combinations kept per engine.
+
+    Returns:
+        DataFrame: The best combinations of every engine within the budget with their
+        Expected_latency, the mean latency of a query drawn from the mix, and their storage.
+    """
+    total = sum(frequencies.values())
+    weights = {query: frequency / total for query, frequency in frequencies.items() if frequency}
+    if costs is not None:
+        ranked = evaluate(results, costs, weights)
+        storage = "Size_bytes"
+    else:
+        ranked = results.copy()
+        ranked["Weighted_latency"] = sum(ranked[query] * weight for query, weight in weights.items())
+        storage = "Num_indices"
+        ranked[storage] = ranked["Indices"].map(lambda indices: len(index_set(indices)))
+    ranked = ranked.rename(columns={"Weighted_latency": "Expected_latency"}).dropna(subset=[storage])
+    if budget is not None:
+        ranked = ranked[ranked[storage] <= budget]
+    ranked = ranked.sort_values(["Engine", "Expected_latency"])
+    return ranked.groupby("Engine", sort=False).head(top)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Pareto-optimal and workload-weighted index sets of an optimization sweep.")
+    parser.add_argument('-r', '--results', type=str, required=True,
+                        help='Encoded sweep results (mysql_encoded_optimization_results.csv or encoded_performance_mongodb.csv)')
+    parser.add_argument('-c', '--costs', type=str, default=None, help='Build time and size of every index')
+    parser.add_argument('-o', '--output', type=str, required=True, help='CSV receiving the selected sets')
+    parser.add_argument('-f', '--frequencies', nargs='+', default=None,
+                        help='Query mix as Q1=<frequency> ..., selects the set with the lowest expected latency')
+    parser.add_argument('-b', '--budget', type=float, default=None,
+                        help='Storage budget of the advised set, bytes with --costs or number of indices without')
+    parser.add_argument('--top', type=int, default=5, help='Advised sets kept per engine')
+    args = parser.parse_args()
+
+    results = load_results(args.results)
+    costs = load_index_costs(args.costs) if args.costs else None
+    if args.frequencies:
+        selected = advise(results, parse_frequencies(args.frequencies), args.budget, costs, args.top)
+        columns = ["Engine", "Indices", "Expected_latency", "Size_bytes" if costs is not None else "Num_indices"]
+    else:
+        if costs is None:
+            parser.error("the Pareto front needs --costs, pass --frequencies to advise without them")
+        selected = pareto_front(evaluate(results, costs))
+        columns = ["Engine", "Indices"] + list(OBJECTIVES)
+    selected.to_csv(args.output, index=False)
+    print(selected[columns].to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
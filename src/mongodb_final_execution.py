@@ -25,9 +25,9 @@ class MongoDBFinalExecution:
         """
         execution_times = []
         for _ in range(50):
-            start_time = time.time()
+            start_time = time.perf_counter()
             query_func(*args, **kwargs)
-            end_time = time.time()
+            end_time = time.perf_counter()
             execution_time_ms = (end_time - start_time) * 1000
             execution_times.append(execution_time_ms)
         
@@ -66,7 +66,7 @@ def main() -> int:
     collection_patients = 'Patients'
     microorganism_collection = 'Microorganism'
     
-    mongo = MongoDBAggregations(mongo_uri=mongo_uri, db_name=db_name)
+    mongo = MongoDBAggregations(mongo_uri=mongo_uri, db_name=db_name, use_cache=False)
     execution = MongoDBFinalExecution(mongo_aggregations=mongo)
     execution.run(output_csv='./query_optimization/mongodb/query_execution_times.csv')
     
@@ -1,10 +1,11 @@
 from typing import List, Dict, Any
-import mysql.connector
+import mysql_pool
 import json
 from pymongo import MongoClient, ASCENDING, DESCENDING
 from datetime import date
 import pandas as pd
 from tqdm import tqdm
+from query_cache import bump_mongo_data_version
 
 class Microorganism_Sample:
     def __init__(self, microorganism_id: str, qpcr: int, sample_id: str):
@@ -89,7 +90,7 @@ class DatabaseExtractor:
         self.cursor = None
 
     def connect(self):
-        self.conn = mysql.connector.connect(**self.mysql_config)
+        self.conn = mysql_pool.connect(**self.mysql_config)
         self.cursor = self.conn.cursor(dictionary=True)
 
     def disconnect(self):
@@ -177,11 +178,13 @@ class JSONExporter:
         collection_object = self.db[collection]
         data = [patient.to_dict() for patient in patients]
         collection_object.insert_many(data)
+        bump_mongo_data_version(self.db)
 
     def insert_microorganisms_to_mongodb(self, microorganisms: List[Microorganism], collection: str) -> None:
         collection_object = self.db[collection]
         data = [microorganism.to_dict() for microorganism in microorganisms]
         collection_object.insert_many(data)
+        bump_mongo_data_version(self.db)
 
 class MongoDBAggregations:
     def __init__(self, mongo_uri: str, db_name: str) -> None:
@@ -4,6 +4,7 @@ import itertools
 import pandas as pd
 from tqdm import tqdm
 from mongodb_queries import MongoDBAggregations
+from index_selection import encode_and_save_csv, evaluate, load_index_costs, load_results, pareto_front
 
 def drop_indexes(db, collection_name):
     collection = db[collection_name]
@@ -14,16 +15,21 @@ def drop_indexes(db, collection_name):
     print(f"All indexes dropped for collection {collection_name}")
 
 def create_index(db, collection_name, index):
+    """Creates an index and returns its name, build time in seconds and size in bytes."""
     collection = db[collection_name]
-    collection.create_index(index)
-    print(f"Index created: {index}")
+    start_time = time.perf_counter()
+    name = collection.create_index(index)
+    build_s = time.perf_counter() - start_time
+    size = db.command("collStats", collection_name)["indexSizes"].get(name, 0)
+    print(f"Index created: {index} ({build_s:.3f} s, {size} bytes)")
+    return {"Name": name, "Build_s": build_s, "Size_bytes": size}
 
 def measure_query_time_avg(mongo_aggregations, collection_patients, collection_microorganism, func, *args, repetitions=30):
     times = []
     for _ in range(repetitions):
-        start_time = time.time()
+        start_time = time.perf_counter()
         func(*args)
-        end_time = time.time()
+        end_time = time.perf_counter()
         times.append(end_time - start_time)
     return sum(times) / repetitions
 
@@ -45,12 +51,26 @@ def measure_query_times(mongo_aggregations, collection_patients, collection_micr
         print(f"Query: {description}\nAverage Time: {avg_time:.4f} seconds\n")
     return times
 
+def capture_plans(mongo_aggregations, collection_patients, collection_microorganism):
+    """Index, documents examined and returned and plan fingerprint of the seven queries."""
+    queries = [
+        (collection_patients,),
+        (collection_patients, 'MIC-64254-KRV'),
+        (collection_patients, 'Respiratory infections'),
+        (collection_patients,),
+        (collection_patients,),
+        (collection_patients, 'Hepatitis B', 'Virus'),
+        (collection_microorganism,)
+    ]
+    return [{"Query": f"Q{num_qry}", **mongo_aggregations.explain(collection, num_qry, *args)}
+            for num_qry, (collection, *args) in enumerate(queries, start=1)]
+
 def main():
     mongo_uri = "mongodb://localhost:27017"
     db_name = 'BDB2023'
     collection_patients = 'Patients'
     collection_microorganism = 'Microorganism'
-    mongo = MongoDBAggregations(mongo_uri=mongo_uri, db_name=db_name)
+    mongo = MongoDBAggregations(mongo_uri=mongo_uri, db_name=db_name, use_cache=False)
     
     client = MongoClient(mongo_uri)
     db = client[db_name]
@@ -85,6 +105,8 @@ def main():
     ]
     
     results_df = pd.DataFrame(index=query_names, columns=['No Indices'] + [str(combination) for combination in index_combinations[1:]])
+    plans = []
+    builds = []
     
     for combination in tqdm(index_combinations, desc="Index Combinations"):
         combination_name = 'No Indices' if not combination else str(combination)
@@ -98,7 +120,9 @@ def main():
         # Create indexes for the current combination
         if combination:
             for index in combination:
-                create_index(db, collection_patients, [index])
+                build = create_index(db, collection_patients, [index])
+                # I1..I5 as in the encoded results of mongodb_performance_analysis
+                builds.append({"Index": f"I{indices.index(index) + 1}", **build})
         
         # Measure query times
         print("Measuring query times...")
@@ -107,9 +131,23 @@ def main():
         # Save times in DataFrame
         for query, time_taken in times.items():
             results_df.at[query, combination_name] = time_taken
+
+        # Plans are captured after the timings, explain runs every pipeline once more
+        for plan in capture_plans(mongo, collection_patients, collection_microorganism):
+            plans.append({"Indices": combination_name, **plan})
     
     # Save DataFrame to CSV
     results_df.to_csv('query_performance_mongodb_docker.csv')
+    pd.DataFrame(plans).to_csv('query_plans_mongodb_docker.csv', index=False)
+    index_costs = pd.DataFrame(builds).groupby(["Index", "Name"], as_index=False).agg(
+        Build_s=("Build_s", "median"), Size_bytes=("Size_bytes", "last"))
+    index_costs.to_csv('index_costs_mongodb_docker.csv', index=False)
+
+    # Pareto-optimal index sets next to the encoded results
+    encode_and_save_csv('query_performance_mongodb_docker.csv', 'encoded_performance_mongodb_docker.csv')
+    pareto = pareto_front(evaluate(load_results('encoded_performance_mongodb_docker.csv'),
+                                   load_index_costs('index_costs_mongodb_docker.csv')))
+    pareto.to_csv('encoded_pareto_mongodb_docker.csv', index=False)
     print("Results saved to query_performance.csv")
 
 if __name__ == "__main__":
@@ -5,17 +5,21 @@ from pymongo import MongoClient, ASCENDING, DESCENDING
 from datetime import date
 import pandas as pd
 from tqdm import tqdm
+from query_plans import mongo_plan
+from query_cache import QueryCache, bump_mongo_data_version, mongo_data_version
 
-class MongoDBAggregations:
-    def __init__(self, mongo_uri: str, db_name: str) -> None:
-        self.client = MongoClient(mongo_uri)
-        self.db = self.client.get_database(db_name)
-        self.db_name = db_name
-        
-    def get_patient_with_most_distinct_microorganisms(self, collection_patient: str) -> Dict[str, Any]:
-        collection_patient_object = self.db.get_collection(collection_patient)
-        
-        pipeline = [
+def build_pipeline(num_qry: int, *args) -> List[Dict[str, Any]]:
+    """
+    Returns the aggregation pipeline of one of the seven queries, so the query methods, the
+    optimization scripts and the benchmark harness run exactly the same stages.
+
+    Args:
+        num_qry (int): Query number, 1 to 7.
+        *args: Parameters of the query: the microorganism ID of query 2, the disease of query 3
+            and the disease and microorganism kingdom of query 6.
+    """
+    if num_qry == 1:
+        return [
             # Desanidar muestras y microorganismos
             {"$unwind": "$samples"},
             {"$unwind": "$samples.microorganisms"},
@@ -37,184 +41,220 @@ class MongoDBAggregations:
             # Limitar a 1 resultado
             {"$limit": 1}
         ]
-        
-        result = list(collection_patient_object.aggregate(pipeline))
-        return result[0] if result else {}
-    
-    def get_samples_and_qpcr_given_microorganism(self, collection_patient:str, microorganism_name:str):
-        collection_patient_object = self.db.get_collection(collection_patient)
-        pipeline = [
-                        {
-                            '$unwind': {
-                                'path': '$samples', 
-                                'includeArrayIndex': 'string'
+    if num_qry == 2:
+        microorganism_name, = args
+        return [
+                    {
+                        '$unwind': {
+                            'path': '$samples', 
+                            'includeArrayIndex': 'string'
+                        }
+                    }, {
+                        '$unwind': {
+                            'path': '$samples.microorganisms', 
+                            'includeArrayIndex': 'string'
+                        }
+                    }, {
+                        '$match': {
+                            'samples.microorganisms.microorganism_id': microorganism_name
+                        }
+                    }, {
+                        '$project': {
+                            'sample': '$samples.sample_id', 
+                            'qpcr': '$samples.microorganisms.qpcr'
+                        }
+                    }
+                ]
+    if num_qry == 3:
+        disease, = args
+        return [
+                    {
+                        '$match': {
+                            'disease': disease
+                        }
+                    }, {
+                        '$project': {
+                            'disease': '$disease', 
+                            'samples': '$samples'
+                        }
+                    }, {
+                        '$unset': 'samples.microorganisms'
+                    }
+                ]
+    if num_qry == 4:
+        return [
+                    {
+                        '$unwind': {
+                            'path': '$samples', 
+                            'includeArrayIndex': 'string'
+                        }
+                    }, {
+                        '$group': {
+                            '_id': '$samples.sample_type', 
+                            'sample_count': {
+                                '$sum': 1
                             }
-                        }, {
-                            '$unwind': {
-                                'path': '$samples.microorganisms', 
-                                'includeArrayIndex': 'string'
+                        }
+                    }
+                ]
+    if num_qry == 5:
+        return [
+                    {"$unwind": "$samples"},
+                    {"$unwind": "$samples.microorganisms"},
+                    {
+                        "$group": {
+                            "_id": {
+                                "sample_type": "$samples.sample_type",
+                                "microorganism_id": "$samples.microorganisms.microorganism_id"
+                            },
+                            "Sample_Count": {"$sum": 1},
+                            "Average_qPCR": {"$avg": "$samples.microorganisms.qpcr"},
+                            "StdDev_qPCR": {"$stdDevPop": "$samples.microorganisms.qpcr"}
+                        }
+                    },
+                    {
+                        "$project": {
+                            "microorganism_id": "$_id.microorganism_id",
+                            "sample_type": "$_id.sample_type",
+                            "Sample_Count": 1,
+                            "Average_qPCR": 1,
+                            "StdDev_qPCR": 1
+                        }
+                    },
+                    {
+                        "$sort": {"microorganism_id": -1}
+                    }
+                ]
+    if num_qry == 6:
+        disease, microorganism_kingdom = args
+        return [
+                    {
+                        '$match': {
+                            'disease': disease
+                        }
+                    }, {
+                        '$unwind': {
+                            'path': '$samples', 
+                            'includeArrayIndex': 'string'
+                        }
+                    }, {
+                        '$unwind': {
+                            'path': '$samples.microorganisms', 
+                            'includeArrayIndex': 'string'
+                        }
+                    }, {
+                        '$lookup': {
+                            'from': 'Microorganism', 
+                            'localField': 'samples.microorganisms.microorganism_id', 
+                            'foreignField': '_id', 
+                            'as': 'microorganism_info'
+                        }
+                    }, {
+                        '$unwind': {
+                            'path': '$microorganism_info', 
+                            'includeArrayIndex': 'string'
+                        }
+                    }, {
+                        '$match': {
+                            'microorganism_info.kingdom': microorganism_kingdom
+                        }
+                    }, {
+                        '$match': {
+                            "microorganism_info.species": {
+                                "$regex": "Hepatitis B",
+                                "$options": "i" 
                             }
-                        }, {
-                            '$match': {
-                                'samples.microorganisms.microorganism_id': microorganism_name
+                        }
+                    }, {
+                        '$project': {
+                            '_id': '$_id', 
+                            'patient_disease': '$disease', 
+                            'microorganism': '$microorganism_info._id', 
+                            'species': '$microorganism_info.Species', 
+                            'sample_id': '$samples.sample_id', 
+                            'qpcr': '$samples.microorganisms.qpcr'
+                        }
+                    }
+                ]
+    if num_qry == 7:
+        return [
+                    {
+                        '$group': {
+                            '_id': '$species', 
+                            'average': {
+                                '$avg': '$seq_length'
+                            }, 
+                            'total': {
+                                '$sum': 1
                             }
-                        }, {
-                            '$project': {
-                                'sample': '$samples.sample_id', 
-                                'qpcr': '$samples.microorganisms.qpcr'
+                        }
+                    }, {
+                        '$match': {
+                            'total': {
+                                '$gt': 1
                             }
                         }
-                    ]
-        results = list(collection_patient_object.aggregate(pipeline=pipeline))
+                    }
+                ]
+    raise ValueError(f"Unknown query {num_qry}")
+
+
+class MongoDBAggregations:
+    def __init__(self, mongo_uri: str, db_name: str, use_cache: bool = False, cache_size: int = 128) -> None:
+        """
+        Args:
+            mongo_uri (str): Connection string of the server.
+            db_name (str): Database to query.
+            use_cache (bool): Answers repeated queries from a result cache invalidated by the data
+                version of the database, see query_cache. Off by default, so the callers that time
+                the aggregations measure the server.
+            cache_size (int): Results kept in the cache.
+        """
+        self.client = MongoClient(mongo_uri)
+        self.db = self.client.get_database(db_name)
+        self.db_name = db_name
+        self.cache = QueryCache(cache_size, enabled=use_cache)
+
+    def _aggregate(self, collection_name: str, num_qry: int, *args) -> List[Dict[str, Any]]:
+        key = (collection_name, num_qry, args)
+        version = mongo_data_version(self.db) if self.cache.enabled else None
+        results = self.cache.lookup(key, version)
+        if results is None:
+            results = list(self.db.get_collection(collection_name).aggregate(build_pipeline(num_qry, *args)))
+            self.cache.store(key, version, results)
+        # callers get their own list, the documents themselves are shared with the cache
+        return list(results)
+
+    def explain(self, collection_name: str, num_qry: int, *args) -> Dict[str, Any]:
+        """Index, documents examined and returned and plan fingerprint of a query, see query_plans."""
+        return mongo_plan(self.db.get_collection(collection_name), build_pipeline(num_qry, *args))
+        
+    def get_patient_with_most_distinct_microorganisms(self, collection_patient: str) -> Dict[str, Any]:
+        result = self._aggregate(collection_patient, 1)
+        return result[0] if result else {}
+    
+    def get_samples_and_qpcr_given_microorganism(self, collection_patient:str, microorganism_name:str):
+        results = self._aggregate(collection_patient, 2, microorganism_name)
         return results[0] if results else {}
     
     def get_patients_suffering_disease_and_samples(self, collection_patient:str, disease:str):
-        collection_patient_object = self.db[collection_patient]
-        pipeline = [
-                        {
-                            '$match': {
-                                'disease': disease
-                            }
-                        }, {
-                            '$project': {
-                                'disease': '$disease', 
-                                'samples': '$samples'
-                            }
-                        }, {
-                            '$unset': 'samples.microorganisms'
-                        }
-                    ]
-        results = list(collection_patient_object.aggregate(pipeline=pipeline))
+        results = self._aggregate(collection_patient, 3, disease)
         return results[0] if results else {}
         
     def get_number_of_samples_per_type_of_sample(self, collection_patient:str): 
-        collection_patient_object = self.db[collection_patient]
-        pipeline = [
-                        {
-                            '$unwind': {
-                                'path': '$samples', 
-                                'includeArrayIndex': 'string'
-                            }
-                        }, {
-                            '$group': {
-                                '_id': '$samples.sample_type', 
-                                'sample_count': {
-                                    '$sum': 1
-                                }
-                            }
-                        }
-                    ]
-        results = list(collection_patient_object.aggregate(pipeline=pipeline))
+        results = self._aggregate(collection_patient, 4)
         return results if results else {}
     
     def get_microorganism_per_sample_type(self, collection_patient:str):
-        collection_patient_object = self.db.get_collection(collection_patient)
-        pipeline = [
-                        {"$unwind": "$samples"},
-                        {"$unwind": "$samples.microorganisms"},
-                        {
-                            "$group": {
-                                "_id": {
-                                    "sample_type": "$samples.sample_type",
-                                    "microorganism_id": "$samples.microorganisms.microorganism_id"
-                                },
-                                "Sample_Count": {"$sum": 1},
-                                "Average_qPCR": {"$avg": "$samples.microorganisms.qpcr"},
-                                "StdDev_qPCR": {"$stdDevPop": "$samples.microorganisms.qpcr"}
-                            }
-                        },
-                        {
-                            "$project": {
-                                "microorganism_id": "$_id.microorganism_id",
-                                "sample_type": "$_id.sample_type",
-                                "Sample_Count": 1,
-                                "Average_qPCR": 1,
-                                "StdDev_qPCR": 1
-                            }
-                        },
-                        {
-                            "$sort": {"microorganism_id": -1}
-                        }
-                    ]
-        result = list(collection_patient_object.aggregate(pipeline))
+        result = self._aggregate(collection_patient, 5)
         return result[0] if result else {}
     
     def get_patients_diagnosed_with_disease_and_microorganism_disease(self, collection_patients:str, disease:str, microorganism_kingdom:str):
-        collection_patients_object = self.db[collection_patients]
-        pipeline = [
-                        {
-                            '$match': {
-                                'disease': disease
-                            }
-                        }, {
-                            '$unwind': {
-                                'path': '$samples', 
-                                'includeArrayIndex': 'string'
-                            }
-                        }, {
-                            '$unwind': {
-                                'path': '$samples.microorganisms', 
-                                'includeArrayIndex': 'string'
-                            }
-                        }, {
-                            '$lookup': {
-                                'from': 'Microorganism', 
-                                'localField': 'samples.microorganisms.microorganism_id', 
-                                'foreignField': '_id', 
-                                'as': 'microorganism_info'
-                            }
-                        }, {
-                            '$unwind': {
-                                'path': '$microorganism_info', 
-                                'includeArrayIndex': 'string'
-                            }
-                        }, {
-                            '$match': {
-                                'microorganism_info.kingdom': microorganism_kingdom
-                            }
-                        }, {
-                            '$match': {
-                                "microorganism_info.species": {
-                                    "$regex": "Hepatitis B",
-                                    "$options": "i" 
-                                }
-                            }
-                        }, {
-                            '$project': {
-                                '_id': '$_id', 
-                                'patient_disease': '$disease', 
-                                'microorganism': '$microorganism_info._id', 
-                                'species': '$microorganism_info.Species', 
-                                'sample_id': '$samples.sample_id', 
-                                'qpcr': '$samples.microorganisms.qpcr'
-                            }
-                        }
-                    ]
-        results = list(collection_patients_object.aggregate(pipeline=pipeline))
+        results = self._aggregate(collection_patients, 6, disease, microorganism_kingdom)
         return results[:2] if results else {}
         
     def get_species_of_microorganism_with_different_sequence(self, collection_microorganisms:str):
-        collection_microorganisms_object = self.db[collection_microorganisms]
-        pipeline = [
-                        {
-                            '$group': {
-                                '_id': '$species', 
-                                'average': {
-                                    '$avg': '$seq_length'
-                                }, 
-                                'total': {
-                                    '$sum': 1
-                                }
-                            }
-                        }, {
-                            '$match': {
-                                'total': {
-                                    '$gt': 1
-                                }
-                            }
-                        }
-                    ]
-        results = list(collection_microorganisms_object.aggregate(pipeline=pipeline))
+        results = self._aggregate(collection_microorganisms, 7)
         return results[:3] if results else {}
         
     def update_patient_location(self, collection_name: str, patient_id: str, new_location: str) -> None:
@@ -224,6 +264,7 @@ class MongoDBAggregations:
             {"$set": {"location": new_location}}
         )
         if result.modified_count > 0:
+            bump_mongo_data_version(self.db)
             print(f"Updated location for patient {patient_id}")
         else:
             print(f"No update made for patient {patient_id}")
@@ -231,6 +272,7 @@ class MongoDBAggregations:
     def insert_new_patient(self, collection_name: str, patient_data: Dict[str, Any]) -> None:
         collection = self.db.get_collection(collection_name)
         result = collection.insert_one(patient_data)
+        bump_mongo_data_version(self.db)
         print(f"Inserted new patient with _id: {result.inserted_id}")
     
 def main() -> int:
@@ -1,13 +1,18 @@
 import mysql.connector as mysql
+from mysql_dbCreation import add_constraints
 
 def add_foreign_keys(password: str, database: str):
     """
     Adds foreign keys to the database schema to ensure referential integrity.
+    The constraints (and the indexes backing them) are the ones DbCreation defines, the ones
+    already present are skipped.
     
     Args:
         password (str): The password for the MySQL root user.
         database (str): The name of the database to modify.
     """
+    connection = None
+    cursor = None
     try:
         # Establishing the connection
         connection = mysql.connect(
@@ -20,19 +25,7 @@ def add_foreign_keys(password: str, database: str):
         cursor = connection.cursor()
         
         # Adding foreign keys
-        cursor.execute("""
-            ALTER TABLE sample
-            ADD CONSTRAINT fk_patient
-            FOREIGN KEY (Patient_ID) REFERENCES patient(Patient_ID);
-        """)
-        
-        cursor.execute("""
-            ALTER TABLE sample_microorganism
-            ADD CONSTRAINT fk_sample
-            FOREIGN KEY (Sample_ID) REFERENCES sample(Sample_ID),
-            ADD CONSTRAINT fk_microorganism
-            FOREIGN KEY (Microorganism_ID) REFERENCES microorganism(Microorganism_ID);
-        """)
+        add_constraints(cursor, database)
         
         connection.commit()
         print("Foreign keys added successfully.")
@@ -46,5 +39,5 @@ def add_foreign_keys(password: str, database: str):
         if connection:
             connection.close()
 
-# Call the function to add foreign keys
-add_foreign_keys(password="bdbiO", database="microbiomeDB")
+if __name__ == "__main__":
+    add_foreign_keys(password="bdbiO", database="microbiomeDB")
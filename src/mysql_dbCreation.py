@@ -17,15 +17,194 @@ This code was developed to fulfill an assignment for the final project in the "B
 
 
 
-from typing import List
+from typing import Dict, List, Tuple
+from functools import lru_cache
 import mysql.connector as mysql
 import random
 import string
 import pandas as pd
 import numpy as np
 import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
 from datetime import datetime, timedelta
+from batch_controller import BatchSizeController, payload_bytes, statement_slices
+from id_allocator import IdAllocator
+from id_codec import ID_COLUMNS, ID_MODES, ID_SPACE, decode_ids, encode_id, encode_ids, sql_decode
+from query_cache import DATA_VERSION_TABLE, bump_mysql_data_version
+from summary_tables import rebuild_summaries, refresh_species, stored_rows, summary_ddl, update_summaries
+
+
+BIRTH_TYPES = ['Cesarean', 'Natural']
+LOCATIONS = [
+    'Europe', 'Africa', 'North America', 'South America',
+    'Central Asia', 'East Asia', 'Antarctica',
+    'Southeast Asia', 'Middle East', 'Oceania'
+]
+LIFESTYLES = ['Active', 'Sedentary']
+SEXES = ['M', 'F']
+BODY_PARTS = ['Head', 'Chest', 'Arm', 'Leg', 'Foot', 'Hand']
+SAMPLE_TYPES = ['Blood', 'Tissue', 'Saliva', 'Urine']
+
+# Samples whose microorganisms are drawn at once by the columnar generator
+_COLUMNAR_CHUNK = 1 << 18
+
+
+@lru_cache(maxsize=None)
+def load_microorganism_catalog(path: str) -> pd.DataFrame:
+    """
+    Reads the microorganism catalog once per path and keeps it in memory.
+
+    Args:
+        path (str): Path to the microorganisms CSV file.
+
+    Returns:
+        pd.DataFrame: The catalog with Microorganism_ID, Species, Kingdom and Diseases columns.
+    """
+    return pd.read_csv(path)
+
+
+def _catalog_path() -> str:
+    return os.path.join(os.getcwd(), "..", "data-files", "microorganisms.csv")
+    # return os.path.join(os.getcwd(), "data-files", "microorganisms.csv")
+
+
+INSERT_MODES = ("row", "executemany", "load_data")
+
+# Columns of the tables, in insertion order
+TABLE_COLUMNS = {
+    "patient": ["Patient_ID", "Age", "Birth_Type", "Location", "Lifestyle", "Disease", "Sex"],
+    "sample": ["Sample_ID", "Patient_ID", "Date", "Body_Part", "Sample_Type"],
+    "microorganism": ["Microorganism_ID", "Species", "Kingdom", "FASTA", "Seq_length"],
+    "sample_microorganism": ["Microorganism_ID", "Sample_ID", "qPCR"],
+}
+
+# Foreign keys as (name, column, referenced table). Secondary indexes backing them, named after the
+# constraint as InnoDB does implicitly. The primary key of sample_microorganism already covers microog_fk.
+FOREIGN_KEYS = {
+    "sample": [("sample_patient", "Patient_ID", "patient")],
+    "sample_microorganism": [("sample_fk", "Sample_ID", "sample"),
+                             ("microog_fk", "Microorganism_ID", "microorganism")],
+}
+SECONDARY_INDEXES = {
+    "sample": [("sample_patient", "Patient_ID")],
+    "sample_microorganism": [("sample_fk", "Sample_ID")],
+}
+
+# Primary key columns of the tables filled by the generator
+TABLE_KEYS = {
+    "patient": ["Patient_ID"],
+    "sample": ["Sample_ID"],
+    "microorganism": ["Microorganism_ID"],
+    "sample_microorganism": ["Microorganism_ID", "Sample_ID"],
+}
+
+
+def _upsert_query(table: str, columns: List[str]) -> str:
+    """
+    Builds the INSERT ... ON DUPLICATE KEY UPDATE statement used by the row and bulk insertions.
+    """
+    updates = ", ".join(f"{column}=VALUES({column})" for column in columns if column not in TABLE_KEYS[table])
+    return (f"INSERT INTO {table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join(['%s'] * len(columns))}) "
+            f"ON DUPLICATE KEY UPDATE {updates}")
+
+
+def _constraints_ddl(table: str) -> str:
+    """
+    Returns the CONSTRAINT clauses of a CREATE TABLE statement, preceded by a comma.
+    """
+    return "".join(f",\n                    CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {parent} ({column})"
+                   for name, column, parent in FOREIGN_KEYS.get(table, []))
+
+
+def add_constraints(cursor, database: str) -> Dict[str, str]:
+    """
+    Adds the secondary indexes and foreign keys that are missing, with a single ALTER TABLE per table.
+    Foreign key checks are disabled during the ALTER so that InnoDB adds the constraints in place
+    instead of validating and copying the loaded rows. The rows are validated beforehand instead,
+    with one anti-join per missing foreign key, and nothing is altered if any row is orphaned.
+
+    Args:
+        cursor: Cursor of a connection to the database.
+        database (str): Name of the database.
+
+    Returns:
+        dict: The ALTER TABLE statement run for each table.
+
+    Raises:
+        ValueError: If rows reference a missing parent row.
+    """
+    cursor.execute("SELECT TABLE_NAME, CONSTRAINT_NAME FROM information_schema.TABLE_CONSTRAINTS "
+                   "WHERE TABLE_SCHEMA = %s AND CONSTRAINT_TYPE = 'FOREIGN KEY'", (database,))
+    foreign_keys = set(cursor.fetchall())
+    cursor.execute("SELECT DISTINCT TABLE_NAME, INDEX_NAME FROM information_schema.STATISTICS "
+                   "WHERE TABLE_SCHEMA = %s", (database,))
+    indexes = set(cursor.fetchall())
+
+    orphans = []
+    for table, constraints in FOREIGN_KEYS.items():
+        for name, column, parent in constraints:
+            if (table, name) in foreign_keys:
+                continue
+            cursor.execute(f"SELECT COUNT(*) FROM {table} c LEFT JOIN {parent} p ON c.{column} = p.{column} "
+                           f"WHERE c.{column} IS NOT NULL AND p.{column} IS NULL")
+            count = cursor.fetchone()[0]
+            if count:
+                orphans.append(f"{count} {table} rows without their {parent} ({name})")
+    if orphans:
+        raise ValueError(f"Cannot add the foreign keys: {'; '.join(orphans)}")
+
+    statements = {}
+    cursor.execute("SET SESSION FOREIGN_KEY_CHECKS=0")
+    try:
+        for table in FOREIGN_KEYS:
+            clauses = [f"ADD INDEX {name} ({column})"
+                       for name, column in SECONDARY_INDEXES[table] if (table, name) not in indexes]
+            clauses += [f"ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {parent} ({column})"
+                        for name, column, parent in FOREIGN_KEYS[table] if (table, name) not in foreign_keys]
+            if clauses:
+                statements[table] = f"ALTER TABLE {table} {', '.join(clauses)}"
+                cursor.execute(statements[table])
+    finally:
+        cursor.execute("SET SESSION FOREIGN_KEY_CHECKS=1")
+    return statements
+
+
+def _batch_seed(seed: int, shard: int, batch: int, shards: int) -> int:
+    """
+    Seed of a batch. A single shard keeps the historical seed, seed + 1, ... sequence, while sharded
+    runs derive an independent stream per shard from the base seed.
+    """
+    if shards == 1:
+        return seed + batch
+    return int(np.random.SeedSequence(seed, spawn_key=(shard, batch)).generate_state(1)[0])
+
+
+def _merge_stats(total: Dict[str, List[float]], part: Dict[str, List[float]]) -> None:
+    """
+    Adds the per table rows and seconds of part to total.
+    """
+    for table, (rows, seconds) in part.items():
+        totals = total.setdefault(table, [0, 0.0])
+        totals[0] += rows
+        totals[1] += seconds
+
+
+def _timed(stats: Dict[str, List[float]], table: str, rows: int, function, *args):
+    """
+    Runs an insertion function, accumulates its rows and elapsed seconds under the table name and
+    returns its result.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    elapsed = time.perf_counter() - start
+    totals = stats.setdefault(table, [0, 0.0])
+    totals[0] += rows
+    totals[1] += elapsed
+    return result
 
 
 class DbCreation:
@@ -35,17 +214,29 @@ class DbCreation:
     Attributes:
         password (str): The password to connect to the MySQL database.
         database (str): The name of the database (schema) to be created and managed.
+        id_mode (str): "char" stores the identifiers as CHAR(13), "int" stores them as INT UNSIGNED keys
+            (see id_codec) and adds the <table>_view views that show the original identifiers.
+        defer_constraints (bool): Creates the tables without foreign keys and secondary indexes, loads with
+            FOREIGN_KEY_CHECKS and UNIQUE_CHECKS disabled and adds them back once the load finishes.
+        phase_times (dict): Seconds spent creating the tables, loading and rebuilding the constraints.
 
     Methods:
-        __init__(self, password: str, database: str): Initializes the database connection and sets up the schema.
+        __init__(self, password: str, database: str, id_mode: str, defer_constraints: bool): Initializes the database connection and sets up the schema.
         __schema__(self): Establishes a connection to MySQL and creates the database if it does not exist.
         __creation__(self): Creates the necessary tables within the database.
-        insert_data_in_batches(self, num_samples: int): Inserts data into the database in batches.
+        insert_data_in_batches(self, num_samples: int, mode: str, shards: int, workers: int, seed: int, resume: bool, ...): Inserts data into the database in batches.
+        _load_checkpoints(self, cursor, seed, shards): Reads the progress of an interrupted load.
+        _insert_shard(self, shard, num_samples, sizing, mode, seed, shards, progress): Generates and inserts the batches of one shard.
+        _bulk_insert_table(self, table, columns, cursor, mode, max_packet): Inserts a batch of column arrays in one round trip per packet.
+        _storage_ids(self, table): Encodes the identifier columns in the "int" id mode.
+        rebuild_constraints(self): Adds the deferred foreign keys and secondary indexes.
+        rebuild_summaries(self): Recomputes the summary tables of the aggregate queries.
         _insert_dataframe_to_db(self, df, cursor): Inserts data from a DataFrame into the database.
         drop_db(self): Drops the database schema.
     """
     
-    def __init__(self, password: str, database: str) -> None:
+    def __init__(self, password: str, database: str, id_mode: str = "char",
+                 defer_constraints: bool = False) -> None:
         """
         Initializes the DbCreation instance, establishes a database connection,
         and sets up the schema and tables if they do not already exist.
@@ -53,13 +244,23 @@ class DbCreation:
         Args:
             password (str): The password for the MySQL database connection.
             database (str): The name of the database (schema) to create and manage.
+            id_mode (str): Storage of the identifiers, "char" or "int".
+            defer_constraints (bool): Creates the tables without foreign keys and secondary indexes,
+                they are added by insert_data_in_batches after the load.
         """
+        if id_mode not in ID_MODES:
+            raise ValueError(f"Unknown id mode {id_mode!r}, expected one of {ID_MODES}")
         self.password = password
         self.database = database
+        self.id_mode = id_mode
+        self.defer_constraints = defer_constraints
+        self.phase_times = {}
         # Stablish a connection. If the schema has 
         # already been created, this will have no effect
         self.__schema__()
+        start = time.perf_counter()
         self.__creation__()
+        self.phase_times["create"] = time.perf_counter() - start
         
     def __schema__(self) -> None:
         """
@@ -84,8 +285,12 @@ class DbCreation:
         """
         Creates the necessary tables within the database if they do not already exist.
         Defines tables for patients, samples, microorganisms, and sample-microorganism relationships.
-        Prints any errors encountered during the table creation process.
+        In the "int" id mode the identifiers are stored as INT UNSIGNED and a view per table presents them
+        as strings. Prints any errors encountered during the table creation process.
         """
+        id_type = "INT UNSIGNED" if self.id_mode == "int" else "CHAR(13)"
+        def constraints(table):
+            return "" if self.defer_constraints else _constraints_ddl(table)
         connection= None
         try:
             connection = mysql.connect(
@@ -94,8 +299,8 @@ class DbCreation:
                     password=self.password,
                     database= self.database)
             cursor= connection.cursor()
-            cursor.execute('''CREATE TABLE IF NOT EXISTS patient (
-                    Patient_ID CHAR(13)  PRIMARY KEY,       
+            cursor.execute(f'''CREATE TABLE IF NOT EXISTS patient (
+                    Patient_ID {id_type}  PRIMARY KEY,       
                     Age INT CHECK (Age BETWEEN 0 AND 100),
                     Birth_Type ENUM('Cesarean', 'Natural'),
                     Location ENUM('Europe', 'Africa', 'North America', 'South America', 'Central Asia', 'East Asia', 'Antarctica', 'Southeast Asia', 'Middle East', 'Oceania'),
@@ -103,33 +308,50 @@ class DbCreation:
                     Disease TEXT,
                     Sex ENUM('M', 'F')                          
                 )''')
-            #char is used cause the ids have fixed length
+            #char is used cause the ids have fixed length, int keys pack them in 4 bytes
 
-            cursor.execute('''CREATE TABLE IF NOT EXISTS sample(
-                    Sample_ID CHAR(13)  PRIMARY KEY,
-                    Patient_ID CHAR(13),       
+            cursor.execute(f'''CREATE TABLE IF NOT EXISTS sample(
+                    Sample_ID {id_type}  PRIMARY KEY,
+                    Patient_ID {id_type},       
                     Date DATE,
                     Body_Part VARCHAR(10),
-                    Sample_Type VARCHAR(10),
-                    CONSTRAINT sample_patient FOREIGN KEY (Patient_ID) REFERENCES patient (Patient_ID)                    
+                    Sample_Type VARCHAR(10){constraints("sample")}
                 )''')
-            cursor.execute('''CREATE TABLE IF NOT EXISTS microorganism (
-                    Microorganism_ID CHAR(13) PRIMARY KEY,
+            cursor.execute(f'''CREATE TABLE IF NOT EXISTS microorganism (
+                    Microorganism_ID {id_type} PRIMARY KEY,
                     Species TEXT,
                     Kingdom ENUM('Bacteria', 'Fungi', 'Virus', 'Protozoa'),
                     FASTA CHAR(23),
                     Seq_length INT CHECK (Seq_length BETWEEN 1000000 AND 100000000)                
                 )''')
             
-            cursor.execute('''CREATE TABLE IF NOT EXISTS sample_microorganism (
-                    Microorganism_ID CHAR(13),
-                    Sample_ID CHAR(13),
+            cursor.execute(f'''CREATE TABLE IF NOT EXISTS sample_microorganism (
+                    Microorganism_ID {id_type},
+                    Sample_ID {id_type},
                     qPCR INT,
-                    PRIMARY KEY( Microorganism_ID, Sample_ID),
-                    CONSTRAINT sample_fk FOREIGN KEY (Sample_ID) REFERENCES sample (Sample_ID),
-                    CONSTRAINT microog_fk FOREIGN KEY (Microorganism_ID) REFERENCES microorganism (Microorganism_ID)
-                
+                    PRIMARY KEY( Microorganism_ID, Sample_ID){constraints("sample_microorganism")}
+                )''')
+
+            # batches committed by insert_data_in_batches, used to resume an interrupted load
+            cursor.execute('''CREATE TABLE IF NOT EXISTS ingest_checkpoint (
+                    Shard INT,
+                    Batch INT,
+                    Seed BIGINT UNSIGNED,
+                    Num_Samples INT,
+                    Id_Start BIGINT,
+                    Completed_At TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (Shard, Batch)
                 )''')
+            # bumped by every load, invalidates the cached query results, see query_cache
+            cursor.execute(DATA_VERSION_TABLE)
+            # aggregates of Q1, Q4, Q5 and Q7 maintained by every batch, see summary_tables
+            for statement in summary_ddl(id_type):
+                cursor.execute(statement)
+
+            if self.id_mode == "int":
+                for table, columns in TABLE_COLUMNS.items():
+                    select = ", ".join(sql_decode(column) if column in ID_COLUMNS else column for column in columns)
+                    cursor.execute(f"CREATE OR REPLACE VIEW {table}_view AS SELECT {select} FROM {table}")
 
         except mysql.Error as err:
             print(f"Error: {err}")
@@ -137,57 +359,400 @@ class DbCreation:
             if connection is not None:
                 connection.close() 
      
-    def insert_data_in_batches(self, num_samples: int) -> None:
+    def insert_data_in_batches(self, num_samples: int, mode: str = "row", shards: int = 1,
+                               workers: int = None, seed: int = 42, resume: bool = False,
+                               batch_size: int = 100, target_rows: int = None, target_bytes: int = None,
+                               target_commit: float = None, telemetry_path: str = None) -> Dict[str, List[float]]:
         """
         Inserts data into the database in batches. Generates data using the DataGenerator class
         and inserts it in batches for efficiency.
 
+        The samples can be split into shards that are generated and inserted by a pool of processes,
+        each one with its own connection. Every batch gets its seed from the base seed, the shard and
+        the batch number, so with a fixed batch size the inserted data only depends on the seed and
+        the number of shards.
+
+        Every batch records its number and seed in the ingest_checkpoint table within the same
+        transaction as its rows. A load started again with resume=True and the same seed and shard
+        count skips the committed batches and only generates and inserts the missing ones.
+
+        Each batch is one transaction. Its size starts at batch_size and a BatchSizeController adapts
+        it to the row and byte targets and to the observed commit latency, keeping the multi-row
+        statements of the "executemany" mode under max_allowed_packet. Without targets every batch
+        has batch_size samples, as in the fixed size loads. Rows/s, bytes/s and the commit time of
+        every batch are shown in the progress bar and can be saved to a CSV file.
+
+        Adaptive sizing trades that determinism for throughput: the batch boundaries decide which
+        seed generates which samples, so a load sized by targets is reproducible only as far as its
+        batch sizes are. The row and byte targets depend on the generated data alone, but a resumed
+        shard restarts its controller from the size of its last committed batch without the earlier
+        estimates, so its remaining batches may be cut differently than in an uninterrupted load.
+        target_commit depends on the timing of the server and is rejected together with resume.
+
+        The data version read by the query cache is bumped when the load starts and again when it
+        ends, so results cached while the batches were arriving are not served afterwards. The shards
+        do not bump it per batch, that would serialize their commits on the counter row. Every batch
+        also adds its rows to the summary tables of the aggregate queries within its transaction.
+
         Args:
             num_samples (int): The total number of samples to generate and insert into the database.
+            mode (str): How the rows reach the server. "row" runs one upsert per row, "executemany"
+                sends multi-row upserts and "load_data" streams each batch through a temporary TSV
+                file with LOAD DATA LOCAL INFILE. The bulk modes use the columnar generator.
+            shards (int): Number of independent slices of num_samples.
+            workers (int): Number of processes inserting shards, defaults to one per shard.
+            seed (int): Base seed of the run.
+            resume (bool): Continue the load recorded in ingest_checkpoint instead of starting a new one.
+            batch_size (int): Samples of the first batch of every shard.
+            target_rows (int): Rows per transaction, over all the tables, to size the batches for.
+            target_bytes (int): Payload bytes per transaction to size the batches for.
+            target_commit (float): Commit latency in seconds the batch size is steered towards. The
+                batch sizes, and so the data, then vary from run to run.
+            telemetry_path (str): CSV file receiving one line of throughput telemetry per batch.
+
+        Returns:
+            dict: Rows inserted and seconds spent per table.
+
+        Raises:
+            RuntimeError: If a shard stopped on a MySQL error. Its committed batches are kept in
+                ingest_checkpoint and deferred constraints are not rebuilt until a run with
+                resume=True completes the load. The data version is bumped anyway, the committed
+                batches are already visible.
         """
-        batch_size = 100
-        num_batches = (num_samples + batch_size - 1) // batch_size 
+        if mode not in INSERT_MODES:
+            raise ValueError(f"Unknown insert mode {mode!r}, expected one of {INSERT_MODES}")
+        if resume and target_commit:
+            raise ValueError("target_commit makes the batch sizes depend on timing, "
+                             "a load sized by it cannot be resumed")
+        sizing = {"batch_size": batch_size, "min_size": min(10, batch_size),
+                  "max_size": max(100000, batch_size), "target_rows": target_rows,
+                  "target_bytes": target_bytes, "target_commit": target_commit}
+        stats = {}
+        telemetry = []
 
+        connection = None
         try:
-            connection = mysql.connect(
-                host="localhost",
-                user="root",
-                password=self.password,
-                database=self.database
-            )
+            connection = self._connection()
             cursor = connection.cursor()
+            # all the microorganisms from the csv file are inserted before any sample
+            self._insert_microorganism_to_db(cursor, seed)
+            refresh_species(cursor)
+            bump_mysql_data_version(cursor)
+            if resume:
+                progress = self._load_checkpoints(cursor, seed, shards)
+            else:
+                cursor.execute("DELETE FROM ingest_checkpoint")
+                progress = {}
+            connection.commit()
+            cursor.close()
+        except mysql.Error as err:
+            print(f"Error: {err}")
+            return stats
+        finally:
+            if connection:
+                connection.close()
+
+        shard_sizes = [num_samples // shards + (1 if shard < num_samples % shards else 0) for shard in range(shards)]
+        # every shard owns a disjoint range of identifier counters, every batch uses its size + 1
+        min_size = sizing["min_size"]
+        if max(shard_sizes) + (max(shard_sizes) + min_size - 1) // min_size + 1 > ID_SPACE // shards:
+            raise ValueError(f"{num_samples} samples do not fit in the identifier space with {shards} shards")
+        jobs = [(shard, shard_size, sizing, mode, seed, shards, progress.get(shard))
+                for shard, shard_size in enumerate(shard_sizes)]
+        start = time.perf_counter()
+        if shards == 1:
+            results = [self._insert_shard(*jobs[0])]
+        else:
+            with ProcessPoolExecutor(max_workers=workers or shards) as executor:
+                results = list(executor.map(self._insert_shard, *zip(*jobs)))
+        failures = []
+        for shard, (shard_stats, shard_telemetry, error) in enumerate(results):
+            _merge_stats(stats, shard_stats)
+            telemetry.extend(shard_telemetry)
+            if error is not None:
+                failures.append(f"shard {shard}: {error}")
+        self.phase_times["load"] = time.perf_counter() - start
+        if telemetry_path and telemetry:
+            pd.DataFrame(telemetry).to_csv(telemetry_path, index=False)
+        # the committed batches are visible whether the load completed or not, results cached while
+        # they arrived are stale either way
+        self._bump_data_version()
+        if failures:
+            # the committed batches stay in ingest_checkpoint, the constraints are left to the run
+            # that completes the load
+            raise RuntimeError(f"The load did not complete ({'; '.join(failures)}), "
+                               "run it again with resume=True to insert the missing batches")
+        if self.defer_constraints:
+            self.rebuild_constraints()
+
+        for table, (rows, seconds) in stats.items():
+            print(f"{table}: {rows} rows in {seconds:.2f}s ({rows / seconds if seconds else 0:.0f} rows/s)")
+        for phase, seconds in self.phase_times.items():
+            print(f"{phase} phase: {seconds:.2f}s")
+        return stats
 
-            seed = 42
-            i = 0
-            for _ in tqdm(range(num_batches), desc="Inserting batches"):
-                # the first time it will insert all the microorganisms from the csv file
-                if i==0:
-                    self._insert_microorganism_to_db(cursor)
-
-                datagen = DataGenerator(num_samples=batch_size,
-                                        seed=seed)
-                sample_df, patients_df= datagen.generate_random_data(i=i) 
-                self._insert_patient_to_db (patients_df,cursor) 
-                self._insert_sample_to_db(sample_df, cursor) 
+    def _bump_data_version(self) -> None:
+        """
+        Increments the data version of the database in its own transaction.
+        """
+        connection = None
+        try:
+            connection = self._connection()
+            cursor = connection.cursor()
+            bump_mysql_data_version(cursor)
+            connection.commit()
+            cursor.close()
+        except mysql.Error as err:
+            print(f"Error: {err}")
+        finally:
+            if connection:
+                connection.close()
+
+    def rebuild_summaries(self) -> None:
+        """
+        Recomputes the summary tables of the aggregate queries from the fact tables in a single
+        transaction, to repair them after writes that bypassed insert_data_in_batches.
+        """
+        connection = None
+        start = time.perf_counter()
+        try:
+            connection = self._connection()
+            cursor = connection.cursor()
+            rebuild_summaries(cursor)
+            bump_mysql_data_version(cursor)
+            connection.commit()
+            cursor.close()
+        except mysql.Error as err:
+            print(f"Error: {err}")
+        finally:
+            if connection:
+                connection.close()
+        self.phase_times["summaries"] = time.perf_counter() - start
+
+    def rebuild_constraints(self) -> None:
+        """
+        Adds the foreign keys and secondary indexes left out by a deferred load, one ALTER TABLE per
+        table, and records the time spent in phase_times["rebuild"].
+
+        Raises:
+            ValueError: If the loaded rows would violate a foreign key, see add_constraints.
+        """
+        connection = None
+        start = time.perf_counter()
+        try:
+            connection = self._connection()
+            cursor = connection.cursor()
+            for statement in add_constraints(cursor, self.database).values():
+                print(statement)
+            cursor.close()
+        except mysql.Error as err:
+            print(f"Error: {err}")
+        finally:
+            if connection:
+                connection.close()
+        self.phase_times["rebuild"] = time.perf_counter() - start
+
+    def _load_checkpoints(self, cursor, seed: int, shards: int) -> Dict[int, Tuple[int, int, int, int]]:
+        """
+        Reads the committed batches of an interrupted load.
+
+        Args:
+            cursor: Cursor of a connection to the database.
+            seed (int): Base seed of the resumed run.
+            shards (int): Number of shards of the resumed run.
+
+        Returns:
+            dict: For each shard, the next batch number, the samples already inserted, the next
+            identifier counter and the size of its last committed batch.
+
+        Raises:
+            ValueError: If the checkpoints were written by a run with another seed or shard count.
+        """
+        cursor.execute("SELECT Shard, Batch, Seed, Num_Samples, Id_Start FROM ingest_checkpoint ORDER BY Shard, Batch")
+        progress = {}
+        for shard, batch, batch_seed, batch_samples, id_start in cursor.fetchall():
+            next_batch, samples_done, _, _ = progress.get(shard, (0, 0, None, None))
+            if shard >= shards or batch != next_batch or batch_seed != _batch_seed(seed, shard, batch, shards):
+                raise ValueError(f"ingest_checkpoint does not belong to a run with seed {seed} and {shards} shards")
+            progress[shard] = (batch + 1, samples_done + batch_samples, id_start + batch_samples + 1, batch_samples)
+        print(f"Resuming: {sum(done for _, done, _, _ in progress.values())} samples already inserted")
+        return progress
+
+    def _insert_shard(self, shard: int, num_samples: int, sizing: Dict[str, float], mode: str, seed: int,
+                      shards: int, progress: Tuple[int, int, int, int] = None) -> Tuple[Dict[str, List[float]], List[dict], str]:
+        """
+        Generates and inserts the batches of one shard through a dedicated connection.
+        It runs in the worker processes when the load is sharded.
+
+        Args:
+            shard (int): Index of the shard.
+            num_samples (int): Number of samples of the shard.
+            sizing (dict): Keyword arguments of the BatchSizeController of the shard.
+            mode (str): Insertion mode, see insert_data_in_batches.
+            seed (int): Base seed of the run.
+            shards (int): Total number of shards.
+            progress (tuple): Next batch, inserted samples, next identifier counter and size of the last
+                committed batch of a resumed shard.
+
+        Returns:
+            tuple: Rows inserted and seconds spent per table, the telemetry records of the batches and
+            the MySQL error that stopped the shard, None when all its batches were committed. The
+            error is returned as text since the exceptions of mysql.connector do not always survive
+            the trip back from a worker process.
+        """
+        stats = {}
+        telemetry = []
+        error = None
+        i, samples_done, id_cursor, last_size = progress or (0, 0, shard * (ID_SPACE // shards), None)
+        if last_size:
+            # the controller goes on from the last committed batch instead of starting over
+            sizing = {**sizing, "batch_size": min(max(last_size, sizing["min_size"]), sizing["max_size"])}
+        connection = None
+        cursor = None
+        try:
+            connection = self._connection(allow_local_infile=(mode == "load_data"))
+            cursor = connection.cursor()
+            if self.defer_constraints:
+                # the constraints are checked when they are added back
+                cursor.execute("SET SESSION FOREIGN_KEY_CHECKS=0, UNIQUE_CHECKS=0")
+            max_packet = None
+            if mode == "executemany":
+                # mysql.connector folds an executemany INSERT into a single multi-row statement
+                cursor.execute("SELECT @@max_allowed_packet")
+                max_packet = cursor.fetchone()[0]
+            controller = BatchSizeController(max_packet=max_packet, **sizing)
+
+            progress_bar = tqdm(total=num_samples, initial=samples_done, unit="samples",
+                                desc=f"Inserting batches (shard {shard})", position=shard)
+            while samples_done < num_samples:
+                batch_start = time.perf_counter()
+                batch_seed = _batch_seed(seed, shard, i, shards)
+                datagen = DataGenerator(num_samples=controller.next_size(num_samples - samples_done),
+                                        seed=batch_seed, id_start=id_cursor, id_seed=seed)
+                if mode == "row":
+                    sample_df, patients_df= datagen.generate_random_data(i=i) 
+                    sample_df, patients_df = self._storage_ids(sample_df), self._storage_ids(patients_df)
+                    sample_ids = sample_df["Sample_ID"].unique().tolist()
+                    stored = _timed(stats, "summaries", 0, stored_rows, cursor, sample_ids)
+                    _timed(stats, "patient", len(patients_df), self._insert_patient_to_db, patients_df, cursor)
+                    _timed(stats, "sample+sample_microorganism", len(sample_df), self._insert_sample_to_db, sample_df, cursor)
+                    rows = len(patients_df) + len(sample_df)
+                    sizes = [payload_bytes(patients_df), payload_bytes(sample_df)]
+                    samples = sample_df[sample_df["Num_Microorganisms"] == 0]
+                    links = sample_df[list(TABLE_COLUMNS["sample_microorganism"])]
+                else:
+                    tables = datagen.generate_columnar_data()
+                    rows, sizes = 0, []
+                    for table in ("patient", "sample", "sample_microorganism"):
+                        tables[table] = self._storage_ids(tables[table])
+                    sample_ids = tables["sample"]["Sample_ID"].tolist()
+                    stored = _timed(stats, "summaries", 0, stored_rows, cursor, sample_ids)
+                    for table in ("patient", "sample", "sample_microorganism"):
+                        columns = tables[table]
+                        table_rows = len(columns[TABLE_KEYS[table][0]])
+                        _timed(stats, table, table_rows, self._bulk_insert_table, table, columns, cursor, mode, max_packet)
+                        rows += table_rows
+                        sizes.append(payload_bytes(columns))
+                    samples = pd.DataFrame(tables["sample"])
+                    links = pd.DataFrame(tables["sample_microorganism"])
+                if not stored[0].empty:
+                    # the batch rewrote stored samples, the upserts replaced their values and LOAD DATA
+                    # IGNORE kept them, so the summaries count what the tables hold now
+                    samples, links = _timed(stats, "summaries", 0, stored_rows, cursor, sample_ids)
+                _timed(stats, "summaries", len(links), update_summaries, cursor, shard, samples, links, stored)
+                cursor.execute("INSERT INTO ingest_checkpoint (Shard, Batch, Seed, Num_Samples, Id_Start) "
+                               "VALUES (%s, %s, %s, %s, %s)", (shard, i, batch_seed, datagen.num_samples, id_cursor))
+                commit_start = time.perf_counter()
                 connection.commit()
-                seed += 1
+                commit_seconds = time.perf_counter() - commit_start
+                record = controller.record(datagen.num_samples, rows, sum(sizes), max(sizes),
+                                           time.perf_counter() - batch_start, commit_seconds)
+                telemetry.append({"shard": shard, "batch": i, **record})
+                samples_done += datagen.num_samples
+                id_cursor += datagen.id_block
                 i += 1
+                progress_bar.set_postfix(controller.summary(), refresh=False)
+                progress_bar.update(datagen.num_samples)
+            progress_bar.close()
 
         except mysql.Error as err:
             print(f"Error: {err}")
+            error = str(err)
         finally:
             if cursor:
                 cursor.close()
             if connection:
                 connection.close()
+        return stats, telemetry, error
+
+    def _storage_ids(self, table):
+        """
+        Converts the identifier columns of a DataFrame or a dictionary of column arrays to the
+        integer keys stored in the "int" id mode. Tables are returned unchanged in the "char" mode.
+        """
+        if self.id_mode == "char":
+            return table
+        table = table.copy()
+        for column in ID_COLUMNS:
+            if column in table:
+                table[column] = encode_ids(np.asarray(table[column])).astype(np.int64)
+        return table
+
+    def _connection(self, allow_local_infile: bool = False):
+        """
+        Opens a new connection to the database of this instance.
+        """
+        return mysql.connect(
+            host="localhost",
+            user="root",
+            password=self.password,
+            database=self.database,
+            allow_local_infile=allow_local_infile
+        )
+
+    def _bulk_insert_table(self, table: str, columns: Dict[str, np.ndarray], cursor, mode: str,
+                           max_packet: int = None) -> None:
+        """
+        Inserts a batch of column arrays into a table in a single round trip, or one per packet when
+        the multi-row statement would exceed max_allowed_packet.
+
+        Args:
+            table (str): The destination table.
+            columns (dict): Column name to numpy array, as returned by DataGenerator.generate_columnar_data.
+            cursor: The cursor used to run the insertion.
+            mode (str): "executemany" for a multi-row upsert or "load_data" for LOAD DATA LOCAL INFILE.
+            max_packet (int): max_allowed_packet of the server, bounds the multi-row statements.
+        """
+        names = list(columns)
+        if mode == "executemany":
+            for rows in statement_slices(columns, max_packet):
+                cursor.executemany(_upsert_query(table, names),
+                                   list(zip(*(columns[name][rows].tolist() for name in names))))
+            return
+
+        # LOAD DATA cannot update existing rows, duplicated keys keep the stored values
+        with tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False, newline="") as file:
+            pd.DataFrame(columns).to_csv(file, sep="\t", header=False, index=False, lineterminator="\n")
+        try:
+            cursor.execute(
+                f"LOAD DATA LOCAL INFILE %s IGNORE INTO TABLE {table} "
+                "FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' "
+                f"({', '.join(names)})", (file.name,))
+        finally:
+            os.remove(file.name)
     
-    def _insert_microorganism_to_db(self, cursor):
+    def _insert_microorganism_to_db(self, cursor, seed: int = 42):
         """
         Inserts data from a CSV file into the database using the provided cursor. Data is inserted
         into the  microorganism tables.
 
+        The sequence lengths are drawn by DataGenerator.generate_microorganism_columns with the seed
+        of the run, so a load repeated with the same seed stores the same catalog, the one written
+        by dataset_writers for that seed.
+
         Args:
             cursor: The total number of samples to generate and insert into the database.
+            seed (int): Base seed of the run.
         """
                 
         microorganism_insert_query = """
@@ -199,14 +764,10 @@ class DbCreation:
         FASTA=VALUES(FASTA), 
         Seq_length=VALUES(Seq_length)"""
 
-        csv = pd.read_csv(os.path.join(os.getcwd(), "..", "data-files", "microorganisms.csv"))
-        #csv = pd.read_csv(os.path.join(os.getcwd(), "data-files", "microorganisms.csv"))
-        
-        for _, row in csv.iterrows():
-            id= row["Microorganism_ID"]
-            fasta="seq_" + id + ".fasta"
-            Seq_length = np.random.randint(1000000, 100000000)
-            microorganism_data=(id, row["Species"], row["Kingdom"],fasta, Seq_length)
+        columns = DataGenerator(num_samples=0, seed=seed).generate_microorganism_columns()
+        for id, species, kingdom, fasta, Seq_length in zip(*(columns[name].tolist() for name in TABLE_COLUMNS["microorganism"])):
+            key = encode_id(id) if self.id_mode == "int" else id
+            microorganism_data=(key, species, kingdom, fasta, Seq_length)
             cursor.execute(microorganism_insert_query, microorganism_data)
 
 
@@ -305,19 +866,41 @@ class DataGenerator:
         __generateSampleData__(self): Generates random data for samples.
         generate_single_row(self) -> list: Generates a single row of combined data from microorganisms, patients, and samples.
         generate_random_data(self, i: int): Generates random data for the specified number of samples and batches it for insertion.
+        generate_columnar_data(self) -> dict: Generates the same tables as column arrays using vectorized draws.
+        generate_microorganism_columns(self) -> dict: Generates the microorganism table from the catalog.
     """
     
-    def __init__(self, num_samples: int, seed: int):
+    def __init__(self, num_samples: int, seed: int, id_start: int = None, id_seed: int = 0):
         """
         Initializes the DataGenerator instance with the specified number of samples and seed value.
 
         Args:
             num_samples (int): The total number of data samples to generate.
             seed (int): The seed value for random number generators to ensure reproducibility.
+            id_start (int): First counter of the IdAllocator range used for Patient_ID and Sample_ID.
+                The generator uses at most id_block counters. When None, identifiers are drawn at
+                random and may collide with other batches.
+            id_seed (int): Seed of the identifier permutation, shared by all the generators of a run.
         """
         self.num_samples = num_samples
-        random.seed(seed) # ensure reproducibility
-        np.random.seed(seed)
+        self.id_start = id_start
+        if id_start is not None:
+            self._patient_ids = IdAllocator("PAC", id_seed, start=id_start, stop=id_start + self.id_block)
+            self._sample_ids = IdAllocator("SMP", id_seed, start=id_start, stop=id_start + self.id_block)
+        # per instance generators, seeded like the former global random.seed/np.random.seed
+        # calls so that several generators can live in the same process
+        self._random = random.Random(seed) # ensure reproducibility
+        self._np_random = np.random.RandomState(seed)
+        # independent generator for the columnar mode
+        self.rng = np.random.default_rng(seed)
+
+    @property
+    def id_block(self) -> int:
+        """
+        Number of identifier counters a generator may consume: every patient owns at least one
+        sample and generate_random_data can exceed num_samples by one sample.
+        """
+        return self.num_samples + 1
       
     def __generateMicroorganismData__(self) -> str:
         """
@@ -326,11 +909,10 @@ class DataGenerator:
         Returns:
             tuple: A tuple containing the microorganism ID and diseases.
         """
-        csv = pd.read_csv(os.path.join(os.getcwd(), "..", "data-files", "microorganisms.csv"))
-        # csv = pd.read_csv(os.path.join(os.getcwd(), "data-files", "microorganisms.csv"))
+        csv = load_microorganism_catalog(_catalog_path())
 
-        row = csv.iloc[np.random.randint(0, csv.shape[0]), :]
-        return row.loc["Microorganism_ID"], row.loc["Diseases"].split(",")[np.random.randint(0, len(row.loc["Diseases"].split(",")))]
+        row = csv.iloc[self._np_random.randint(0, csv.shape[0]), :]
+        return row.loc["Microorganism_ID"], row.loc["Diseases"].split(",")[self._np_random.randint(0, len(row.loc["Diseases"].split(",")))]
     
     def __generatePatientData__(self) -> List:
         """
@@ -340,26 +922,19 @@ class DataGenerator:
             list: A list containing the patient's ID, age, birth method, location, and activity level.
         """
         def patient_id():
-            numbers = ''.join(random.choices(string.digits, k=5))
-            letters = ''.join(random.choices(string.ascii_uppercase, k=3))
+            if self.id_start is not None:
+                return self._patient_ids.allocate(1)[0]
+            numbers = ''.join(self._random.choices(string.digits, k=5))
+            letters = ''.join(self._random.choices(string.ascii_uppercase, k=3))
             return f'PAC-{numbers}-{letters}'
 
-        delivery_methods = ['Cesarean', 'Natural']
-        locations = [
-            'Europe', 'Africa', 'North America', 'South America', 
-            'Central Asia', 'East Asia', 'Antarctica', 
-            'Southeast Asia', 'Middle East', 'Oceania'
-        ]
-        activity_levels = ['Active', 'Sedentary']
-        sex= ['M','F']
-
         return [
             patient_id(), # Patient ID
-            random.randint(0, 100),  # Age
-            random.choice(delivery_methods),  # Birth
-            random.choice(locations),  # Localization
-            random.choice(activity_levels),  # Activity levels
-            random.choice(sex) #Sex
+            self._random.randint(0, 100),  # Age
+            self._random.choice(BIRTH_TYPES),  # Birth
+            self._random.choice(LOCATIONS),  # Localization
+            self._random.choice(LIFESTYLES),  # Activity levels
+            self._random.choice(SEXES) #Sex
         ]
         
     def __generateSampleData__(self):
@@ -370,22 +945,21 @@ class DataGenerator:
             tuple: A tuple containing the sample ID, collection date, body part, and sample type.
         """
         def sample_id():
-            numbers = ''.join(random.choices(string.digits, k=5))
-            letters = ''.join(random.choices(string.ascii_uppercase, k=3))
+            if self.id_start is not None:
+                return self._sample_ids.allocate(1)[0]
+            numbers = ''.join(self._random.choices(string.digits, k=5))
+            letters = ''.join(self._random.choices(string.ascii_uppercase, k=3))
             return f'SMP-{numbers}-{letters}'
 
         def random_date(start, end):
             delta = end - start
             int_delta = (delta.days * 24 * 60 * 60) + delta.seconds
-            random_second = random.randrange(int_delta)
+            random_second = self._random.randrange(int_delta)
             return start + timedelta(seconds=random_second)
 
-        body_parts = ['Head', 'Chest', 'Arm', 'Leg', 'Foot', 'Hand']
-        sample_types = ['Blood', 'Tissue', 'Saliva', 'Urine']
-
         date = random_date(datetime(2002, 1, 1), datetime(2023, 12, 31)).strftime('%Y-%m-%d')
-        body_part = random.choice(body_parts)
-        sample_type = random.choice(sample_types)
+        body_part = self._random.choice(BODY_PARTS)
+        sample_type = self._random.choice(SAMPLE_TYPES)
 
         return sample_id(), date, body_part, sample_type   
         
@@ -405,11 +979,11 @@ class DataGenerator:
         rows=[]
         disease_list=[]
         Sample_ID, Date, Body_Part, Sample_Type = self.__generateSampleData__()
-        num_microorganism= random.randint(1,10)
+        num_microorganism= self._random.randint(1,10)
         for i in range(num_microorganism):
             Microorganism_ID, Disease = self.__generateMicroorganismData__()
             disease_list.append(Disease)
-            qPCR = np.random.randint(50, 1000)
+            qPCR = self._np_random.randint(50, 1000)
             rows.append([Sample_ID, Date, Body_Part, Sample_Type, Microorganism_ID, qPCR, patient_id, i])
 
 
@@ -435,10 +1009,14 @@ class DataGenerator:
         while len(patients_data) < self.num_samples:
             Patient_ID, Age, Birth, Localization, Activity_Levels, Sex = self.__generatePatientData__()
             #generate a random number of samples for each patient
-            for _ in range(random.randint(0, self.num_samples*2//self.num_samples)):  
+            num_patient_samples = self._random.randint(0, self.num_samples*2//self.num_samples)
+            if num_patient_samples == 0 and self.id_start is not None:
+                # patients without samples are never stored, give their id back
+                self._patient_ids.release_last()
+            for _ in range(num_patient_samples):  
                 data, disease_list = self.generate_sample_rows(Patient_ID)
                 #get a random disease amoung the possible diseases.
-                Disease= random.choice(disease_list)
+                Disease= self._random.choice(disease_list)
                 patients_data.append([Patient_ID, Age, Birth, Localization, Activity_Levels, Disease, Sex])
                 #add all the list of data to rows list
                 rows.extend(data)
@@ -450,4 +1028,106 @@ class DataGenerator:
         patients_df = pd.DataFrame(patients_data, columns=[
             "Patient_ID", "Age", "Birth_Type", "Location", "Lifestyle", "Disease", "Sex"])
         
-        return sample_df, patients_df
\ No newline at end of file
+        return sample_df, patients_df
+
+    def generate_columnar_data(self) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Generates num_samples samples with their patients and microorganism occurrences in a single
+        vectorized pass. The catalog is loaded once and every column is drawn from the seeded
+        numpy Generator, so the output only depends on the seed.
+
+        As in generate_random_data, every patient owns one or two samples and its disease is taken
+        from one of the microorganisms found in them. Microorganisms are not repeated inside a sample.
+
+        Returns:
+            dict: A dictionary with the keys "patient", "sample" and "sample_microorganism", each one
+            mapping the table column names to numpy arrays of the same length, empty when
+            num_samples is 0.
+        """
+        num_samples = self.num_samples
+        if num_samples == 0:
+            numeric = {"Age": np.int64, "qPCR": np.int64, "Date": "datetime64[D]"}
+            return {table: {column: np.empty(0, dtype=numeric.get(column, str)) for column in TABLE_COLUMNS[table]}
+                    for table in ("patient", "sample", "sample_microorganism")}
+        rng = self.rng
+        catalog = load_microorganism_catalog(_catalog_path())
+
+        # samples per patient, trimmed so that they add up to num_samples
+        samples_per_patient = rng.integers(1, 3, size=num_samples)
+        num_patients = int(np.searchsorted(np.cumsum(samples_per_patient), num_samples)) + 1
+        samples_per_patient = samples_per_patient[:num_patients]
+        samples_per_patient[-1] -= samples_per_patient.sum() - num_samples
+        sample_patient = np.repeat(np.arange(num_patients), samples_per_patient)
+
+        # distinct microorganisms per sample: first k positions of a random permutation of the catalog
+        num_catalog = len(catalog)
+        microorganisms_per_sample = rng.integers(1, min(10, num_catalog) + 1, size=num_samples)
+        positions = np.arange(num_catalog)
+        picks = []
+        for start in range(0, num_samples, _COLUMNAR_CHUNK):
+            counts = microorganisms_per_sample[start:start + _COLUMNAR_CHUNK]
+            order = np.argsort(rng.random((counts.size, num_catalog), dtype=np.float32), axis=1)
+            picks.append(order[positions < counts[:, None]])
+        occurrence_microorganism = np.concatenate(picks) if picks else np.empty(0, dtype=np.int64)
+        occurrence_sample = np.repeat(np.arange(num_samples), microorganisms_per_sample)
+
+        # disease of each patient: one of the diseases of a random microorganism found in its samples
+        first_sample = np.concatenate(([0], np.cumsum(samples_per_patient)[:-1]))
+        occurrences_per_patient = np.add.reduceat(microorganisms_per_sample, first_sample)
+        first_occurrence = np.concatenate(([0], np.cumsum(microorganisms_per_sample)))[first_sample]
+        chosen = occurrence_microorganism[first_occurrence + (rng.random(num_patients) * occurrences_per_patient).astype(np.int64)]
+        disease_lists = catalog["Diseases"].str.split(",")
+        disease_count = disease_lists.str.len().to_numpy()
+        disease_start = np.concatenate(([0], np.cumsum(disease_count)[:-1]))
+        diseases = np.array([d for diseases in disease_lists for d in diseases])
+        disease = diseases[disease_start[chosen] + (rng.random(num_patients) * disease_count[chosen]).astype(np.int64)]
+
+        if self.id_start is None:
+            patient_ids = decode_ids("PAC", rng.integers(0, ID_SPACE, size=num_patients))
+            sample_ids = decode_ids("SMP", rng.integers(0, ID_SPACE, size=num_samples))
+        else:
+            patient_ids = self._patient_ids.allocate(num_patients)
+            sample_ids = self._sample_ids.allocate(num_samples)
+        first_day = np.datetime64("2002-01-01")
+        num_days = (np.datetime64("2023-12-31") - first_day).astype(np.int64)
+
+        patient = {
+            "Patient_ID": patient_ids,
+            "Age": rng.integers(0, 101, size=num_patients),
+            "Birth_Type": np.array(BIRTH_TYPES)[rng.integers(0, len(BIRTH_TYPES), size=num_patients)],
+            "Location": np.array(LOCATIONS)[rng.integers(0, len(LOCATIONS), size=num_patients)],
+            "Lifestyle": np.array(LIFESTYLES)[rng.integers(0, len(LIFESTYLES), size=num_patients)],
+            "Disease": disease,
+            "Sex": np.array(SEXES)[rng.integers(0, len(SEXES), size=num_patients)],
+        }
+        sample = {
+            "Sample_ID": sample_ids,
+            "Patient_ID": patient_ids[sample_patient],
+            "Date": first_day + rng.integers(0, num_days, size=num_samples),
+            "Body_Part": np.array(BODY_PARTS)[rng.integers(0, len(BODY_PARTS), size=num_samples)],
+            "Sample_Type": np.array(SAMPLE_TYPES)[rng.integers(0, len(SAMPLE_TYPES), size=num_samples)],
+        }
+        sample_microorganism = {
+            "Microorganism_ID": catalog["Microorganism_ID"].to_numpy().astype("U13")[occurrence_microorganism],
+            "Sample_ID": sample_ids[occurrence_sample],
+            "qPCR": rng.integers(50, 1000, size=occurrence_sample.size),
+        }
+        return {"patient": patient, "sample": sample, "sample_microorganism": sample_microorganism}
+
+    def generate_microorganism_columns(self) -> Dict[str, np.ndarray]:
+        """
+        Generates the microorganism table from the catalog, drawing the sequence lengths with the
+        columnar generator, as _insert_microorganism_to_db does when filling the database.
+
+        Returns:
+            dict: The microorganism column names mapped to numpy arrays.
+        """
+        catalog = load_microorganism_catalog(_catalog_path())
+        ids = catalog["Microorganism_ID"].to_numpy().astype("U13")
+        return {
+            "Microorganism_ID": ids,
+            "Species": catalog["Species"].to_numpy().astype(str),
+            "Kingdom": catalog["Kingdom"].to_numpy().astype(str),
+            "FASTA": np.char.add(np.char.add("seq_", ids), ".fasta"),
+            "Seq_length": self.rng.integers(1000000, 100000000, size=ids.size),
+        }
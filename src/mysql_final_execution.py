@@ -1,8 +1,9 @@
 from mysql_queries import Queries
+import mysql_pool
 import pandas as pd
 import numpy as np
-import random
 import matplotlib.pyplot as plt
+from workload import WorkloadSampler, mysql_distributions, write_trace
 
 # Función para añadir una nueva fila al DataFrame
 def add_row(df, query, time):
@@ -17,11 +18,25 @@ def tiempo_query(n, query_func, n_query, df):
         tiempos.append(t * 1000)  # Convertir a ms
     return add_row(df, f"Q{n_query}", np.mean(tiempos))
 
-def main(n=50):
+def sample_parameters(password, bd, n, zipf=None, seed=42):
+    """Draws the Q2 microorganisms and Q3 diseases from the values stored in the database."""
+    connection = mysql_pool.connect(password, bd)
+    cursor = connection.cursor()
+    try:
+        sampler = WorkloadSampler(mysql_distributions(cursor), zipf=zipf, seed=seed)
+    finally:
+        cursor.close()
+        connection.close()
+    return sampler.sample(2, n), sampler.sample(3, n)
+
+def main(n=50, zipf=None, seed=42, trace="./query_optimization/mysql/mysql_final_trace.jsonl"):
     password = "bdbiO"
     bd = "microbiomeDB"
     
-    connection = Queries(password, bd)
+    connection = Queries(password, bd, use_cache=False)
+    microorganismos, diseases = sample_parameters(password, bd, n, zipf, seed)
+    # parameters of the run, replayable with workload.py replay
+    write_trace(trace, [(2, args) for args in microorganismos] + [(3, args) for args in diseases])
 
     # Crear un DataFrame vacío con columnas 'Query' y 'Time'
     df = pd.DataFrame(columns=['Query', 'Time'])
@@ -29,18 +44,14 @@ def main(n=50):
     # Ejecutar cada consulta 50 veces y añadir la media al DataFrame
     df = tiempo_query(n, connection.query1, 1, df)
 
-    microorganismos = ["MIC-17098-ZUZ", "MIC-21174-VEX", "MIC-21714-ZMU", "MIC-21822-ASC"]
     tiempos = []
-    for _ in range(n):
-        microorganismo = random.choice(microorganismos)
+    for microorganismo, in microorganismos:
         t = connection.query2(microorganismo)
         tiempos.append(t * 1000)  # Convertir a ms
     df = add_row(df, "Q2", np.mean(tiempos))
 
-    diseases = ["Herpes simplex", "Tuberculosis", "Respiratory infections", "Tetanus"]
     tiempos = []
-    for _ in range(n):
-        disease = random.choice(diseases)
+    for disease, in diseases:
         t = connection.query3(disease)    
         tiempos.append(t * 1000)  # Convertir a ms
     df = add_row(df, "Q3", np.mean(tiempos))
@@ -55,6 +66,8 @@ def main(n=50):
 if __name__ == "__main__":
     df = main()
     df.to_csv('./query_optimization/mysql/mysql_final_results.csv', index=False)
+    # time spent obtaining connections, not included in the query times
+    print(mysql_pool.connect_metrics())
     
     # Generación del gráfico de barras
     plt.figure(figsize=(10, 6))
@@ -1,4 +1,5 @@
 import mysql.connector as mysql
+import mysql_pool
 
 
 class AlterTables:
@@ -9,22 +10,21 @@ class AlterTables:
 
     def __connection__(self):
         try:
-            connection = mysql.connect(
-                    host="localhost",
-                    user="root",
-                    password=self.password,
-                    database= self.database)
+            connection = mysql_pool.connect(self.password, self.database)
             return  connection
         except mysql.Error as err:
             print(f"Error: {err}")
 
 
-    def __add_index__(self, table:str, column: str):
+    def __add_index__(self, table:str, column: str, visible: bool = True):
         connection= self.__connection__()
+        if connection is None:
+            return
         cursor=connection.cursor()
         try:
             index_name=f'index_{"".join(col[0].upper() for col in column)}'
-            line=f'ALTER TABLE `{table}` ADD INDEX `{index_name}` ({", ".join([f"`{col}`" for col in column])}) VISIBLE;'
+            visibility = "VISIBLE" if visible else "INVISIBLE"
+            line=f'ALTER TABLE `{table}` ADD INDEX `{index_name}` ({", ".join([f"`{col}`" for col in column])}) {visibility};'
             cursor.execute(line)
             connection.commit()
             print("ok")
@@ -40,6 +40,8 @@ class AlterTables:
     def __drop_index__(self, table: str, column:str):
         try:
             connection = self.__connection__()
+            if connection is None:
+                return
             with connection.cursor() as cursor:
                 index_name=f'index_{"".join(col[0].upper() for col in column)}'
                 query = f'ALTER TABLE `{table}` DROP INDEX `{index_name}`;'
@@ -52,9 +54,30 @@ class AlterTables:
             if connection:
                 connection.close()
 
+    def __set_index_visibility__(self, table: str, column: str, visible: bool):
+        # an invisible index is still maintained but ignored by the optimizer, toggling it is instant
+        try:
+            connection = self.__connection__()
+            if connection is None:
+                return
+            with connection.cursor() as cursor:
+                index_name=f'index_{"".join(col[0].upper() for col in column)}'
+                visibility = "VISIBLE" if visible else "INVISIBLE"
+                query = f'ALTER TABLE `{table}` ALTER INDEX `{index_name}` {visibility};'
+                cursor.execute(query)
+                connection.commit()
+                print("ok")
+        except mysql.Error as err:
+            print(f"Error: {err}")
+        finally:
+            if connection:
+                connection.close()
+
     def __alter_type__(self, table, column, new_type):
         try:
             connection = self.__connection__()
+            if connection is None:
+                return
             with connection.cursor() as cursor:
                 query = f'ALTER TABLE `{table}` CHANGE COLUMN `{column}` `{column}` {new_type} NULL DEFAULT NULL;'
                 cursor.execute(query)
@@ -69,6 +92,8 @@ class AlterTables:
     def __change_Storage__(self, table,type):
         try:
             connection = self.__connection__()
+            if connection is None:
+                return
             with connection.cursor() as cursor:
                 query =         line= f"ALTER TABLE {table} ENGINE={type}"
                 cursor.execute(query)
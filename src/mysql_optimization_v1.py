@@ -14,7 +14,7 @@ def main():
     args = parser.parse_args()
     
     myqueries = mysql_queries.Queries(password=args.password, 
-                                  database=args.database)
+                                  database=args.database, use_cache=False)
     alter=mysql_index_alter.AlterTables(password=args.password, 
                                   database=args.database)
     
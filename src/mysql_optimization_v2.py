@@ -1,32 +1,118 @@
+import argparse
+import json
+import re
 import mysql.connector
+import mysql_pool
 import time
 import itertools
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
+from mysql_dbCreation import TABLE_COLUMNS
+from query_plans import mysql_plan
+from index_selection import evaluate, pareto_front
+from workload import PARAMETERIZED_QUERIES, WorkloadSampler, mysql_distributions
+from prepared_statements import PreparedStatements
+
+_INDEX_PATTERN = re.compile(r"CREATE INDEX (\w+) ON (\w+)\s*\(([^)]*)\)", re.IGNORECASE)
+_TABLE_PATTERN = re.compile(r"\b(" + "|".join(sorted(TABLE_COLUMNS, key=len, reverse=True)) + r")\b(?:\s+(?:AS\s+)?(\w+))?",
+                            re.IGNORECASE)
+# Clauses whose columns an index can serve, each one ends where the next keyword starts
+_CLAUSE_PATTERN = re.compile(r"\b(?:WHERE|ON|GROUP BY|ORDER BY|HAVING)\b(.*?)(?=\b(?:SELECT|FROM|JOIN|WHERE|ON|GROUP BY|"
+                             r"ORDER BY|HAVING|LIMIT)\b|\)|;|$)", re.IGNORECASE | re.DOTALL)
+# rebuild drops and creates the indices of every combination, invisible builds every candidate once
+# and switches combinations with ALTER INDEX ... VISIBLE/INVISIBLE
+INDEX_MODES = ("rebuild", "invisible")
+_SQL_KEYWORDS = {"join", "where", "on", "group", "order", "having", "limit", "inner", "left", "right", "as"}
+
+
+def parse_index(index_query):
+    """Returns the name, table and columns of a CREATE INDEX statement."""
+    match = _INDEX_PATTERN.search(index_query)
+    if match is None:
+        raise ValueError(f"Not a CREATE INDEX statement: {index_query}")
+    name, table, columns = match.groups()
+    return name, table.lower(), [column.strip().lower() for column in columns.split(",")]
+
+
+def query_columns(sql):
+    """
+    Returns the (table, column) pairs a query uses in its predicates, joins, groupings and orderings,
+    resolving the table aliases of the FROM and JOIN clauses.
+    """
+    aliases = {}
+    for table, alias in _TABLE_PATTERN.findall(sql):
+        table = table.lower()
+        aliases[table] = table
+        if alias and alias.lower() not in _SQL_KEYWORDS:
+            aliases[alias.lower()] = table
+    tables = set(aliases.values())
+    columns = set()
+    for clause in _CLAUSE_PATTERN.findall(sql):
+        for alias, column in re.findall(r"\b(\w+)\.(\w+)\b", clause):
+            if alias.lower() in aliases:
+                columns.add((aliases[alias.lower()], column.lower()))
+        # unqualified columns belong to the tables of the query that have them
+        for word in re.findall(r"(?<![.\w])(\w+)\b(?!\.)", clause):
+            for table in tables:
+                if word.lower() in (name.lower() for name in TABLE_COLUMNS[table]):
+                    columns.add((table, word.lower()))
+    return columns
+
+
+def relevant_indices(queries, indices):
+    """
+    Keeps, for every query, the indices whose leading column is one of the columns it filters,
+    joins, groups or sorts by. An index on any other column cannot change its plan.
+
+    Returns:
+        list: The relevant index statements of every query, in the order of indices.
+    """
+    parsed = [parse_index(index_query) for index_query in indices]
+    relevant = []
+    for query in queries:
+        columns = query_columns(query['sql'])
+        relevant.append([index_query for index_query, (_, table, index_columns) in zip(indices, parsed)
+                         if (table, index_columns[0]) in columns])
+    return relevant
 
 class QueryOptimizer:
-    def __init__(self, password, database):
+    def __init__(self, password, database, plans_output=None, analyze=False, index_mode="rebuild",
+                 prepared_output=None):
+        if index_mode not in INDEX_MODES:
+            raise ValueError(f"Unknown index mode {index_mode!r}, expected one of {INDEX_MODES}")
         self.password = password
         self.database = database
+        self.index_mode = index_mode
+        # CSV receiving the plan of every query under every engine and index combination
+        self.plans_output = plans_output
+        self.analyze = analyze
+        # indices created (or made visible) by apply_indices, so switching combinations only touches the difference
+        self._applied = set()
+        # candidates built once as invisible indices in the invisible mode
+        self._built = set()
+        # build time and size of every index created, see index_costs
+        self.index_builds = []
+        self.engine = None
+        # CSV receiving the prepare and execute times of every query, which then runs as a prepared statement
+        self.prepared_output = prepared_output
+        self.statements = PreparedStatements(password, database) if prepared_output else None
 
     def connect_to_db(self):
-        return mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=self.password,
-            database=self.database
-        )
+        """Gets a connection from the shared pool, closing it returns it to the pool."""
+        return mysql_pool.connect(self.password, self.database)
 
     def execute_query(self, query, params=None):
         """Executes a given SQL query and returns the duration of the execution in milliseconds."""
+        if self.statements is not None:
+            return self.execute_prepared(query, params)
         connection = self.connect_to_db()
         cursor = connection.cursor()
         try:
-            start_time = time.time()
+            start_time = time.perf_counter()
             cursor.execute(query, params)
             cursor.fetchall()  # Fetch results to complete query execution
-            duration = (time.time() - start_time) * 1000  # Convert to milliseconds
+            duration = (time.perf_counter() - start_time) * 1000  # Convert to milliseconds
         except mysql.connector.Error as err:
             print(f"Error executing query: {err}")
             duration = np.nan
@@ -35,6 +121,57 @@ class QueryOptimizer:
             connection.close()
         return duration
 
+    def execute_prepared(self, query, params=None):
+        """Executes a prepared query, already prepared by measure_query_times, and returns its duration in milliseconds."""
+        try:
+            start_time = time.perf_counter()
+            self.statements.execute(query, params)
+            return (time.perf_counter() - start_time) * 1000
+        except mysql.connector.Error as err:
+            print(f"Error executing query: {err}")
+            return np.nan
+
+    def record_prepared(self, queries, engine, combination):
+        """
+        Appends the prepare and execute times of the queries under an engine and index combination to
+        prepared_output, and deallocates the statements so the next combination prepares them again.
+        """
+        labels = {query['sql']: f"Q{i + 1}" for i, query in enumerate(queries)}
+        stats = self.statements.stats()
+        stats.insert(0, "Query", stats.pop("Statement").map(labels))
+        stats.insert(0, "Indices", encode_indices(combination))
+        stats.insert(0, "Engine", engine)
+        with open(self.prepared_output, "a") as f:
+            stats.to_csv(f, header=f.tell() == 0, index=False)
+        self.statements.timings = []
+        self.statements.clear()
+
+    def capture_plans(self, queries):
+        """Returns the index, rows examined and returned and fingerprint of the plan of every query."""
+        connection = self.connect_to_db()
+        cursor = connection.cursor()
+        plans = []
+        try:
+            for query in queries:
+                try:
+                    plans.append(mysql_plan(cursor, query['sql'], query.get('params'), self.analyze))
+                except mysql.connector.Error as err:
+                    print(f"Error explaining query: {err}")
+                    plans.append({})
+        finally:
+            cursor.close()
+            connection.close()
+        return plans
+
+    def record_plans(self, queries, engine, combination):
+        """Appends the plans of the queries under an engine and index combination to plans_output."""
+        if not self.plans_output:
+            return
+        records = [{"Engine": engine, "Indices": encode_indices(combination), "Query": f"Q{i + 1}", **plan}
+                   for i, plan in enumerate(self.capture_plans(queries))]
+        with open(self.plans_output, "a") as f:
+            pd.DataFrame(records).to_csv(f, header=f.tell() == 0, index=False)
+
     def drop_index(self, index_name, table_name):
         """Drops an index from a specified table if it exists."""
         connection = self.connect_to_db()
@@ -68,21 +205,63 @@ class QueryOptimizer:
             self.drop_index(index_name, table_name)
 
     def create_index(self, index_query):
-        """Creates an index using the specified SQL query."""
+        """Creates an index using the specified SQL query and records its build time and size."""
+        name, table, _ = parse_index(index_query)
         connection = self.connect_to_db()
         cursor = connection.cursor()
         try:
+            before = self.index_length(cursor, table)
+            start_time = time.perf_counter()
             cursor.execute(index_query)
+            build_s = time.perf_counter() - start_time
+            size = self.index_size(cursor, name, table)
+            self.index_builds.append({
+                "Engine": self.engine,
+                "Index": encode_indices([index_query.replace(" INVISIBLE;", ";")]) or name,
+                "Name": name,
+                "Build_s": build_s,
+                "Size_bytes": self.index_length(cursor, table) - before if size is None else size
+            })
         except mysql.connector.Error as err:
             print(f"Error creating index: {err}")
         finally:
             cursor.close()
             connection.close()
 
+    def index_length(self, cursor, table):
+        """Bytes taken by all the indices of a table, read without the statistics cache."""
+        cursor.execute("SET SESSION information_schema_stats_expiry=0;")
+        cursor.execute("SELECT INDEX_LENGTH FROM information_schema.TABLES WHERE TABLE_SCHEMA=%s AND TABLE_NAME=%s;",
+                       (self.database, table))
+        row = cursor.fetchone()
+        return int(row[0] or 0) if row else 0
+
+    def index_size(self, cursor, index_name, table):
+        """Bytes of an InnoDB index from its persistent statistics, None for the other engines."""
+        cursor.execute("SELECT stat_value * @@innodb_page_size FROM mysql.innodb_index_stats "
+                       "WHERE database_name=%s AND table_name=%s AND index_name=%s AND stat_name='size';",
+                       (self.database, table, index_name))
+        row = cursor.fetchone()
+        return int(row[0]) if row else None
+
+    def index_costs(self):
+        """Median build time and last size of every index per engine (Engine, Index, Name, Build_s, Size_bytes)."""
+        builds = pd.DataFrame(self.index_builds, columns=["Engine", "Index", "Name", "Build_s", "Size_bytes"])
+        return builds.groupby(["Engine", "Index", "Name"], as_index=False, dropna=False).agg(
+            Build_s=("Build_s", "median"), Size_bytes=("Size_bytes", "last"))
+
     def measure_query_times(self, queries):
-        """Measures the execution time of each query 30 times and returns the average times in milliseconds."""
+        """
+        Measures the execution time of each query 30 times and returns the average times in milliseconds.
+        In the prepared mode every query is prepared first and only its executions are averaged.
+        """
         avg_times = []
         for query in queries:
+            if self.statements is not None:
+                try:
+                    self.statements.prepare(query['sql'], query.get('params'))
+                except mysql.connector.Error as err:
+                    print(f"Error preparing query: {err}")
             durations = []
             for _ in range(30):
                 duration = self.execute_query(query['sql'], query.get('params'))
@@ -102,11 +281,18 @@ class QueryOptimizer:
             for engine in engines:
                 self.set_engine(engine)
                 self.disable_foreign_keys()
+                self.prepare_indices(indices)
                 for combination in tqdm(all_combinations, desc=f"Testing index combinations with engine {engine}"):
-                    self.drop_indices()
-                    for index_query in combination:
-                        self.create_index(index_query)
+                    if self.index_mode == "invisible":
+                        self.apply_indices(combination)
+                    else:
+                        self.drop_indices()
+                        for index_query in combination:
+                            self.create_index(index_query)
                     times = self.measure_query_times(queries)
+                    self.record_plans(queries, engine, combination)
+                    if self.statements is not None:
+                        self.record_prepared(queries, engine, combination)
                     result = {
                         "Engine": engine,
                         "Indices": combination,
@@ -122,11 +308,156 @@ class QueryOptimizer:
                     df_result = pd.DataFrame([result])
                     df_result.to_csv(f, header= not header_written, index=False)
                     header_written = True  # Header is written after the first write
+                self.release_indices()
+                self.enable_foreign_keys()
+        return results
+
+    def prepare_indices(self, indices):
+        """In the invisible mode, builds every candidate index once as an invisible index."""
+        self._applied = set()
+        if self.index_mode != "invisible":
+            return
+        for index_query in indices:
+            name, table, _ = parse_index(index_query)
+            self.drop_index(name, table)
+            self.create_index(f"{index_query.rstrip().rstrip(';')} INVISIBLE;")
+        self._built = set(indices)
+
+    def release_indices(self):
+        """Drops the indices left by apply_indices or prepare_indices."""
+        if self.index_mode == "invisible":
+            for index_query in self._built:
+                name, table, _ = parse_index(index_query)
+                self.drop_index(name, table)
+            self._built = set()
+            self._applied = set()
+        else:
+            self.apply_indices(())
+
+    def set_index_visibility(self, index_query, visible):
+        """Makes an index visible or invisible to the optimizer, the index itself is kept."""
+        name, table, _ = parse_index(index_query)
+        connection = self.connect_to_db()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"ALTER TABLE {table} ALTER INDEX {name} {'VISIBLE' if visible else 'INVISIBLE'};")
+        except mysql.connector.Error as err:
+            print(f"Error changing the visibility of {name} on {table}: {err}")
+        finally:
+            cursor.close()
+            connection.close()
+
+    def apply_indices(self, combination):
+        """
+        Switches from the previous combination to this one touching only the difference: the indices
+        are dropped and created in the rebuild mode and hidden and shown in the invisible mode.
+        """
+        combination = set(combination)
+        for index_query in self._applied - combination:
+            if self.index_mode == "invisible":
+                self.set_index_visibility(index_query, False)
+            else:
+                name, table, _ = parse_index(index_query)
+                self.drop_index(name, table)
+        for index_query in combination - self._applied:
+            if self.index_mode == "invisible":
+                self.set_index_visibility(index_query, True)
+            else:
+                self.create_index(index_query)
+        self._applied = combination
+
+    def explain_cost(self, query, params=None):
+        """Returns the optimizer cost estimate of a query from EXPLAIN FORMAT=JSON."""
+        connection = self.connect_to_db()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"EXPLAIN FORMAT=JSON {query}", params)
+            plan = json.loads(cursor.fetchone()[0])
+            return float(plan["query_block"].get("cost_info", {}).get("query_cost", np.nan))
+        except mysql.connector.Error as err:
+            print(f"Error explaining query: {err}")
+            return np.nan
+        finally:
+            cursor.close()
+            connection.close()
+
+    def optimize_pruned(self, queries, indices, engines, beam_width=3, top_k=3,
+                        output="query_optimization/mysql_pruned_optimization_results.csv"):
+        """
+        Searches the index combinations with a beam search ranked by EXPLAIN cost and times only the best ones.
+
+        Indices irrelevant to every query are discarded first (see relevant_indices) and a query is only
+        explained again when the indices relevant to it change. Starting from no indices, every
+        combination of the beam is extended with each remaining candidate and the beam_width cheapest
+        combinations, by the summed EXPLAIN cost of the queries, are kept. The search stops when no
+        extension is cheaper than the best combination found. The top_k cheapest combinations and the
+        baseline without indices are then timed with measure_query_times.
+
+        Returns:
+            list: The same Engine, Indices, Q1..Q7 records as optimize.
+        """
+        relevant = [frozenset(r) for r in relevant_indices(queries, indices)]
+        candidates = [index_query for index_query in indices if any(index_query in r for r in relevant)]
+        print(f"{len(candidates)} of {len(indices)} indices are relevant to some query")
+        results = []
+        with open(output, "a") as f:
+            header_written = f.tell() > 0
+            for engine in engines:
+                self.set_engine(engine)
+                self.disable_foreign_keys()
+                self.prepare_indices(candidates)
+                costs = {}
+                # a query is only explained again when the combination changes its relevant indices
+                query_costs = {}
+
+                def cost(combination):
+                    if combination not in costs:
+                        keys = [(i, combination.intersection(relevant[i])) for i in range(len(queries))]
+                        if any(key not in query_costs for key in keys):
+                            self.apply_indices(combination)
+                        for key in keys:
+                            if key not in query_costs:
+                                query = queries[key[0]]
+                                query_costs[key] = self.explain_cost(query['sql'], query.get('params'))
+                        costs[combination] = sum(query_costs[key] for key in keys)
+                    return costs[combination]
+
+                beam = [frozenset()]
+                best = cost(frozenset())
+                with tqdm(desc=f"Beam search with engine {engine}") as progress:
+                    while beam:
+                        expansions = {combination | {index_query} for combination in beam
+                                      for index_query in candidates if index_query not in combination}
+                        ranked = sorted(expansions, key=cost)[:beam_width]
+                        progress.update(len(expansions))
+                        if not ranked or not cost(ranked[0]) < best:
+                            break
+                        best = cost(ranked[0])
+                        beam = ranked
+
+                timed = [frozenset()] + [c for c in sorted(costs, key=costs.get) if c][:top_k]
+                for combination in tqdm(timed, desc=f"Timing the best combinations with engine {engine}"):
+                    self.apply_indices(combination)
+                    combination = tuple(index_query for index_query in indices if index_query in combination)
+                    times = self.measure_query_times(queries)
+                    self.record_plans(queries, engine, combination)
+                    if self.statements is not None:
+                        self.record_prepared(queries, engine, combination)
+                    result = {
+                        "Engine": engine,
+                        "Indices": combination,
+                        **{f"Q{i + 1}": time_ms for i, time_ms in enumerate(times)}
+                    }
+                    results.append(result)
+                    pd.DataFrame([result]).to_csv(f, header=not header_written, index=False)
+                    header_written = True
+                self.release_indices()
                 self.enable_foreign_keys()
         return results
 
     def set_engine(self, engine):
         """Sets the storage engine for the specified tables."""
+        self.engine = engine
         tables = ["patient", "sample", "microorganism", "sample_microorganism"]
         for table in tables:
             connection = self.connect_to_db()
@@ -179,10 +510,21 @@ if __name__ == "__main__":
     password = "bdbiO"
     database = "microbiomeDB"
 
+    # Q2 and Q3 run with parameters drawn from the stored values, weighted by the rows they select
+    connection = mysql_pool.connect(password, database)
+    cursor = connection.cursor()
+    try:
+        sampler = WorkloadSampler(mysql_distributions(cursor), seed=42)
+    finally:
+        cursor.close()
+        connection.close()
+    sample_parameters = {num_qry: sampler.sample(num_qry, 1)[0] for num_qry in PARAMETERIZED_QUERIES}
+    print(f"Q2 and Q3 parameters: {sample_parameters}")
+
     queries = [
         {"sql": "SELECT p.Patient_ID, COUNT(DISTINCT sm.Microorganism_ID) AS Num_Microorganisms FROM patient p, sample s, sample_microorganism sm WHERE p.Patient_ID= s.Patient_ID AND s.Sample_ID= sm.Sample_ID GROUP BY p.Patient_ID ORDER BY Num_Microorganisms DESC LIMIT 10;"},
-        {"sql": "SELECT sm.Sample_ID, sm.qPCR FROM sample_microorganism sm WHERE sm.Microorganism_ID = %s ORDER BY sm.qPCR DESC;", "params": ("microorganism_id",)},
-        {"sql": "SELECT p.Patient_ID, s.Sample_ID, s.Date, s.Body_Part, s.Sample_Type FROM patient p, sample s WHERE p.Patient_ID = s.Patient_ID AND p.Disease = %s ORDER BY s.Date;", "params": ("disease",)},
+        {"sql": "SELECT sm.Sample_ID, sm.qPCR FROM sample_microorganism sm WHERE sm.Microorganism_ID = %s ORDER BY sm.qPCR DESC;", "params": sample_parameters[2]},
+        {"sql": "SELECT p.Patient_ID, s.Sample_ID, s.Date, s.Body_Part, s.Sample_Type FROM patient p, sample s WHERE p.Patient_ID = s.Patient_ID AND p.Disease = %s ORDER BY s.Date;", "params": sample_parameters[3]},
         {"sql": "SELECT s.Sample_Type, COUNT(*) AS Sample_Count FROM sample s GROUP BY s.Sample_Type ORDER BY Sample_Count DESC;"},
         {"sql": "SELECT sm.Microorganism_ID, s.Sample_Type, COUNT(sm.Sample_ID) AS Sample_Count, AVG(sm.qPCR), STDDEV(sm.qPCR) FROM sample s, sample_microorganism sm WHERE s.Sample_ID= sm.Sample_ID GROUP BY s.Sample_Type, sm.Microorganism_ID ORDER BY sm.Microorganism_ID DESC;"},
         {"sql": "SELECT p1.Patient_ID, s1.Max_qPCR FROM (SELECT p.Patient_ID FROM patient p WHERE p.disease='Hepatitis B') p1, (SELECT s.Patient_ID, max(sm.qPCR) as Max_qPCR FROM sample s, microorganism m, sample_microorganism sm WHERE s.Sample_ID=sm.Sample_ID AND sm.Microorganism_ID=m.Microorganism_ID AND m.Species='Hepatitis B Virus' GROUP BY s.Patient_ID) s1 WHERE s1.Patient_ID=p1.Patient_ID;"},
@@ -201,10 +543,43 @@ if __name__ == "__main__":
 
     engines = ["InnoDB", "MyISAM", "MEMORY"]
 
-    optimizer = QueryOptimizer(password, database)
-    results = optimizer.optimize(queries, indices, engines)
+    parser = argparse.ArgumentParser(description="Time the queries under index combinations and storage engines.")
+    parser.add_argument('--search', choices=['exhaustive', 'beam'], default='exhaustive',
+                        help='Every index combination, or a beam search ranked by EXPLAIN cost')
+    parser.add_argument('--beam-width', type=int, default=3, help='Combinations kept at every step of the beam search')
+    parser.add_argument('--top-k', type=int, default=3, help='Combinations of the beam search that are timed')
+    parser.add_argument('--plans', action='store_true',
+                        help='Record the plan of every timed query in query_optimization/mysql_optimization_plans.csv')
+    parser.add_argument('--analyze', action='store_true', help='Capture the plans with EXPLAIN ANALYZE')
+    parser.add_argument('--index-mode', choices=INDEX_MODES, default='rebuild',
+                        help='Drop and create the indices of every combination, or build them once as invisible '
+                             'indices and toggle their visibility')
+    parser.add_argument('--prepared', action='store_true',
+                        help='Run the queries as prepared statements and record their prepare and execute times '
+                             'in query_optimization/mysql_prepared_times.csv')
+    args = parser.parse_args()
+
+    optimizer = QueryOptimizer(password, database,
+                               plans_output="query_optimization/mysql_optimization_plans.csv" if args.plans else None,
+                               analyze=args.analyze, index_mode=args.index_mode,
+                               prepared_output="query_optimization/mysql_prepared_times.csv" if args.prepared else None)
+    if args.search == 'beam':
+        results = optimizer.optimize_pruned(queries, indices, engines, beam_width=args.beam_width, top_k=args.top_k)
+        encoded_path = "query_optimization/mysql_encoded_pruned_optimization_results.csv"
+    else:
+        results = optimizer.optimize(queries, indices, engines)
+        encoded_path = "query_optimization/mysql_encoded_optimization_results.csv"
 
     # Encode indices and save the new results
     df_encoded_results = encode_results(pd.DataFrame(results))
-    df_encoded_results.to_csv("query_optimization/mysql_encoded_optimization_results.csv", index=False)
+    df_encoded_results.to_csv(encoded_path, index=False)
+
+    # Build time and size of every index, and the combinations that trade them best against latency
+    df_index_costs = optimizer.index_costs()
+    df_index_costs.to_csv("query_optimization/mysql_index_costs.csv", index=False)
+    df_pareto = pareto_front(evaluate(df_encoded_results, df_index_costs))
+    df_pareto.to_csv(encoded_path.replace("_results.csv", "_pareto.csv"), index=False)
     print(df_encoded_results)
+    if optimizer.statements is not None:
+        optimizer.statements.close()
+    print(mysql_pool.connect_metrics())
@@ -1,5 +1,6 @@
 import argparse
-from mysql_dbCreation import DbCreation
+from mysql_dbCreation import DbCreation, INSERT_MODES
+from id_codec import ID_MODES
 
 def main():
     parser = argparse.ArgumentParser(description="Connect to a MySQL database using Python.")
@@ -9,12 +10,48 @@ def main():
     parser.add_argument('-d', '--database', 
                         type=str, help='Database name', required=True)
     parser.add_argument('-s', '--samples', 
-                        type=int, help='Number of rows to insert', required=True)
+                        type=int, help='Number of rows to insert')
+    parser.add_argument('-m', '--mode', choices=INSERT_MODES, default='row',
+                        help='Insertion strategy: one upsert per row, multi-row executemany or LOAD DATA LOCAL INFILE')
+    parser.add_argument('--shards', type=int, default=1,
+                        help='Number of independent shards the samples are split into')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='Number of processes loading shards (defaults to one per shard)')
+    parser.add_argument('--seed', type=int, default=42, help='Base seed of the generated data')
+    parser.add_argument('--id-mode', choices=ID_MODES, default='char',
+                        help='Store the identifiers as CHAR(13) or as INT UNSIGNED surrogate keys')
+    parser.add_argument('--defer-constraints', action='store_true',
+                        help='Load without foreign keys and secondary indexes and add them after the load')
+    parser.add_argument('--resume', action='store_true',
+                        help='Insert only the batches missing from an interrupted load with the same seed and shards')
+    parser.add_argument('-b', '--batch-size', type=int, default=100,
+                        help='Samples of the first batch, every batch is committed as one transaction')
+    parser.add_argument('--target-rows', type=int, default=None,
+                        help='Size the batches to insert this many rows per transaction')
+    parser.add_argument('--target-bytes', type=int, default=None,
+                        help='Size the batches to send this many payload bytes per transaction')
+    parser.add_argument('--target-commit', type=float, default=None,
+                        help='Grow or shrink the batches to keep the commit latency near these seconds')
+    parser.add_argument('--telemetry', type=str, default=None,
+                        help='CSV file receiving the rows/s, bytes/s and commit time of every batch')
+    parser.add_argument('--rebuild-summaries', action='store_true',
+                        help='Recompute the summary tables of the aggregate queries from the stored data')
     args = parser.parse_args()
+    if args.samples is None and not args.rebuild_summaries:
+        parser.error("the following arguments are required: -s/--samples")
     
     mydb = DbCreation(password=args.password, 
-                                  database=args.database)
-    mydb.insert_data_in_batches(num_samples=args.samples)
+                                  database=args.database,
+                                  id_mode=args.id_mode,
+                                  defer_constraints=args.defer_constraints)
+    if args.samples is not None:
+        mydb.insert_data_in_batches(num_samples=args.samples, mode=args.mode,
+                                    shards=args.shards, workers=args.workers, seed=args.seed,
+                                    resume=args.resume, batch_size=args.batch_size,
+                                    target_rows=args.target_rows, target_bytes=args.target_bytes,
+                                    target_commit=args.target_commit, telemetry_path=args.telemetry)
+    if args.rebuild_summaries:
+        mydb.rebuild_summaries()
     
 
 if __name__ == "__main__":
@@ -0,0 +1,105 @@
+"""
+Shared MySQL connection pools for the query, optimization and migration modules.
+
+Opening a connection costs a TCP handshake and an authentication round trip, which used to be
+paid on every query and ended up inside the recorded query times. connect() hands out connections
+from a mysql.connector pool per (host, user, password, database) and process; calling close() on
+them returns them to the pool. The time spent waiting for a connection is recorded so it can be
+reported apart from the query times.
+"""
+
+import os
+import threading
+import time
+from typing import Dict
+
+from mysql.connector import errors, pooling
+
+# Defaults used by every module of the project
+_config = {"host": "localhost", "user": "root", "pool_size": 5, "timeout": 30.0}
+_pools: Dict[tuple, pooling.MySQLConnectionPool] = {}
+_metrics: Dict[str, Dict[str, float]] = {}
+_lock = threading.Lock()
+
+
+def configure(**options) -> None:
+    """
+    Changes the defaults of the pools created afterwards.
+
+    Args:
+        host (str): MySQL host, "localhost" by default.
+        user (str): MySQL user, "root" by default.
+        pool_size (int): Connections per pool, 5 by default (mysql.connector allows up to 32).
+        timeout (float): Seconds connect() waits for a free connection before failing.
+    """
+    unknown = set(options) - set(_config)
+    if unknown:
+        raise ValueError(f"Unknown pool options {sorted(unknown)}")
+    _config.update(options)
+
+
+def get_pool(password: str, database: str = None, host: str = None, user: str = None) -> pooling.MySQLConnectionPool:
+    """
+    Returns the pool of a database, creating it on first use. Pools are not shared with forked
+    processes, which get their own.
+    """
+    host = host or _config["host"]
+    user = user or _config["user"]
+    key = (os.getpid(), host, user, password, database)
+    with _lock:
+        if key not in _pools:
+            settings = {"host": host, "user": user, "password": password}
+            if database is not None:
+                settings["database"] = database
+            _pools[key] = pooling.MySQLConnectionPool(pool_name=f"microbiome_{len(_pools)}",
+                                                      pool_size=_config["pool_size"],
+                                                      **settings)
+        return _pools[key]
+
+
+def connect(password: str, database: str = None, host: str = None, user: str = None):
+    """
+    Gets a connection from the pool of the database, waiting for one to be released if the pool
+    is exhausted. The connection goes back to the pool when it is closed.
+
+    Returns:
+        PooledMySQLConnection: A connection with the usual cursor/commit/close interface.
+    """
+    pool = get_pool(password, database, host, user)
+    start = time.perf_counter()
+    while True:
+        try:
+            connection = pool.get_connection()
+            break
+        except errors.PoolError:
+            if time.perf_counter() - start > _config["timeout"]:
+                raise
+            time.sleep(0.01)
+    _record(f"{host or _config['host']}/{database}", time.perf_counter() - start)
+    return connection
+
+
+def _record(name: str, seconds: float) -> None:
+    with _lock:
+        metrics = _metrics.setdefault(name, {"connections": 0, "total_s": 0.0, "max_s": 0.0})
+        metrics["connections"] += 1
+        metrics["total_s"] += seconds
+        metrics["max_s"] = max(metrics["max_s"], seconds)
+
+
+def connect_metrics() -> Dict[str, Dict[str, float]]:
+    """
+    Returns, per host/database, the number of connections handed out and the total, mean and
+    maximum seconds spent obtaining them.
+    """
+    with _lock:
+        return {name: dict(metrics, mean_s=metrics["total_s"] / metrics["connections"])
+                for name, metrics in _metrics.items()}
+
+
+def reset_connect_metrics() -> None:
+    """
+    Clears the connection metrics.
+    """
+    with _lock:
+        _metrics.clear()
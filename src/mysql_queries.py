@@ -2,25 +2,157 @@ import os
 import time
 import mysql.connector as mysql
 import pandas as pd
+import mysql_pool
+from id_codec import ID_MODES, encode_id, sql_decode
+from query_cache import QueryCache, mysql_data_version
+from result_export import EXPORT_FORMATS, stream_query
+from prepared_statements import PreparedStatements
+
+
+# queries that can be answered from the summary tables, see summary_tables
+SUMMARY_QUERIES = (1, 4, 5, 7)
+
+
+def sql_query(num_qry: int, id_mode: str = "char", summary: bool = False) -> str:
+    """
+    Returns the SQL text of one of the seven queries.
+
+    In the "int" id mode the joins, groupings and orderings run on the integer keys and only the
+    selected identifiers are decoded, so the results are identical to the "char" schema.
+
+    Args:
+        num_qry (int): Query number, 1 to 7.
+        id_mode (str): Storage of the identifiers, "char" or "int".
+        summary (bool): Reads the SUMMARY_QUERIES from the summary tables kept by DbCreation instead
+            of the fact tables. The other queries are not affected.
+    """
+    def ids(column):
+        return sql_decode(column) if id_mode == "int" else column
+
+    if summary and num_qry in SUMMARY_QUERIES:
+        return summary_sql_query(num_qry, ids)
+
+    queries = {
+        1: f'''SELECT {ids("p.Patient_ID")}, COUNT(DISTINCT sm.Microorganism_ID) AS Num_Microorganisms
+                   FROM patient p
+                   JOIN sample s ON p.Patient_ID = s.Patient_ID
+                   JOIN sample_microorganism sm ON s.Sample_ID = sm.Sample_ID
+                   GROUP BY p.Patient_ID
+                   ORDER BY Num_Microorganisms DESC
+                   LIMIT 10;''',
+        2: f'''SELECT {ids("sm.Sample_ID")}, sm.qPCR
+                   FROM sample_microorganism sm
+                   WHERE sm.Microorganism_ID = %s 
+                   ORDER BY sm.qPCR DESC;''',
+        3: f'''SELECT {ids("p.Patient_ID")}, {ids("s.Sample_ID")}, s.Date, s.Body_Part, s.Sample_Type
+                   FROM patient p
+                   JOIN sample s ON p.Patient_ID = s.Patient_ID
+                   WHERE p.Disease = %s
+                   ORDER BY s.Date;''',
+        4: '''SELECT s.Sample_Type, COUNT(*) AS Sample_Count
+                   FROM sample s
+                   GROUP BY s.Sample_Type
+                   ORDER BY Sample_Count DESC;''',
+        5: f'''SELECT {ids("sm.Microorganism_ID")}, s.Sample_Type, COUNT(sm.Sample_ID) AS Sample_Count, AVG(sm.qPCR) AS avg_qPCR, STDDEV(sm.qPCR) AS stddev_qPCR
+                   FROM sample s
+                   JOIN sample_microorganism sm ON s.Sample_ID = sm.Sample_ID
+                   GROUP BY s.Sample_Type, sm.Microorganism_ID
+                   ORDER BY sm.Microorganism_ID DESC;''',
+        6: f'''SELECT {ids("p1.Patient_ID")}, s1.Max_qPCR
+                   FROM (SELECT p.Patient_ID
+                         FROM patient p
+                         WHERE p.Disease='Hepatitis B') p1
+                   JOIN (SELECT s.Patient_ID, MAX(sm.qPCR) AS Max_qPCR
+                         FROM sample s
+                         JOIN sample_microorganism sm ON s.Sample_ID = sm.Sample_ID
+                         JOIN microorganism m ON sm.Microorganism_ID = m.Microorganism_ID
+                         WHERE m.Species='Hepatitis B Virus'
+                         GROUP BY s.Patient_ID) s1
+                   ON s1.Patient_ID = p1.Patient_ID;''',
+        7: '''SELECT Species, COUNT(*) AS Count, AVG(Seq_length) AS avg_SeqLength
+                   FROM microorganism
+                   GROUP BY Species
+                   HAVING COUNT(*) > 1;''',
+    }
+    return queries[num_qry]
+
+
+def summary_sql_query(num_qry: int, ids) -> str:
+    """
+    SQL text of a SUMMARY_QUERIES query over the summary tables, with the columns of sql_query.
+    The counters of the writers are added up and Q5 derives its mean and population standard
+    deviation from the exact integer sums.
+    """
+    queries = {
+        1: f'''SELECT {ids("Patient_ID")}, Num_Microorganisms
+                   FROM summary_patient
+                   ORDER BY Num_Microorganisms DESC
+                   LIMIT 10;''',
+        4: '''SELECT Sample_Type, CAST(SUM(Sample_Count) AS SIGNED) AS Sample_Count
+                   FROM summary_sample_type
+                   GROUP BY Sample_Type
+                   ORDER BY Sample_Count DESC;''',
+        5: f'''SELECT {ids("Microorganism_ID")}, Sample_Type, CAST(SUM(Sample_Count) AS SIGNED) AS Sample_Count,
+                          SUM(Sum_qPCR) / SUM(Sample_Count) AS avg_qPCR,
+                          SQRT(SUM(Sample_Count) * SUM(Sum_Sq_qPCR) - SUM(Sum_qPCR) * SUM(Sum_qPCR)) / SUM(Sample_Count) AS stddev_qPCR
+                   FROM summary_microorganism_sample_type
+                   GROUP BY Sample_Type, Microorganism_ID
+                   ORDER BY Microorganism_ID DESC;''',
+        7: '''SELECT Species, Count, Sum_Seq_length / Count AS avg_SeqLength
+                   FROM summary_species
+                   WHERE Count > 1;''',
+    }
+    return queries[num_qry]
+
 
 class Queries:
-    def __init__(self, password: str, database: str) -> None:
+    def __init__(self, password: str, database: str, id_mode: str = "char",
+                 use_cache: bool = False, cache_size: int = 128, use_summary: bool = False,
+                 stream: bool = False, export_format: str = "csv", chunk_size: int = 10000,
+                 prepared: bool = False) -> None:
+        """
+        Args:
+            password (str): Password of the root user.
+            database (str): Database to query.
+            id_mode (str): Storage of the identifiers, "char" or "int".
+            use_cache (bool): Answers repeated queries from a result cache invalidated by the data
+                version of the database, see query_cache. Off by default, so the times returned
+                are those of running the queries.
+            cache_size (int): Results kept in the cache.
+            use_summary (bool): Answers Q1, Q4, Q5 and Q7 from the summary tables maintained by
+                DbCreation instead of aggregating the fact tables.
+            stream (bool): Writes the results chunk by chunk from an unbuffered cursor instead of
+                fetching them whole, for results that do not fit in memory. Streamed results are
+                not cached, see result_export.
+            export_format (str): Format of the streamed files, "csv" or "parquet".
+            chunk_size (int): Rows fetched and written at once when streaming.
+            prepared (bool): Runs the queries as server-side prepared statements kept on one pooled
+                connection, so repeated calls skip parsing and planning and do not check out
+                another connection. The prepare and execute times are in prepared_stats(), see
+                prepared_statements. Streamed queries are not prepared. Call close() when done.
+        """
+        if id_mode not in ID_MODES:
+            raise ValueError(f"Unknown id mode {id_mode!r}, expected one of {ID_MODES}")
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown export format {export_format!r}, expected one of {EXPORT_FORMATS}")
         self.password = password
         self.database = database
+        self.id_mode = id_mode
+        self.cache = QueryCache(cache_size, enabled=use_cache)
+        self.use_summary = use_summary
+        self.stream = stream
+        self.export_format = export_format
+        self.chunk_size = chunk_size
+        self.statements = PreparedStatements(password, database) if prepared else None
 
     def __connection(self):
         """
-        Establishes a connection to the MySQL database.
+        Gets a connection to the MySQL database from the shared pool.
         Returns:
             connection: A MySQL connection object.
         """
         try:
-            connection = mysql.connect(
-                host="localhost",
-                user="root",
-                password=self.password,
-                database=self.database
-            )
+            connection = mysql_pool.connect(self.password, self.database)
             print("Database connection established")
             return connection
         except mysql.Error as err:
@@ -29,7 +161,8 @@ class Queries:
 
     def __query_format(self, query: str, argument: tuple, num_qry: int):
         """
-        Executes a given query and saves the results to a CSV file.
+        Executes a given query, or takes its result from the cache when the data did not change
+        since it last ran, and saves the results to a CSV file.
         
         Args:
             query (str): The SQL query to execute.
@@ -37,19 +170,41 @@ class Queries:
             num_qry (int): Query number used for naming the output file.
             
         Returns:
-            final_time (float): Time taken to execute the query.
+            final_time (float): Time taken to execute the query or to read it from the cache.
         """
-        connection = self.__connection()
-        if connection is None:
-            return
-        
-        cursor = connection.cursor()
+        if self.stream:
+            connection = self.__connection()
+            if connection is None:
+                return
+            return self.__query_stream(connection, query, argument, num_qry)
+
+        connection = None
+        cursor = None
+        if self.statements is None:
+            connection = self.__connection()
+            if connection is None:
+                return
+            cursor = connection.cursor()
         try:
-            start_time = time.time()
-            cursor.execute(query, argument)
-            result = cursor.fetchall()
-            final_time = time.time() - start_time
-            col_name = [d[0] for d in cursor.description]
+            if cursor is None and self.cache.enabled:
+                # the version is read on the connection that holds the prepared statements
+                cursor = self.statements.cursor()
+            key = (num_qry, self.id_mode, self.use_summary, tuple(argument))
+            version = mysql_data_version(cursor) if self.cache.enabled else None
+            # the version check is not part of the query, the time starts with the lookup
+            start_time = time.perf_counter()
+            cached = self.cache.lookup(key, version)
+            if cached is None:
+                if self.statements is not None:
+                    result, col_name = self.statements.execute(query, argument, f"Q{num_qry}")
+                else:
+                    cursor.execute(query, argument)
+                    result = cursor.fetchall()
+                    col_name = [d[0] for d in cursor.description]
+                self.cache.store(key, version, (result, col_name))
+            else:
+                result, col_name = cached
+            final_time = time.perf_counter() - start_time
 
             # Debugging: Print the result and column names
             print(f"{num_qry}: Number of rows returned:", len(result))
@@ -67,66 +222,66 @@ class Queries:
             if connection:
                 connection.close()
 
+    def __query_stream(self, connection, query: str, argument: tuple, num_qry: int):
+        """
+        Executes a given query and streams its results to csv-queries/query<num_qry>.<format>,
+        printing the time to the first row and the rows per second.
+
+        Returns:
+            final_time (float): Time taken to execute the query and write its results.
+        """
+        file_path = os.path.join(os.getcwd(), "csv-queries", f"query{num_qry}.{self.export_format}")
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        cursor = connection.cursor(buffered=False)
+        try:
+            stats = stream_query(cursor, query, argument, file_path, self.export_format, self.chunk_size)
+            first_row = "-" if stats["first_row_s"] is None else f"{stats['first_row_s'] * 1000:.1f}ms"
+            print(f"{num_qry}: {stats['rows']} rows streamed, first row after {first_row}, "
+                  f"{stats['rows_per_s']:.0f} rows/s")
+            return stats["seconds"]
+        except mysql.Error as err:
+            print(f"Error: {err}")
+        finally:
+            cursor.close()
+            connection.close()
+
     def query1(self):
-        query = '''SELECT p.Patient_ID, COUNT(DISTINCT sm.Microorganism_ID) AS Num_Microorganisms
-                   FROM patient p
-                   JOIN sample s ON p.Patient_ID = s.Patient_ID
-                   JOIN sample_microorganism sm ON s.Sample_ID = sm.Sample_ID
-                   GROUP BY p.Patient_ID
-                   ORDER BY Num_Microorganisms DESC
-                   LIMIT 10;'''
-        return self.__query_format(query, (), 1)
+        return self.__query_format(sql_query(1, self.id_mode, self.use_summary), (), 1)
 
     def query2(self, microorganism_ID: str):
-        query = '''SELECT sm.Sample_ID, sm.qPCR
-                   FROM sample_microorganism sm
-                   WHERE sm.Microorganism_ID = %s 
-                   ORDER BY sm.qPCR DESC;'''
-        return self.__query_format(query, (microorganism_ID,), 2)
+        if self.id_mode == "int":
+            microorganism_ID = encode_id(microorganism_ID)
+        return self.__query_format(sql_query(2, self.id_mode), (microorganism_ID,), 2)
 
     def query3(self, disease: str):
-        query = '''SELECT p.Patient_ID, s.Sample_ID, s.Date, s.Body_Part, s.Sample_Type
-                   FROM patient p
-                   JOIN sample s ON p.Patient_ID = s.Patient_ID
-                   WHERE p.Disease = %s
-                   ORDER BY s.Date;'''
-        return self.__query_format(query, (disease,), 3)
+        return self.__query_format(sql_query(3, self.id_mode), (disease,), 3)
 
     def query4(self):
-        query = '''SELECT s.Sample_Type, COUNT(*) AS Sample_Count
-                   FROM sample s
-                   GROUP BY s.Sample_Type
-                   ORDER BY Sample_Count DESC;'''
-        return self.__query_format(query, (), 4)
+        return self.__query_format(sql_query(4, self.id_mode, self.use_summary), (), 4)
     
     def query5(self):
-        query = '''SELECT sm.Microorganism_ID, s.Sample_Type, COUNT(sm.Sample_ID) AS Sample_Count, AVG(sm.qPCR) AS avg_qPCR, STDDEV(sm.qPCR) AS stddev_qPCR
-                   FROM sample s
-                   JOIN sample_microorganism sm ON s.Sample_ID = sm.Sample_ID
-                   GROUP BY s.Sample_Type, sm.Microorganism_ID
-                   ORDER BY sm.Microorganism_ID DESC;'''
-        return self.__query_format(query, (), 5)
+        return self.__query_format(sql_query(5, self.id_mode, self.use_summary), (), 5)
 
     def query6(self):
-        query = '''SELECT p1.Patient_ID, s1.Max_qPCR
-                   FROM (SELECT p.Patient_ID
-                         FROM patient p
-                         WHERE p.Disease='Hepatitis B') p1
-                   JOIN (SELECT s.Patient_ID, MAX(sm.qPCR) AS Max_qPCR
-                         FROM sample s
-                         JOIN sample_microorganism sm ON s.Sample_ID = sm.Sample_ID
-                         JOIN microorganism m ON sm.Microorganism_ID = m.Microorganism_ID
-                         WHERE m.Species='Hepatitis B Virus'
-                         GROUP BY s.Patient_ID) s1
-                   ON s1.Patient_ID = p1.Patient_ID;'''
-        return self.__query_format(query, (), 6)
+        return self.__query_format(sql_query(6, self.id_mode), (), 6)
 
     def query7(self):
-        query = '''SELECT Species, COUNT(*) AS Count, AVG(Seq_length) AS avg_SeqLength
-                   FROM microorganism
-                   GROUP BY Species
-                   HAVING COUNT(*) > 1;'''
-        return self.__query_format(query, (), 7)
+        return self.__query_format(sql_query(7, self.id_mode, self.use_summary), (), 7)
+
+    def prepared_stats(self) -> pd.DataFrame:
+        """
+        Mean prepare and execute milliseconds of every query run in the prepared mode.
+        """
+        if self.statements is None:
+            raise ValueError("The queries do not run in the prepared mode")
+        return self.statements.stats()
+
+    def close(self) -> None:
+        """
+        Releases the connection holding the prepared statements.
+        """
+        if self.statements is not None:
+            self.statements.close()
 
     def __export_csv(self, result, col_name, file_name: str):
         """
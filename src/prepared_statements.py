@@ -0,0 +1,135 @@
+"""
+Server-side prepared statements reused across the executions of the same query.
+
+A plain cursor.execute sends the SQL text every time and the server parses and plans it again. A
+prepared statement is parsed once by COM_STMT_PREPARE and then executed with COM_STMT_EXECUTE and
+new parameters only. Prepared statements belong to a connection and the pool deallocates them when
+a connection is returned (it resets the session), so PreparedStatements keeps one pooled connection
+for its whole life, in autocommit mode so that it neither sees a stale snapshot nor holds metadata
+locks that would block the index and engine changes of the optimization sweeps.
+
+mysql.connector prepares a statement in the first execute of a prepared cursor, so the first
+execution of every statement is recorded as its "prepare" phase (parse, plan and first run) and the
+following ones as "execute". The difference between the two is the parse and plan time saved by the
+reuse.
+"""
+
+import time
+from typing import List, Tuple
+
+import pandas as pd
+
+import mysql_pool
+
+PHASES = ("prepare", "execute")
+
+
+class PreparedStatements:
+    """
+    Prepared cursors of one pooled connection, one per statement text.
+
+    Attributes:
+        password (str): Password of the MySQL user.
+        database (str): Database of the connection.
+        timings (list): One record (Statement, Phase, Seconds) per execution.
+
+    Methods:
+        cursor(self): Plain cursor of the connection, for the statements that are not prepared.
+        prepare(self, sql, params, label): Prepares a statement with its first execution.
+        execute(self, sql, params, label): Executes a statement, preparing it on first use.
+        stats(self): Mean prepare and execute times of every statement.
+        clear(self): Deallocates the statements.
+        close(self): Deallocates the statements and returns the connection to the pool.
+    """
+
+    def __init__(self, password: str, database: str) -> None:
+        self.password = password
+        self.database = database
+        self.timings = []
+        self._connection = None
+        self._cursors = {}
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = mysql_pool.connect(self.password, self.database)
+            # set on the session, the pooled wrapper does not forward attribute assignments
+            cursor = self._connection.cursor()
+            cursor.execute("SET autocommit = 1")
+            cursor.close()
+        return self._connection
+
+    def _cursor(self, sql: str):
+        if sql not in self._cursors:
+            self._cursors[sql] = self._connect().cursor(prepared=True)
+        return self._cursors[sql]
+
+    def cursor(self):
+        """
+        Opens a plain cursor on the connection holding the statements, so that a caller does not
+        check out a second pooled connection for its other reads. The caller closes it.
+        """
+        return self._connect().cursor()
+
+    def _run(self, cursor, sql: str, params, label: str, phase: str) -> Tuple[List[tuple], List[str]]:
+        start = time.perf_counter()
+        cursor.execute(sql, tuple(params or ()))
+        rows = cursor.fetchall()
+        self.timings.append({"Statement": label or sql, "Phase": phase, "Seconds": time.perf_counter() - start})
+        return rows, [d[0] for d in cursor.description]
+
+    def prepare(self, sql: str, params: tuple = None, label: str = None) -> bool:
+        """
+        Prepares a statement, by running it once, unless it is already prepared.
+
+        Returns:
+            bool: True when the statement was prepared by this call.
+        """
+        if sql in self._cursors:
+            return False
+        self._run(self._cursor(sql), sql, params, label, "prepare")
+        return True
+
+    def execute(self, sql: str, params: tuple = None, label: str = None) -> Tuple[List[tuple], List[str]]:
+        """
+        Executes a statement with new parameters, preparing it when it is first seen.
+
+        Args:
+            sql (str): The statement, with %s placeholders.
+            params (tuple): Its parameters.
+            label (str): Name of the statement in the timings, the SQL text by default.
+
+        Returns:
+            tuple: The rows and the column names of the result.
+        """
+        phase = "execute" if sql in self._cursors else "prepare"
+        return self._run(self._cursor(sql), sql, params, label, phase)
+
+    def stats(self) -> pd.DataFrame:
+        """
+        Number and mean milliseconds of the prepare and execute phases of every statement, and the
+        parse and plan time saved by every reuse (prepare - execute).
+        """
+        if not self.timings:
+            return pd.DataFrame(columns=["Statement", "prepare_n", "prepare_ms", "execute_n", "execute_ms", "saved_ms"])
+        timings = pd.DataFrame(self.timings)
+        stats = timings.pivot_table(index="Statement", columns="Phase", values="Seconds", aggfunc=["count", "mean"])
+        result = pd.DataFrame(index=stats.index)
+        for phase in PHASES:
+            result[f"{phase}_n"] = stats["count"][phase].fillna(0).astype(int) if phase in stats["count"] else 0
+            result[f"{phase}_ms"] = stats["mean"][phase] * 1000 if phase in stats["mean"] else float("nan")
+        result["saved_ms"] = result["prepare_ms"] - result["execute_ms"]
+        return result.reset_index()
+
+    def clear(self) -> None:
+        """
+        Deallocates the prepared statements, the next execution of each one prepares it again.
+        """
+        for cursor in self._cursors.values():
+            cursor.close()
+        self._cursors = {}
+
+    def close(self) -> None:
+        self.clear()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,151 @@
+"""
+Result cache of the seven queries, shared by the MySQL (Queries) and MongoDB (MongoDBAggregations)
+front ends.
+
+Most of the queries are aggregations over whole tables whose answer only changes when data is
+written, so their results are kept in memory keyed by the query number and its parameters. Every
+entry remembers the data version it was computed at, a counter stored in the database itself and
+bumped by every write path (DbCreation.insert_data_in_batches, insert_new_patient,
+update_patient_location). A lookup whose version differs from the current one is a miss, so
+another process inserting data invalidates the entries of every cache reading that database.
+
+The version lives in the data_version table in MySQL and in the data_version document of the
+Metadata collection in MongoDB. Databases created before the counter existed have no version, and
+their results are never cached.
+
+The cache is opt-in (use_cache=True), the scripts that time the queries measure the databases.
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+import mysql.connector as mysql
+
+DATA_VERSION_TABLE = '''CREATE TABLE IF NOT EXISTS data_version (
+                            Id TINYINT PRIMARY KEY,
+                            Version BIGINT UNSIGNED NOT NULL
+                        );'''
+METADATA_COLLECTION = "Metadata"
+_VERSION_ID = "data_version"
+_MISSING = object()
+
+
+class QueryCache:
+    """
+    Least recently used cache of query results tagged with the data version they were computed at.
+
+    Attributes:
+        max_entries (int): Results kept before the least recently used one is evicted.
+        enabled (bool): False bypasses the cache: every lookup misses and nothing is stored.
+        hits (int): Lookups answered from the cache.
+        misses (int): Lookups that had to run the query.
+        evictions (int): Entries dropped to stay within max_entries.
+
+    Methods:
+        lookup(self, key, version): Cached result of a key at a data version.
+        store(self, key, version, value): Caches a result.
+        stats(self): Hit and miss counters.
+        clear(self): Drops every entry.
+    """
+
+    def __init__(self, max_entries: int = 128, enabled: bool = True) -> None:
+        """
+        Initializes the cache.
+
+        Args:
+            max_entries (int): Results kept in memory.
+            enabled (bool): False bypasses the cache, as the benchmarks need.
+        """
+        if max_entries < 1:
+            raise ValueError(f"The cache needs room for at least one entry, got {max_entries}")
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def lookup(self, key: Hashable, version: Optional[int]) -> Any:
+        """
+        Returns the result cached for a key at the given data version.
+
+        Args:
+            key: Query number and parameters.
+            version (int): Current data version, None when the database has none.
+
+        Returns:
+            The cached result, or None on a miss.
+        """
+        if not self.enabled or version is None:
+            self.misses += 1
+            return None
+        cached_version, value = self._entries.get(key, (None, _MISSING))
+        if value is _MISSING or cached_version != version:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def store(self, key: Hashable, version: Optional[int], value: Any) -> None:
+        """
+        Caches the result of a key computed at a data version, evicting the least recently used
+        entry when the cache is full.
+        """
+        if not self.enabled or version is None:
+            return
+        self._entries[key] = (version, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Hits, misses, evictions and entries of the cache.
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "entries": len(self._entries)}
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def mysql_data_version(cursor) -> Optional[int]:
+    """
+    Reads the data version of a MySQL database.
+
+    Returns:
+        int: The version, None when the database has no data_version table.
+    """
+    try:
+        cursor.execute("SELECT Version FROM data_version WHERE Id = 1")
+        row = cursor.fetchone()
+    except mysql.Error:
+        return None
+    return row[0] if row else 0
+
+
+def bump_mysql_data_version(cursor) -> None:
+    """
+    Increments the data version of a MySQL database. It runs in the transaction of the write, so the
+    new version becomes visible together with the data.
+    """
+    cursor.execute("INSERT INTO data_version (Id, Version) VALUES (1, 1) ON DUPLICATE KEY UPDATE Version = Version + 1")
+
+
+def mongo_data_version(db) -> Optional[int]:
+    """
+    Reads the data version of a MongoDB database.
+
+    Returns:
+        int: The version, None when no write has recorded one yet.
+    """
+    document = db.get_collection(METADATA_COLLECTION).find_one({"_id": _VERSION_ID})
+    return document["version"] if document else None
+
+
+def bump_mongo_data_version(db) -> None:
+    """
+    Increments the data version of a MongoDB database.
+    """
+    db.get_collection(METADATA_COLLECTION).update_one({"_id": _VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
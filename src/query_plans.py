@@ -0,0 +1,184 @@
+"""
+Query plan capture for MySQL and MongoDB, so every timing can be tied to the plan that produced it.
+
+Both backends are summarized in the same record:
+
+    plan_index      indices used by the plan, COLLSCAN/ALL entries when a table is scanned
+    rows_examined   rows (MySQL) or documents (MongoDB) the plan read
+    rows_returned   rows or documents the query returned
+    plan_cost       optimizer cost estimate (MySQL only)
+    plan_fingerprint
+                    short hash of the plan shape: operators, tables, access types and indices,
+                    without costs, counts or literal values, so two runs share a fingerprint
+                    exactly when they ran the same plan
+
+MySQL plans come from EXPLAIN FORMAT=JSON (estimates) and optionally EXPLAIN ANALYZE (executed,
+actual rows). MongoDB plans come from the explain command with executionStats verbosity.
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, Dict, Iterator, List
+
+PLAN_FIELDS = ("plan_index", "rows_examined", "rows_returned", "plan_cost", "plan_fingerprint")
+
+# scalar plan attributes that describe its shape, every other scalar is a cost, count or literal
+_SHAPE_KEYS = {"stage", "indexName", "direction", "isMultiKey", "table_name", "access_type", "key",
+               "using_index", "using_filesort", "using_temporary_table", "distinct", "dependent", "cacheable"}
+_ANALYZE_NODE = re.compile(r"->\s*(?P<operation>.+?)\s+\((?:cost=[^)]*\)\s+\()?actual time=[^ ]+ rows=(?P<rows>[\d.e+]+) "
+                           r"loops=(?P<loops>\d+)\)")
+_ANALYZE_INDEX = re.compile(r"\busing (\w+)")
+
+
+def _walk(node) -> Iterator[Dict[str, Any]]:
+    """Yields every dictionary nested in a JSON document."""
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def _shape(node):
+    if isinstance(node, dict):
+        return {key: _shape(value) for key, value in sorted(node.items())
+                if key in _SHAPE_KEYS or isinstance(value, (dict, list))}
+    if isinstance(node, list):
+        return [_shape(value) for value in node]
+    return node
+
+
+def fingerprint(plan) -> str:
+    """
+    Hash of the shape of a plan, see the module docstring.
+    """
+    text = json.dumps(_shape(plan), sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def summarize_mysql_json(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Summarizes an EXPLAIN FORMAT=JSON document.
+
+    The rows examined are the optimizer estimate: the rows read per scan of every table, multiplied
+    by the rows produced by the tables joined before it.
+    """
+    query_block = plan.get("query_block", plan)
+    indices = []
+    examined = 0.0
+    loops = 1.0
+    for node in _walk(query_block):
+        table = node.get("table")
+        if not isinstance(table, dict) or "table_name" not in table:
+            continue
+        indices.append(f"{table['table_name']}:{table.get('key', table.get('access_type', 'ALL'))}")
+        examined += loops * float(table.get("rows_examined_per_scan", 0))
+        loops = float(table.get("rows_produced_per_join", loops))
+    return {
+        "plan_index": ",".join(indices),
+        "rows_examined": examined,
+        "rows_returned": loops,
+        "plan_cost": float(query_block.get("cost_info", {}).get("query_cost", "nan")),
+        "plan_fingerprint": fingerprint(query_block),
+    }
+
+
+def summarize_mysql_analyze(text: str) -> Dict[str, Any]:
+    """
+    Summarizes the tree printed by EXPLAIN ANALYZE. The rows examined are the actual rows of every
+    table and index access times its loops, the rows returned those of the root node.
+    """
+    examined = 0.0
+    returned = None
+    indices = []
+    for line in text.splitlines():
+        match = _ANALYZE_NODE.search(line)
+        if match is None:
+            continue
+        rows = float(match.group("rows")) * int(match.group("loops"))
+        if returned is None:
+            returned = rows
+        operation = match.group("operation")
+        if " on " in operation and ("scan" in operation.lower() or "lookup" in operation.lower()):
+            examined += rows
+            index = _ANALYZE_INDEX.search(operation)
+            table = operation.split(" on ", 1)[1].split()[0]
+            indices.append(f"{table}:{index.group(1) if index else 'ALL'}")
+    # the numbers and literals of every node are dropped, the remaining text is the shape of the plan
+    shape = re.sub(r"\((?:cost|actual time)=[^)]*\)|'[^']*'|\b\d+(?:\.\d+)?\b", "", text)
+    return {
+        "plan_index": ",".join(indices),
+        "rows_examined": examined,
+        "rows_returned": returned,
+        "plan_cost": float("nan"),
+        "plan_fingerprint": hashlib.sha1(re.sub(r"\s+", " ", shape).encode()).hexdigest()[:12],
+    }
+
+
+def mysql_plan(cursor, sql: str, params: tuple = None, analyze: bool = False) -> Dict[str, Any]:
+    """
+    Captures the plan of a MySQL query.
+
+    Args:
+        cursor: Cursor of an open connection.
+        sql (str): The query.
+        params (tuple): Its parameters.
+        analyze (bool): Runs EXPLAIN ANALYZE, which executes the query and reports actual rows
+            (MySQL 8.0.18 or later). The cost comes from EXPLAIN FORMAT=JSON in both cases.
+
+    Returns:
+        dict: The PLAN_FIELDS of the query.
+    """
+    cursor.execute(f"EXPLAIN FORMAT=JSON {sql}", params)
+    plan = summarize_mysql_json(json.loads(cursor.fetchone()[0]))
+    if analyze:
+        cursor.execute(f"EXPLAIN ANALYZE {sql}", params)
+        actual = summarize_mysql_analyze("\n".join(row[0] for row in cursor.fetchall()))
+        plan.update(actual, plan_cost=plan["plan_cost"])
+    return plan
+
+
+def summarize_mongo_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Summarizes the output of explain with executionStats for a find or an aggregation, whether the
+    pipeline runs in the query layer ("stages" with a leading $cursor) or entirely in the engine.
+    """
+    winning = next((node["winningPlan"] for node in _walk(explain) if "winningPlan" in node), {})
+    stats = next((node["executionStats"] for node in _walk(explain) if "executionStats" in node), {})
+    indices = []
+    for node in _walk(winning):
+        if "indexName" in node and node["indexName"] not in indices:
+            indices.append(node["indexName"])
+        elif node.get("stage") == "COLLSCAN" and "COLLSCAN" not in indices:
+            indices.append("COLLSCAN")
+    returned = stats.get("nReturned")
+    stages = explain.get("stages")
+    if stages and "nReturned" in stages[-1]:
+        returned = stages[-1]["nReturned"]
+    return {
+        "plan_index": ",".join(indices),
+        "rows_examined": stats.get("totalDocsExamined", 0),
+        "rows_returned": returned,
+        "plan_cost": float("nan"),
+        "plan_fingerprint": fingerprint(winning),
+    }
+
+
+def mongo_plan(collection, pipeline: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Captures the plan of an aggregation pipeline with explain at executionStats verbosity, which runs
+    the pipeline.
+
+    Args:
+        collection: A pymongo Collection.
+        pipeline (list): The aggregation pipeline.
+
+    Returns:
+        dict: The PLAN_FIELDS of the pipeline.
+    """
+    explain = collection.database.command("explain", {"aggregate": collection.name, "pipeline": pipeline,
+                                                      "cursor": {}}, verbosity="executionStats")
+    return summarize_mongo_explain(explain)
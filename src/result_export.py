@@ -0,0 +1,108 @@
+"""
+Streaming export of query results to CSV or Parquet.
+
+The rows are read from an unbuffered cursor with fetchmany and every chunk is written before the
+next one is fetched, so the memory used is bounded by the chunk size whatever the size of the
+result. The time to the first row and the rows per second of the transfer are reported, the first
+one measures how long the server takes before it starts sending, the second the throughput of
+fetching and writing.
+
+Parquet needs pyarrow. Every chunk becomes a row group and DECIMAL columns (AVG, SUM) are written
+as doubles, since their precision may change from one chunk to the next.
+"""
+
+import csv
+import time
+from decimal import Decimal
+from typing import Any, Dict, List
+
+import pandas as pd
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+class _CsvStream:
+    def __init__(self, path: str, columns: List[str]) -> None:
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write(self, rows: List[tuple]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class _ParquetStream:
+    def __init__(self, path: str, columns: List[str]) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as err:
+            raise ImportError("The parquet format requires pyarrow (pip install pyarrow)") from err
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.columns = columns
+        self.writer = None
+
+    def write(self, rows: List[tuple]) -> None:
+        chunk = pd.DataFrame.from_records(rows, columns=self.columns)
+        for column in chunk.columns[chunk.dtypes == object]:
+            if chunk[column].map(lambda value: isinstance(value, Decimal)).any():
+                chunk[column] = chunk[column].astype(float)
+        if self.writer is None:
+            table = self.pa.Table.from_pandas(chunk, preserve_index=False)
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = self.pa.Table.from_pandas(chunk, schema=self.writer.schema, preserve_index=False)
+        self.writer.write_table(table)
+
+    def close(self) -> None:
+        if self.writer is None:
+            # an empty result still produces a file with the column names
+            self.pq.write_table(self.pa.table({column: self.pa.array([], self.pa.null()) for column in self.columns}), self.path)
+        else:
+            self.writer.close()
+
+
+def stream_query(cursor, query: str, argument: tuple, path: str, export_format: str = "csv",
+                 chunk_size: int = 10000) -> Dict[str, Any]:
+    """
+    Runs a query and writes its rows to a file chunk by chunk.
+
+    Args:
+        cursor: An unbuffered cursor, connection.cursor(buffered=False).
+        query (str): The SQL query.
+        argument (tuple): Its parameters.
+        path (str): Destination file.
+        export_format (str): "csv" or "parquet".
+        chunk_size (int): Rows fetched and written at once.
+
+    Returns:
+        dict: rows written, first_row_s (seconds from the execution to the first row, None when the
+        result is empty), seconds (total time) and rows_per_s.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {export_format!r}, expected one of {EXPORT_FORMATS}")
+    start = time.perf_counter()
+    cursor.execute(query, argument)
+    first = cursor.fetchone()
+    first_row_s = time.perf_counter() - start if first is not None else None
+    columns = [d[0] for d in cursor.description]
+    sink = (_CsvStream if export_format == "csv" else _ParquetStream)(path, columns)
+    rows = 0
+    try:
+        chunk = []
+        if first is not None:
+            chunk = [first] + (cursor.fetchmany(chunk_size - 1) if chunk_size > 1 else [])
+        while chunk:
+            sink.write(chunk)
+            rows += len(chunk)
+            chunk = cursor.fetchmany(chunk_size)
+    finally:
+        sink.close()
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "first_row_s": first_row_s, "seconds": seconds,
+            "rows_per_s": rows / seconds if seconds else 0.0}
@@ -0,0 +1,248 @@
+"""
+Summary tables of the aggregate queries Q1, Q4, Q5 and Q7, kept up to date by the ingest path of
+DbCreation so that Queries can answer them without scanning the fact tables.
+
+    summary_patient_microorganism   distinct (patient, microorganism) pairs
+    summary_patient                 distinct microorganisms per patient, indexed by the count (Q1)
+    summary_sample_type             samples per sample type (Q4)
+    summary_microorganism_sample_type
+                                    count, sum and sum of squares of qPCR per microorganism and sample
+                                    type (Q5). The mean and the population standard deviation follow
+                                    exactly from the integer sums: sqrt(n * sum_sq - sum^2) / n
+    summary_species                 microorganisms and total sequence length per species (Q7)
+
+Every batch of insert_data_in_batches adds its deltas in the transaction that inserts its rows, so
+the summaries are always consistent with the committed data. The counters of Q4 and Q5 are split by
+a Slot column, the shard that wrote them, so parallel shards never update the same row; the queries
+add the slots up. A batch may rewrite samples already stored, a second load with the same seed
+generates the same identifiers, so the rows stored for its samples are read before the write
+(stored_rows) and their contribution is taken out of the counters. Such a sample may also have
+moved to another patient, so the Q1 pairs of its old and new patients are derived again from the
+fact tables instead of being added. rebuild_summaries recomputes
+every table from the fact tables to repair writes that bypassed the ingest path.
+"""
+
+from typing import List, Tuple
+
+import pandas as pd
+
+SUMMARY_TABLES = ("summary_patient_microorganism", "summary_patient", "summary_sample_type",
+                  "summary_microorganism_sample_type", "summary_species")
+# patients whose counts are refreshed by a single statement
+_RECOUNT_CHUNK = 1000
+# rows of a multi-row upsert of the summary tables, a few hundred KB at most
+_UPSERT_CHUNK = 5000
+
+
+def summary_ddl(id_type: str) -> List[str]:
+    """
+    CREATE TABLE statements of the summary tables.
+
+    Args:
+        id_type (str): SQL type of the identifiers, as in the fact tables.
+    """
+    return [
+        f'''CREATE TABLE IF NOT EXISTS summary_patient_microorganism (
+                Patient_ID {id_type},
+                Microorganism_ID {id_type},
+                PRIMARY KEY (Patient_ID, Microorganism_ID)
+            )''',
+        f'''CREATE TABLE IF NOT EXISTS summary_patient (
+                Patient_ID {id_type} PRIMARY KEY,
+                Num_Microorganisms INT NOT NULL,
+                INDEX summary_patient_count (Num_Microorganisms)
+            )''',
+        '''CREATE TABLE IF NOT EXISTS summary_sample_type (
+                Slot INT,
+                Sample_Type VARCHAR(10),
+                Sample_Count BIGINT NOT NULL,
+                PRIMARY KEY (Slot, Sample_Type)
+            )''',
+        f'''CREATE TABLE IF NOT EXISTS summary_microorganism_sample_type (
+                Slot INT,
+                Microorganism_ID {id_type},
+                Sample_Type VARCHAR(10),
+                Sample_Count BIGINT NOT NULL,
+                Sum_qPCR BIGINT NOT NULL,
+                Sum_Sq_qPCR BIGINT NOT NULL,
+                PRIMARY KEY (Slot, Microorganism_ID, Sample_Type)
+            )''',
+        '''CREATE TABLE IF NOT EXISTS summary_species (
+                Species VARCHAR(255) PRIMARY KEY,
+                Count INT NOT NULL,
+                Sum_Seq_length BIGINT NOT NULL
+            )''',
+    ]
+
+
+def _rows(df: pd.DataFrame) -> List[tuple]:
+    """Rows of a DataFrame as tuples of Python values, as mysql.connector expects them."""
+    return list(zip(*(df[column].tolist() for column in df.columns)))
+
+
+def _upsert(cursor, query: str, df: pd.DataFrame) -> None:
+    """
+    Runs a multi-row upsert in statements of _UPSERT_CHUNK rows, so the statement that
+    mysql.connector folds them into stays under max_allowed_packet however large the batch.
+    """
+    for start in range(0, len(df), _UPSERT_CHUNK):
+        cursor.executemany(query, _rows(df.iloc[start:start + _UPSERT_CHUNK]))
+
+
+def stored_rows(cursor, sample_ids: list) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Reads the rows stored for a list of samples.
+
+    Args:
+        cursor: Cursor of the transaction inserting the batch.
+        sample_ids (list): Sample_ID keys, as stored.
+
+    Returns:
+        tuple: The samples (Sample_ID, Patient_ID, Sample_Type) and their sample_microorganism rows
+        (Microorganism_ID, Sample_ID, qPCR) found in the database.
+    """
+    samples, links = [], []
+    for start in range(0, len(sample_ids), _RECOUNT_CHUNK):
+        chunk = sample_ids[start:start + _RECOUNT_CHUNK]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"SELECT Sample_ID, Patient_ID, Sample_Type FROM sample WHERE Sample_ID IN ({placeholders})", chunk)
+        samples.extend(cursor.fetchall())
+        cursor.execute("SELECT Microorganism_ID, Sample_ID, qPCR FROM sample_microorganism "
+                       f"WHERE Sample_ID IN ({placeholders})", chunk)
+        links.extend(cursor.fetchall())
+    return (pd.DataFrame(samples, columns=["Sample_ID", "Patient_ID", "Sample_Type"]),
+            pd.DataFrame(links, columns=["Microorganism_ID", "Sample_ID", "qPCR"]))
+
+
+def _contributions(samples: pd.DataFrame, links: pd.DataFrame, sign: int) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Counters of Q4 and Q5 of a set of rows, negated with sign=-1.
+    """
+    types = samples.groupby("Sample_Type").size().rename("Sample_Count").reset_index()
+    links = links.merge(samples[["Sample_ID", "Sample_Type"]], on="Sample_ID")
+    qpcr = links["qPCR"].astype("int64")
+    moments = (links.assign(Sum_qPCR=qpcr, Sum_Sq_qPCR=qpcr * qpcr)
+               .groupby(["Microorganism_ID", "Sample_Type"])
+               .agg(Sample_Count=("Sum_qPCR", "size"), Sum_qPCR=("Sum_qPCR", "sum"), Sum_Sq_qPCR=("Sum_Sq_qPCR", "sum"))
+               .reset_index())
+    types["Sample_Count"] *= sign
+    moments[["Sample_Count", "Sum_qPCR", "Sum_Sq_qPCR"]] *= sign
+    return types, moments
+
+
+def _net(frames: List[pd.DataFrame], keys: List[str]) -> pd.DataFrame:
+    """
+    Adds up the counters of frames by key and drops the keys whose counters cancel out.
+    """
+    total = pd.concat(frames).groupby(keys).sum().reset_index()
+    values = [column for column in total.columns if column not in keys]
+    return total[(total[values] != 0).any(axis=1)].reset_index(drop=True)
+
+
+def _recount_patients(cursor, patients: list) -> None:
+    """
+    Refreshes the Q1 counts of patients from their pairs, removing the patients left without any.
+    """
+    for start in range(0, len(patients), _RECOUNT_CHUNK):
+        chunk = patients[start:start + _RECOUNT_CHUNK]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"DELETE FROM summary_patient WHERE Patient_ID IN ({placeholders})", chunk)
+        cursor.execute("INSERT INTO summary_patient (Patient_ID, Num_Microorganisms) "
+                       "SELECT Patient_ID, COUNT(*) FROM summary_patient_microorganism "
+                       f"WHERE Patient_ID IN ({placeholders}) GROUP BY Patient_ID", chunk)
+
+
+def _rederive_patients(cursor, patients: list) -> None:
+    """
+    Replaces the pairs of patients with those of the fact tables and recounts them.
+    """
+    for start in range(0, len(patients), _RECOUNT_CHUNK):
+        chunk = patients[start:start + _RECOUNT_CHUNK]
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(f"DELETE FROM summary_patient_microorganism WHERE Patient_ID IN ({placeholders})", chunk)
+        cursor.execute("INSERT INTO summary_patient_microorganism (Patient_ID, Microorganism_ID) "
+                       "SELECT DISTINCT s.Patient_ID, sm.Microorganism_ID FROM sample s "
+                       "JOIN sample_microorganism sm ON s.Sample_ID = sm.Sample_ID "
+                       f"WHERE s.Patient_ID IN ({placeholders})", chunk)
+    _recount_patients(cursor, patients)
+
+
+def update_summaries(cursor, slot: int, samples: pd.DataFrame, links: pd.DataFrame,
+                     stored: Tuple[pd.DataFrame, pd.DataFrame] = None) -> None:
+    """
+    Adds a batch to the summaries of Q1, Q4 and Q5.
+
+    Args:
+        cursor: Cursor of the transaction inserting the batch.
+        slot (int): Counter slot of the writer, its shard.
+        samples (DataFrame): Sample_ID, Patient_ID and Sample_Type of the samples of the batch, as
+            stored once the batch is written.
+        links (DataFrame): Microorganism_ID, Sample_ID and qPCR of their sample_microorganism rows.
+            A repeated pair counts once with its last qPCR, as the upsert stores it.
+        stored (tuple): The samples and links stored for the same samples before the batch was
+            written, see stored_rows. Their contribution is subtracted from the counters.
+    """
+    if samples.empty:
+        return
+    links = links.drop_duplicates(["Microorganism_ID", "Sample_ID"], keep="last")
+    types, moments = _contributions(samples, links, 1)
+    if stored is not None and not stored[0].empty:
+        old_types, old_moments = _contributions(*stored, -1)
+        types = _net([types, old_types], ["Sample_Type"])
+        moments = _net([moments, old_moments], ["Microorganism_ID", "Sample_Type"])
+
+    pairs = links.merge(samples[["Sample_ID", "Patient_ID"]], on="Sample_ID")[["Patient_ID", "Microorganism_ID"]]
+    pairs = pairs.drop_duplicates()
+    if stored is not None and not stored[0].empty:
+        # a rewritten sample may have moved to another patient (the sample upsert of the bulk modes
+        # replaces Patient_ID), so the pairs of its old and new patients are derived again
+        patients = pd.unique(pd.concat([stored[0]["Patient_ID"], samples["Patient_ID"]])).tolist()
+        _rederive_patients(cursor, patients)
+    else:
+        # a no-op update instead of INSERT IGNORE, which mysql.connector would not fold into one statement
+        _upsert(cursor, "INSERT INTO summary_patient_microorganism (Patient_ID, Microorganism_ID) VALUES (%s, %s) "
+                        "ON DUPLICATE KEY UPDATE Patient_ID=Patient_ID", pairs)
+        _recount_patients(cursor, pairs["Patient_ID"].unique().tolist())
+
+    types.insert(0, "Slot", slot)
+    _upsert(cursor, "INSERT INTO summary_sample_type (Slot, Sample_Type, Sample_Count) VALUES (%s, %s, %s) "
+                    "ON DUPLICATE KEY UPDATE Sample_Count=Sample_Count+VALUES(Sample_Count)", types)
+
+    moments.insert(0, "Slot", slot)
+    _upsert(cursor, "INSERT INTO summary_microorganism_sample_type "
+                    "(Slot, Microorganism_ID, Sample_Type, Sample_Count, Sum_qPCR, Sum_Sq_qPCR) "
+                    "VALUES (%s, %s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+                    "Sample_Count=Sample_Count+VALUES(Sample_Count), Sum_qPCR=Sum_qPCR+VALUES(Sum_qPCR), "
+                    "Sum_Sq_qPCR=Sum_Sq_qPCR+VALUES(Sum_Sq_qPCR)", moments)
+
+
+def refresh_species(cursor) -> None:
+    """
+    Recomputes the summary of Q7. The catalog is upserted with new sequence lengths on every load,
+    so the small microorganism table is summarized again rather than updated with deltas.
+    """
+    cursor.execute("DELETE FROM summary_species")
+    cursor.execute("INSERT INTO summary_species (Species, Count, Sum_Seq_length) "
+                   "SELECT Species, COUNT(*), SUM(Seq_length) FROM microorganism GROUP BY Species")
+
+
+def rebuild_summaries(cursor) -> None:
+    """
+    Recomputes every summary table from the fact tables, in the transaction of the cursor. The
+    counters of Q4 and Q5 are collapsed into slot 0.
+    """
+    for table in SUMMARY_TABLES:
+        cursor.execute(f"DELETE FROM {table}")
+    cursor.execute("INSERT INTO summary_patient_microorganism (Patient_ID, Microorganism_ID) "
+                   "SELECT DISTINCT s.Patient_ID, sm.Microorganism_ID FROM sample s "
+                   "JOIN sample_microorganism sm ON s.Sample_ID = sm.Sample_ID")
+    cursor.execute("INSERT INTO summary_patient (Patient_ID, Num_Microorganisms) "
+                   "SELECT Patient_ID, COUNT(*) FROM summary_patient_microorganism GROUP BY Patient_ID")
+    cursor.execute("INSERT INTO summary_sample_type (Slot, Sample_Type, Sample_Count) "
+                   "SELECT 0, Sample_Type, COUNT(*) FROM sample GROUP BY Sample_Type")
+    cursor.execute("INSERT INTO summary_microorganism_sample_type "
+                   "(Slot, Microorganism_ID, Sample_Type, Sample_Count, Sum_qPCR, Sum_Sq_qPCR) "
+                   "SELECT 0, sm.Microorganism_ID, s.Sample_Type, COUNT(*), SUM(sm.qPCR), SUM(sm.qPCR * sm.qPCR) "
+                   "FROM sample s JOIN sample_microorganism sm ON s.Sample_ID = sm.Sample_ID "
+                   "GROUP BY sm.Microorganism_ID, s.Sample_Type")
+    refresh_species(cursor)
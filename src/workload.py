@@ -0,0 +1,273 @@
+"""
+Parameterized workloads for the queries that take parameters, Q2 (microorganism ID) and Q3
+(disease), and replay of recorded workloads.
+
+The parameters are drawn from the values actually stored in the database, each one weighted by the
+rows it selects (occurrences of a microorganism, patients with a disease), so the selectivities of
+the benchmark follow the data. An optional Zipf skew ranks the values by frequency instead and
+queries the value of rank r with weight 1 / r^s, concentrating the workload on a few hot values.
+
+A workload is a trace: the ordered list of (query, arguments) calls, written one JSON object per
+line. Replaying a trace runs exactly the same calls in the same order against any backend, so two
+runs, or two backends, are measured on the same parameters:
+
+    python workload.py record -p <password> -m Q2=100 Q3=100 --zipf 1.1 -o trace.jsonl
+    python workload.py replay -t trace.jsonl -b mysql -p <password> -o replay.csv
+"""
+
+import argparse
+import json
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from id_codec import ID_MODES, sql_decode
+
+# queries whose parameters are sampled
+PARAMETERIZED_QUERIES = (2, 3)
+# arguments the MongoDB version of query 6 always takes
+_MONGO_Q6_ARGUMENTS = ("Hepatitis B", "Virus")
+
+
+def mysql_distributions(cursor, id_mode: str = "char") -> Dict[int, pd.Series]:
+    """
+    Reads the value distributions of the Q2 and Q3 parameters from MySQL.
+
+    Returns:
+        dict: Query number to a Series of row counts indexed by parameter value.
+    """
+    microorganism = sql_decode("Microorganism_ID") if id_mode == "int" else "Microorganism_ID"
+    cursor.execute(f"SELECT {microorganism}, COUNT(*) FROM sample_microorganism GROUP BY Microorganism_ID")
+    microorganisms = dict(cursor.fetchall())
+    cursor.execute("SELECT Disease, COUNT(*) FROM patient WHERE Disease IS NOT NULL GROUP BY Disease")
+    diseases = dict(cursor.fetchall())
+    return {2: pd.Series(microorganisms, dtype="int64"), 3: pd.Series(diseases, dtype="int64")}
+
+
+def mongo_distributions(db, collection_patients: str = "Patients") -> Dict[int, pd.Series]:
+    """
+    Reads the value distributions of the Q2 and Q3 parameters from MongoDB.
+
+    Returns:
+        dict: Query number to a Series of document counts indexed by parameter value.
+    """
+    collection = db.get_collection(collection_patients)
+    microorganisms = collection.aggregate([
+        {"$unwind": "$samples"},
+        {"$unwind": "$samples.microorganisms"},
+        {"$group": {"_id": "$samples.microorganisms.microorganism_id", "count": {"$sum": 1}}},
+    ])
+    diseases = collection.aggregate([
+        {"$match": {"disease": {"$ne": None}}},
+        {"$group": {"_id": "$disease", "count": {"$sum": 1}}},
+    ])
+    return {2: pd.Series({d["_id"]: d["count"] for d in microorganisms}, dtype="int64"),
+            3: pd.Series({d["_id"]: d["count"] for d in diseases}, dtype="int64")}
+
+
+class WorkloadSampler:
+    """
+    Samples the parameters of Q2 and Q3 from the stored value distributions.
+
+    Attributes:
+        distributions (dict): Query number to a Series of row counts indexed by parameter value.
+        zipf (float): Zipf exponent of the skew, None to weight every value by its row count.
+        seed (int): Seed of the generator, the same seed draws the same parameters.
+
+    Methods:
+        probabilities(self, num_qry): Probability of every parameter value.
+        sample(self, num_qry, n): Draws argument tuples.
+        trace(self, mix): Draws a shuffled workload.
+    """
+
+    def __init__(self, distributions: Dict[int, pd.Series], zipf: float = None, seed: int = 42) -> None:
+        for num_qry in PARAMETERIZED_QUERIES:
+            if num_qry in distributions and distributions[num_qry].empty:
+                raise ValueError(f"No stored values to draw the parameters of Q{num_qry} from")
+        if zipf is not None and zipf <= 0:
+            raise ValueError(f"The Zipf exponent must be positive, got {zipf}")
+        self.distributions = distributions
+        self.zipf = zipf
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+
+    def probabilities(self, num_qry: int) -> pd.Series:
+        """
+        Probability of drawing every value of a parameter, sorted from the most frequent value.
+        """
+        counts = self.distributions[num_qry].sort_values(ascending=False, kind="stable")
+        if self.zipf is None:
+            weights = counts.to_numpy(dtype=float)
+        else:
+            weights = 1.0 / np.arange(1, len(counts) + 1) ** self.zipf
+        return pd.Series(weights / weights.sum(), index=counts.index)
+
+    def sample(self, num_qry: int, n: int) -> List[tuple]:
+        """
+        Draws the arguments of n calls of a query.
+
+        Returns:
+            list: n argument tuples, empty tuples for the queries without parameters.
+        """
+        if num_qry not in PARAMETERIZED_QUERIES:
+            return [()] * n
+        probabilities = self.probabilities(num_qry)
+        picks = self._rng.choice(len(probabilities), size=n, p=probabilities.to_numpy())
+        return [(probabilities.index[pick],) for pick in picks]
+
+    def trace(self, mix: Dict[int, int]) -> List[Tuple[int, tuple]]:
+        """
+        Draws a workload with mix[q] calls of every query q, in a random order.
+
+        Returns:
+            list: (query number, arguments) calls.
+        """
+        calls = [(num_qry, args) for num_qry, n in sorted(mix.items()) for args in self.sample(num_qry, n)]
+        order = self._rng.permutation(len(calls))
+        return [calls[i] for i in order]
+
+
+def write_trace(path: str, calls: Sequence[Tuple[int, tuple]]) -> None:
+    """
+    Writes a trace, one {"query": ..., "args": [...]} object per line.
+    """
+    with open(path, "w") as file:
+        for num_qry, args in calls:
+            file.write(json.dumps({"query": int(num_qry), "args": [str(arg) for arg in args]}) + "\n")
+
+
+def read_trace(path: str) -> List[Tuple[int, tuple]]:
+    """
+    Reads a trace written by write_trace.
+    """
+    with open(path) as file:
+        return [(call["query"], tuple(call["args"])) for call in map(json.loads, file) if call]
+
+
+def replay(calls: Sequence[Tuple[int, tuple]], run: Callable[..., object]) -> pd.DataFrame:
+    """
+    Runs the calls of a trace one after another.
+
+    Args:
+        calls (list): (query number, arguments) calls, as read_trace returns them.
+        run (callable): run(num_qry, *args) runs a query on a backend, see the *_runner functions.
+
+    Returns:
+        DataFrame: Seq, Query, Args and Time_ms of every call, in the order of the trace.
+    """
+    records = []
+    for seq, (num_qry, args) in enumerate(calls):
+        start = time.perf_counter()
+        run(num_qry, *args)
+        records.append({"Seq": seq, "Query": f"Q{num_qry}", "Args": "|".join(args),
+                        "Time_ms": (time.perf_counter() - start) * 1000})
+    return pd.DataFrame(records)
+
+
+def mysql_runner(queries) -> Callable[..., object]:
+    """Runs the calls of a trace with the query<n> methods of a mysql_queries.Queries."""
+    return lambda num_qry, *args: getattr(queries, f"query{num_qry}")(*args)
+
+
+def mongo_runner(mongo, collection_patients: str = "Patients",
+                 collection_microorganisms: str = "Microorganism") -> Callable[..., object]:
+    """Runs the calls of a trace on a mongodb_queries.MongoDBAggregations."""
+    def run(num_qry, *args):
+        collection = collection_microorganisms if num_qry == 7 else collection_patients
+        return mongo._aggregate(collection, num_qry, *(args or (_MONGO_Q6_ARGUMENTS if num_qry == 6 else ())))
+    return run
+
+
+def benchmark_runner(backend) -> Callable[..., object]:
+    """Runs the calls of a trace on a benchmark backend (MySQLBackend, MongoBackend, XmlBackend, XmlStreamBackend, XmlIndexBackend)."""
+    from benchmark import PhaseTimer
+
+    def run(num_qry, *args):
+        if args:
+            backend.arguments = {**backend.arguments, num_qry: args}
+        return backend.run(num_qry, PhaseTimer())
+    return run
+
+
+def parse_mix(items: List[str]) -> Dict[int, int]:
+    """
+    Reads a query mix written as Q2=100 Q3=50 ...
+    """
+    mix = {}
+    for item in items:
+        query, _, count = item.partition("=")
+        if not query.startswith("Q") or not query[1:].isdigit() or not count.isdigit():
+            raise ValueError(f"Expected Q<n>=<calls>, got {item!r}")
+        mix[int(query[1:])] = int(count)
+    return mix
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Record parameterized workloads and replay them.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record = subparsers.add_parser("record", help="Draw a workload from the stored values and write its trace")
+    record.add_argument('-s', '--source', choices=["mysql", "mongodb"], default="mysql",
+                        help='Database the value distributions are read from')
+    record.add_argument('-m', '--mix', nargs='+', default=["Q2=50", "Q3=50"], help='Calls per query, Q<n>=<calls>')
+    record.add_argument('--zipf', type=float, default=None, help='Zipf exponent of the parameter skew')
+    record.add_argument('--seed', type=int, default=42, help='Seed of the draws')
+    record.add_argument('-o', '--output', type=str, required=True, help='Trace file')
+    replay_parser = subparsers.add_parser("replay", help="Run the calls of a trace and time them")
+    replay_parser.add_argument('-t', '--trace', type=str, required=True, help='Trace file')
+    replay_parser.add_argument('-b', '--backend', choices=["mysql", "mongodb", "xml", "xml_stream", "xml_index"], default="mysql",
+                               help='Backend the trace runs on')
+    replay_parser.add_argument('--xml', type=str, default="../data-files/microbiome.xml", help='XML document')
+    replay_parser.add_argument('-o', '--output', type=str, required=True, help='CSV receiving the time of every call')
+    for subparser in (record, replay_parser):
+        subparser.add_argument('-p', '--password', type=str, help='MySQL password')
+        subparser.add_argument('-d', '--database', type=str, default='microbiomeDB', help='MySQL database')
+        subparser.add_argument('--id-mode', choices=ID_MODES, default='char',
+                               help='Identifier storage of the MySQL schema')
+        subparser.add_argument('--mongo-uri', type=str, default='mongodb://localhost:27017', help='MongoDB URI')
+        subparser.add_argument('--mongo-db', type=str, default='BDB2023', help='MongoDB database')
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if args.source == "mysql":
+            import mysql_pool
+            connection = mysql_pool.connect(args.password, args.database)
+            cursor = connection.cursor()
+            try:
+                distributions = mysql_distributions(cursor, args.id_mode)
+            finally:
+                cursor.close()
+                connection.close()
+        else:
+            from pymongo import MongoClient
+            distributions = mongo_distributions(MongoClient(args.mongo_uri)[args.mongo_db])
+        calls = WorkloadSampler(distributions, args.zipf, args.seed).trace(parse_mix(args.mix))
+        write_trace(args.output, calls)
+        print(f"{len(calls)} calls written to {args.output}")
+        return 0
+
+    calls = read_trace(args.trace)
+    if args.backend == "mysql":
+        from mysql_queries import Queries
+        run = mysql_runner(Queries(args.password, args.database, args.id_mode, use_cache=False))
+    elif args.backend == "mongodb":
+        from mongodb_queries import MongoDBAggregations
+        run = mongo_runner(MongoDBAggregations(args.mongo_uri, args.mongo_db, use_cache=False))
+    elif args.backend == "xml":
+        from benchmark import XmlBackend
+        run = benchmark_runner(XmlBackend(args.xml))
+    elif args.backend == "xml_stream":
+        from benchmark import XmlStreamBackend
+        run = benchmark_runner(XmlStreamBackend(args.xml))
+    else:
+        from benchmark import XmlIndexBackend
+        run = benchmark_runner(XmlIndexBackend(args.xml))
+    times = replay(calls, run)
+    times.to_csv(args.output, index=False)
+    print(times.groupby("Query")["Time_ms"].describe(percentiles=[0.5, 0.95]).to_string())
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""
+Sidecar index of byte offsets for random access into microbiome.xml.
+
+Answering a selective query over the XML document, Q2 (the samples of a microorganism) or Q3 (the
+patients with a disease), otherwise parses the whole file. The index maps every Patient_ID, Disease
+and Microorganism_ID to the byte ranges of the <patient> elements that contain it. A lookup maps the
+document with mmap and parses only those fragments, so its cost depends on the matching patients
+and not on the size of the file.
+
+The index is a JSON file next to the document (microbiome.xml.idx.json) holding the size and
+modification time of the document it was built from, the [start, end) range of every patient in
+document order and, for every indexed field, the positions of the patients of every value. It is
+built again when the document changes:
+
+    python xml_index.py --xml ../data-files/microbiome.xml
+    python xml_index.py --xml ../data-files/microbiome.xml --disease "Herpes simplex"
+"""
+
+import argparse
+import json
+import mmap
+import os
+import re
+import time
+from typing import Dict, List, Tuple
+
+import pandas as pd
+from lxml import etree
+
+INDEXED_FIELDS = ("Patient_ID", "Disease", "Microorganism_ID")
+INDEX_SUFFIX = ".idx.json"
+# start and end tags of a patient, with or without a namespace prefix, attributes or whitespace
+_OPEN_TAG = re.compile(rb"<(?:[\w.-]+:)?patient(?:\s[^>]*)?/?>")
+_CLOSE_TAG = re.compile(rb"</(?:[\w.-]+:)?patient\s*>")
+
+
+def _source(path: str) -> Dict[str, int]:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _patient_ranges(data) -> List[Tuple[int, int]]:
+    """
+    Byte ranges of the <patient> elements of a mapped document. A < cannot appear unescaped inside
+    the text of an element, so a search of the raw bytes for the start and end tags finds every
+    element. build_index checks the ranges against the elements counted by the XML parser.
+    """
+    ranges = []
+    opening = _OPEN_TAG.search(data)
+    while opening is not None:
+        start = opening.start()
+        if opening.group().endswith(b"/>"):
+            end = opening.end()
+        else:
+            closing = _CLOSE_TAG.search(data, opening.end())
+            if closing is None:
+                raise ValueError(f"The <patient> element at byte {start} is not closed")
+            end = closing.end()
+        ranges.append((start, end))
+        opening = _OPEN_TAG.search(data, end)
+    return ranges
+
+
+def _count_patients(xml_path: str) -> int:
+    """
+    Number of patient elements in the document, in any namespace, counted by iterparse.
+    """
+    count = 0
+    for _, element in etree.iterparse(xml_path, events=("end",), tag="{*}patient"):
+        count += 1
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+    return count
+
+
+def build_index(xml_path: str, index_path: str = None) -> str:
+    """
+    Scans the document and writes its index. The byte ranges are validated against a count of the
+    patients by the XML parser, so a document the tag search misreads is rejected, not indexed.
+
+    Args:
+        xml_path (str): The XML document.
+        index_path (str): Index file, the document path followed by .idx.json by default.
+
+    Returns:
+        str: Path of the index.
+
+    Raises:
+        ValueError: If the byte ranges do not match the patients of the document.
+    """
+    index_path = index_path or xml_path + INDEX_SUFFIX
+    fields = {field: {} for field in INDEXED_FIELDS}
+    with open(xml_path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        ranges = _patient_ranges(data)
+        expected = _count_patients(xml_path)
+        if len(ranges) != expected:
+            raise ValueError(f"Found {len(ranges)} <patient> byte ranges in {xml_path} but the parser "
+                             f"counts {expected} patients, the document cannot be indexed")
+        for position, (start, end) in enumerate(ranges):
+            try:
+                patient = etree.fromstring(data[start:end])
+            except etree.XMLSyntaxError as err:
+                raise ValueError(f"The <patient> element at byte {start} cannot be parsed on its own: {err}") from err
+            values = {"Patient_ID": [patient.findtext("Patient_ID")], "Disease": [patient.findtext("Disease")],
+                      "Microorganism_ID": patient.xpath("sample_list/sample/microorganism_list/microorganism/"
+                                                       "Microorganism_ID/text()")}
+            for field, field_values in values.items():
+                # a patient is listed once per value however many samples contain it
+                for value in dict.fromkeys(field_values):
+                    fields[field].setdefault(value, []).append(position)
+    with open(index_path, "w") as file:
+        json.dump({"source": _source(xml_path), "patients": ranges, "fields": fields}, file)
+    return index_path
+
+
+def q2_rows(patients: List[etree._Element], microorganism_id: str) -> List[tuple]:
+    """
+    Sample_ID and qPCR of the occurrences of a microorganism in some patients, by decreasing qPCR.
+    """
+    rows = [(microorganism.getparent().getparent().findtext("Sample_ID"), int(microorganism.findtext("qPCR")))
+            for patient in patients
+            for microorganism in patient.xpath("sample_list/sample/microorganism_list/microorganism"
+                                               "[Microorganism_ID=$id]", id=microorganism_id)]
+    return sorted(rows, key=lambda row: row[1], reverse=True)
+
+
+def q3_rows(patients: List[etree._Element]) -> List[tuple]:
+    """
+    Patient_ID, Sample_ID, Date, Body_Part and Sample_Type of the samples of some patients, by date.
+    """
+    rows = [(patient.findtext("Patient_ID"), sample.findtext("Sample_ID"), sample.findtext("Date"),
+             sample.findtext("Body_Part"), sample.findtext("Sample_Type"))
+            for patient in patients for sample in patient.iterfind("sample_list/sample")]
+    return sorted(rows, key=lambda row: row[2])
+
+
+class XmlIndex:
+    """
+    Lookups of <patient> elements through the sidecar index of an XML document.
+
+    Attributes:
+        xml_path (str): The XML document.
+        index_path (str): Its index, built when it is missing or older than the document.
+
+    Methods:
+        positions(self, field, value): Document positions of the patients with a value.
+        lookup(self, field, value): Parsed <patient> elements with a value.
+        samples_with_microorganism(self, microorganism_id): Result of Q2.
+        patients_with_disease(self, disease): Result of Q3.
+        close(self): Unmaps the document.
+    """
+
+    def __init__(self, xml_path: str, index_path: str = None) -> None:
+        self.xml_path = xml_path
+        self.index_path = index_path or xml_path + INDEX_SUFFIX
+        index = self._load()
+        if index is None or index["source"] != _source(xml_path):
+            build_index(xml_path, self.index_path)
+            index = self._load()
+        self._ranges = index["patients"]
+        self._fields = index["fields"]
+        self._file = open(xml_path, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return None
+        with open(self.index_path) as file:
+            return json.load(file)
+
+    def positions(self, field: str, value: str) -> List[int]:
+        """
+        Positions, in document order, of the patients in which a field takes a value.
+        """
+        if field not in INDEXED_FIELDS:
+            raise ValueError(f"{field!r} is not indexed, expected one of {INDEXED_FIELDS}")
+        return self._fields[field].get(value, [])
+
+    def lookup(self, field: str, value: str) -> List[etree._Element]:
+        """
+        Parses the <patient> elements in which a field takes a value, and only those.
+
+        Args:
+            field (str): Patient_ID, Disease or Microorganism_ID.
+            value (str): The value looked up.
+
+        Returns:
+            list: The patient elements, in document order.
+        """
+        return [etree.fromstring(self._data[start:end])
+                for start, end in (self._ranges[position] for position in self.positions(field, value))]
+
+    def samples_with_microorganism(self, microorganism_id: str) -> pd.DataFrame:
+        """
+        Q2: the samples in which a microorganism is present and its qPCR, as benchmark.XmlBackend.
+        """
+        rows = q2_rows(self.lookup("Microorganism_ID", microorganism_id), microorganism_id)
+        return pd.DataFrame.from_records(rows, columns=["Sample_ID", "qPCR"])
+
+    def patients_with_disease(self, disease: str) -> pd.DataFrame:
+        """
+        Q3: the samples of the patients with a disease, as benchmark.XmlBackend.
+        """
+        rows = q3_rows(self.lookup("Disease", disease))
+        return pd.DataFrame.from_records(rows, columns=["Patient_ID", "Sample_ID", "Date", "Body_Part", "Sample_Type"])
+
+    def close(self) -> None:
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Build the byte offset index of microbiome.xml and look it up.")
+    parser.add_argument('--xml', type=str, default=os.path.join("..", "data-files", "microbiome.xml"),
+                        help='XML document')
+    parser.add_argument('--index', type=str, default=None, help='Index file, <xml>.idx.json by default')
+    parser.add_argument('--patient', type=str, default=None, help='Patient_ID to look up')
+    parser.add_argument('--disease', type=str, default=None, help='Disease whose samples are listed (Q3)')
+    parser.add_argument('--microorganism', type=str, default=None,
+                        help='Microorganism_ID whose samples are listed (Q2)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    path = build_index(args.xml, args.index)
+    print(f"Index written to {path} in {time.perf_counter() - start:.3f}s")
+    with XmlIndex(args.xml, path) as index:
+        if args.patient:
+            for patient in index.lookup("Patient_ID", args.patient):
+                print(etree.tostring(patient, encoding="unicode"))
+        if args.microorganism:
+            print(index.samples_with_microorganism(args.microorganism).to_string(index=False))
+        if args.disease:
+            print(index.patients_with_disease(args.disease).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -1,74 +1,179 @@
+import os
+from typing import Any, Dict, Iterator, List, Tuple
 from lxml import etree
-import mysql.connector as mysql 
-import datetime
+import mysql.connector as mysql
+import mysql_pool
+from dataset_writers import patient_element
+from id_codec import ID_MODES, sql_decode
+
+# Rows fetched at once from every scan
+FETCH_SIZE = 10000
+
 def connect(password, database):
         try:
-            connection = mysql.connect(
-                    host="localhost",
-                    user="root",
-                    password=password,
-                    database=database)
+            connection = mysql_pool.connect(password, database)
             return  connection
         except mysql.Error as err:
             print(f"Error: {err}")
 
+
+def _scan(connection, query: str, columns: List[str], fetch_size: int = FETCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Streams the rows of a query as dictionaries, fetching them in chunks from an unbuffered cursor.
+    """
+    cursor = connection.cursor(buffered=False)
+    try:
+        cursor.execute(query)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(columns, row))
+    finally:
+        cursor.close()
+
+
+def _group_by(rows: Iterator[Dict[str, Any]], key: str) -> Iterator[Tuple[Any, List[Dict[str, Any]]]]:
+    """
+    Groups consecutive rows with the same value of key, the rows of a scan sorted by it.
+    """
+    group, current = [], None
+    for row in rows:
+        if group and row[key] != current:
+            yield current, group
+            group = []
+        current = row[key]
+        group.append(row)
+    if group:
+        yield current, group
+
+
+def iter_patients(connections, id_mode: str = "char", fetch_size: int = FETCH_SIZE):
+    """
+    Nests the patients with their samples and microorganism occurrences from three scans sorted by
+    patient, merged with a streaming group-by: only the rows of the current patient are in memory.
+
+    The groups of samples and occurrences are advanced by comparing their patient with the current
+    one in the order of the scans (the identifiers, and the integer keys of the "int" mode, sort as
+    their strings), so a group without its patient is skipped instead of stalling the merge. That
+    happens when the foreign keys were deferred (defer_constraints) and rows were left orphaned.
+    The orphan rows are counted and reported once the scans are exhausted.
+
+    Args:
+        connections (list): Three connections, one per scan, since an unbuffered scan holds its
+            connection until it is read to the end.
+        id_mode (str): Storage of the identifiers, "char" or "int".
+        fetch_size (int): Rows fetched at once from every scan.
+
+    Yields:
+        tuple: The patient row and the list of its (sample row, occurrence rows) pairs, the shape
+        taken by dataset_writers.patient_element.
+    """
+    def ids(column, name=None):
+        return sql_decode(column, name) if id_mode == "int" else f"{column} AS {name or column.split('.')[-1]}"
+
+    patient_columns = ["Patient_ID", "Age", "Birth_Type", "Location", "Lifestyle", "Disease", "Sex"]
+    sample_columns = ["Sample_ID", "Patient_ID", "Date", "Body_Part", "Sample_Type"]
+    occurrence_columns = ["Patient_ID", "Sample_ID", "Microorganism_ID", "qPCR"]
+    # the scans are ordered by the stored keys, so the integer keys of the "int" mode keep their index order
+    patients = _scan(connections[0], f"SELECT {ids('Patient_ID')}, Age, Birth_Type, Location, Lifestyle, Disease, Sex "
+                                     "FROM patient ORDER BY patient.Patient_ID", patient_columns, fetch_size)
+    samples = _group_by(_scan(connections[1], f"SELECT {ids('Sample_ID')}, {ids('Patient_ID')}, Date, Body_Part, Sample_Type "
+                                              "FROM sample ORDER BY sample.Patient_ID, sample.Sample_ID",
+                              sample_columns, fetch_size), "Patient_ID")
+    occurrences = _group_by(_scan(connections[2], f"SELECT {ids('s.Patient_ID')}, {ids('sm.Sample_ID')}, "
+                                                  f"{ids('sm.Microorganism_ID')}, sm.qPCR "
+                                                  "FROM sample_microorganism sm JOIN sample s ON s.Sample_ID = sm.Sample_ID "
+                                                  "ORDER BY s.Patient_ID, sm.Sample_ID",
+                                  occurrence_columns, fetch_size), "Patient_ID")
+    next_samples = next(samples, None)
+    next_occurrences = next(occurrences, None)
+    orphans = 0
+    for patient in patients:
+        key = patient["Patient_ID"]
+        while next_samples is not None and next_samples[0] < key:
+            orphans += len(next_samples[1])
+            next_samples = next(samples, None)
+        while next_occurrences is not None and next_occurrences[0] < key:
+            orphans += len(next_occurrences[1])
+            next_occurrences = next(occurrences, None)
+        patient_samples = []
+        if next_samples is not None and next_samples[0] == key:
+            patient_samples = next_samples[1]
+            next_samples = next(samples, None)
+        by_sample = {}
+        if next_occurrences is not None and next_occurrences[0] == key:
+            for occurrence in next_occurrences[1]:
+                by_sample.setdefault(occurrence["Sample_ID"], []).append(occurrence)
+            next_occurrences = next(occurrences, None)
+        yield patient, [(sample, by_sample.get(sample["Sample_ID"], [])) for sample in patient_samples]
+    orphans += sum(len(group) for _, group in ([next_samples] if next_samples else []) + list(samples))
+    orphans += sum(len(group) for _, group in ([next_occurrences] if next_occurrences else []) + list(occurrences))
+    if orphans:
+        raise ValueError(f"{orphans} sample rows do not belong to any patient, add the foreign keys before exporting")
+
+
 # Función para generar el XML
-def generate_xml(password, database):
+def generate_xml(password, database, output="./specification-files/microbiome.xml", id_mode="char",
+                 fetch_size=FETCH_SIZE):
     """
     Genera un archivo XML a partir de los datos obtenidos de la base de datos MySQL.
+
+    The tables are read with a query per table sorted by patient instead of a query per patient
+    and sample, and every <patient> is written as soon as it is complete with lxml.etree.xmlfile,
+    so the memory used does not grow with the size of the database. The document is written to
+    a temporary file that replaces output only when the export succeeds.
+
+    Args:
+        password (str): MySQL password.
+        database (str): Database to export.
+        output (str): Path of the XML document.
+        id_mode (str): Storage of the identifiers, "char" or "int".
+        fetch_size (int): Rows fetched at once from every scan.
+
+    Returns:
+        int: Number of patients written.
+
+    Raises:
+        ValueError: If samples or occurrences do not belong to any patient. output is left untouched.
     """
-    # Crea el elemento raíz
-    root = etree.Element('microbiome')
-    
-    # Ejecutar consulta SQL para obtener los datos de los pacientes
-    connection = connect(password, database)
-    cursor = connection.cursor()
-    cursor.execute("SELECT * FROM patient")
-    pacientes = cursor.fetchall()
-
-    for paciente in pacientes:
-        # Crear elemento por cada paciente
-        patient_elem = etree.SubElement(root, 'patient')
-        etree.SubElement(patient_elem, 'Patient_ID').text = str(paciente[0])
-        etree.SubElement(patient_elem, 'Age').text = str(paciente[1])
-        etree.SubElement(patient_elem, 'Birth_Type').text = paciente[2]
-        etree.SubElement(patient_elem, 'Location').text = paciente[3]
-        etree.SubElement(patient_elem, 'Lifestyle').text = paciente[4]
-        etree.SubElement(patient_elem, 'Disease').text = paciente[5]
-        etree.SubElement(patient_elem, 'Sex').text = paciente[6]
-        
-        # Asumimos que hay otra tabla para muestras relacionadas con cada paciente
-        cursor.execute(f"SELECT * FROM sample WHERE Patient_ID = '{paciente[0]}'")
-        muestras = cursor.fetchall()
-        samples_elem = etree.SubElement(patient_elem, 'sample_list')
-        
-        for muestra in muestras:
-            sample_elem = etree.SubElement(samples_elem, 'sample')
-            etree.SubElement(sample_elem, 'Sample_ID').text = str(muestra[0])
-            # Skip [1] for patient id
-            fecha = muestra[2]
-            etree.SubElement(sample_elem, 'Date').text = fecha.strftime("%Y-%m-%d")
-            etree.SubElement(sample_elem, 'Body_Part').text = muestra[3]
-            etree.SubElement(sample_elem, 'Sample_Type').text = muestra[4]
-
-            # Asumimos que hay una tabla para microorganismos en cada muestra
-            cursor.execute(f"SELECT m.Microorganism_ID, m.FASTA, m.Kingdom, m.Species, m.Seq_length, sm.qPCR FROM microorganism m, sample_microorganism sm WHERE sm.Microorganism_ID=m.Microorganism_ID  AND sm.Sample_ID = '{muestra[0]}'")
-            micros = cursor.fetchall()
-            micros_elem = etree.SubElement(sample_elem, 'microorganism_list')
-            
-            for micro in micros:
-                micro_elem = etree.SubElement(micros_elem, 'microorganism')
-                etree.SubElement(micro_elem, 'Microorganism_ID').text = str(micro[0])
-                etree.SubElement(micro_elem, 'Species').text = micro[3]
-                etree.SubElement(micro_elem, 'Kingdom').text = micro[2]
-                etree.SubElement(micro_elem, 'FASTA').text = micro[1]
-                etree.SubElement(micro_elem, 'Seq_length').text = str(micro[4])
-                etree.SubElement(micro_elem, 'qPCR').text = str(micro[5])
-
-    # Convertir el árbol XML en una cadena y guardarla en un archivo
-    tree = etree.ElementTree(root)
-    tree.write('./specification-files/microbiome.xml', pretty_print=True, xml_declaration=True, encoding='UTF-8')
-
-
-
-generate_xml(password="bdbiO", database="microbiome_db")
+    if id_mode not in ID_MODES:
+        raise ValueError(f"Unknown id mode {id_mode!r}, expected one of {ID_MODES}")
+    connections = [connect(password, database) for _ in range(3)]
+    if any(connection is None for connection in connections):
+        for connection in connections:
+            if connection is not None:
+                connection.close()
+        return 0
+    written = 0
+    partial = output + ".partial"
+    try:
+        # the catalog is small, it is looked up by id while the occurrences stream
+        cursor = connections[0].cursor()
+        microorganism_id = sql_decode("Microorganism_ID") if id_mode == "int" else "Microorganism_ID"
+        cursor.execute(f"SELECT {microorganism_id}, Species, Kingdom, FASTA, Seq_length FROM microorganism")
+        microorganisms = {row[0]: dict(zip(("Microorganism_ID", "Species", "Kingdom", "FASTA", "Seq_length"), row))
+                          for row in cursor.fetchall()}
+        cursor.close()
+
+        with etree.xmlfile(partial, encoding="UTF-8") as xf:
+            xf.write_declaration()
+            with xf.element("microbiome"):
+                for patient, samples in iter_patients(connections, id_mode, fetch_size):
+                    xf.write(patient_element(patient, samples, microorganisms), pretty_print=True)
+                    written += 1
+        os.replace(partial, output)
+    except mysql.Error as err:
+        print(f"Error: {err}")
+        written = 0
+    finally:
+        for connection in connections:
+            connection.close()
+        if os.path.exists(partial):
+            os.remove(partial)
+    return written
+
+
+if __name__ == "__main__":
+    generate_xml(password="bdbiO", database="microbiome_db")
@@ -0,0 +1,277 @@
+"""
+Single pass evaluation of the seven queries over microbiome.xml.
+
+The XQuery of XML_Queries.txt re-scans the document for every key (distinct-values followed by a
+predicate over all the microorganisms in Q4, Q5 and Q7), which is quadratic in its size. Here the
+document is read once with lxml.etree.iterparse: every <patient> is reduced to a small record as
+soon as it is complete and then cleared, together with the patients before it, so the memory used
+is bounded by one patient plus the aggregation state. Each query keeps a hash aggregation (or a
+bounded heap for the top ten of Q1) fed by the records, and any subset of the queries is answered
+by the same pass.
+
+The rows, columns and order of every result are those of benchmark.XmlBackend, so both engines
+can be compared query by query:
+
+    python xml_queries.py --xml ../data-files/microbiome.xml -q 1 2 3 4 5 6 7 -o csv-queries
+"""
+
+import argparse
+import heapq
+import os
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+from lxml import etree
+
+from benchmark import QUERIES, QUERY_ARGUMENTS
+
+# query number -> column names of its result
+COLUMNS = {
+    1: ["Patient_ID", "Num_Microorganisms"],
+    2: ["Sample_ID", "qPCR"],
+    3: ["Patient_ID", "Sample_ID", "Date", "Body_Part", "Sample_Type"],
+    4: ["Sample_Type", "Sample_Count"],
+    5: ["Microorganism_ID", "Sample_Type", "Sample_Count", "avg_qPCR", "stddev_qPCR"],
+    6: ["Patient_ID", "Max_qPCR"],
+    7: ["Species", "Count", "avg_SeqLength"],
+}
+_PATIENT_FIELDS = ("Patient_ID", "Disease")
+_SAMPLE_FIELDS = ("Sample_ID", "Date", "Body_Part", "Sample_Type")
+_MICROORGANISM_FIELDS = ("Microorganism_ID", "Species", "Seq_length", "qPCR")
+
+
+def _patient_record(element) -> Tuple[Dict[str, str], List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]]:
+    """
+    Reads the fields the queries use from a <patient> element.
+
+    Returns:
+        tuple: The patient fields and its (sample fields, microorganism fields) pairs.
+    """
+    patient = {field: element.findtext(field) for field in _PATIENT_FIELDS}
+    samples = []
+    for sample in element.iterfind("sample_list/sample"):
+        microorganisms = []
+        for microorganism in sample.iterfind("microorganism_list/microorganism"):
+            record = {field: microorganism.findtext(field) for field in _MICROORGANISM_FIELDS}
+            record["Seq_length"] = int(record["Seq_length"])
+            record["qPCR"] = int(record["qPCR"])
+            microorganisms.append(record)
+        samples.append(({field: sample.findtext(field) for field in _SAMPLE_FIELDS}, microorganisms))
+    return patient, samples
+
+
+def iter_patients(path: str):
+    """
+    Yields the record of every <patient> of the document, see _patient_record, clearing the parsed
+    elements as it goes.
+    """
+    for _, element in etree.iterparse(path, events=("end",), tag="patient"):
+        yield _patient_record(element)
+        element.clear(keep_tail=True)
+        # the cleared patients stay attached to <microbiome> until they are removed
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+class _Q1:
+    """The ten patients with the most distinct microorganisms."""
+
+    def __init__(self) -> None:
+        self.counts = []
+
+    def add(self, patient, samples) -> None:
+        distinct = {m["Microorganism_ID"] for _, microorganisms in samples for m in microorganisms}
+        self.counts.append((patient["Patient_ID"], len(distinct)))
+        if len(self.counts) > 1000:
+            # keeps the candidates only, nlargest is stable like sorted(reverse=True)[:10]
+            self.counts = heapq.nlargest(10, self.counts, key=lambda row: row[1])
+
+    def rows(self) -> List[tuple]:
+        return heapq.nlargest(10, self.counts, key=lambda row: row[1])
+
+
+class _Q2:
+    """The samples in which a microorganism is present, with its qPCR."""
+
+    def __init__(self, microorganism_id: str) -> None:
+        self.microorganism_id = microorganism_id
+        self.matches = []
+
+    def add(self, patient, samples) -> None:
+        for sample, microorganisms in samples:
+            for m in microorganisms:
+                if m["Microorganism_ID"] == self.microorganism_id:
+                    self.matches.append((sample["Sample_ID"], m["qPCR"]))
+
+    def rows(self) -> List[tuple]:
+        return sorted(self.matches, key=lambda row: row[1], reverse=True)
+
+
+class _Q3:
+    """The samples of the patients with a disease."""
+
+    def __init__(self, disease: str) -> None:
+        self.disease = disease
+        self.matches = []
+
+    def add(self, patient, samples) -> None:
+        if patient["Disease"] == self.disease:
+            for sample, _ in samples:
+                self.matches.append((patient["Patient_ID"], sample["Sample_ID"], sample["Date"],
+                                     sample["Body_Part"], sample["Sample_Type"]))
+
+    def rows(self) -> List[tuple]:
+        return sorted(self.matches, key=lambda row: row[2])
+
+
+class _Q4:
+    """The number of samples of every sample type."""
+
+    def __init__(self) -> None:
+        self.counts = Counter()
+
+    def add(self, patient, samples) -> None:
+        self.counts.update(sample["Sample_Type"] for sample, _ in samples)
+
+    def rows(self) -> List[tuple]:
+        return self.counts.most_common()
+
+
+class _Q5:
+    """Occurrences, mean and standard deviation of the qPCR of every microorganism and sample type."""
+
+    def __init__(self) -> None:
+        self.groups = defaultdict(lambda: [0, 0, 0])
+
+    def add(self, patient, samples) -> None:
+        for sample, microorganisms in samples:
+            for m in microorganisms:
+                group = self.groups[(m["Microorganism_ID"], sample["Sample_Type"])]
+                group[0] += 1
+                group[1] += m["qPCR"]
+                group[2] += m["qPCR"] * m["qPCR"]
+
+    def rows(self) -> List[tuple]:
+        rows = []
+        for (microorganism_id, sample_type), (count, total, squares) in self.groups.items():
+            mean = total / count
+            rows.append((microorganism_id, sample_type, count, mean, max(squares / count - mean * mean, 0.0) ** 0.5))
+        return sorted(rows, key=lambda row: row[0], reverse=True)
+
+
+class _Q6:
+    """The patients with Hepatitis B carrying the Hepatitis B virus, with its highest qPCR."""
+
+    def __init__(self) -> None:
+        self.matches = []
+
+    def add(self, patient, samples) -> None:
+        if patient["Disease"] != "Hepatitis B":
+            return
+        qpcr = [m["qPCR"] for _, microorganisms in samples for m in microorganisms
+                if m["Species"] == "Hepatitis B virus"]
+        if qpcr:
+            self.matches.append((patient["Patient_ID"], max(qpcr)))
+
+    def rows(self) -> List[tuple]:
+        return self.matches
+
+
+class _Q7:
+    """The species registered with more than one microorganism, with their mean sequence length."""
+
+    def __init__(self) -> None:
+        self.microorganisms = {}
+
+    def add(self, patient, samples) -> None:
+        for _, microorganisms in samples:
+            for m in microorganisms:
+                self.microorganisms[m["Microorganism_ID"]] = (m["Species"], m["Seq_length"])
+
+    def rows(self) -> List[tuple]:
+        species = defaultdict(list)
+        for name, length in self.microorganisms.values():
+            species[name].append(length)
+        return [(name, len(lengths), sum(lengths) / len(lengths)) for name, lengths in species.items() if len(lengths) > 1]
+
+
+_AGGREGATIONS = {1: _Q1, 2: _Q2, 3: _Q3, 4: _Q4, 5: _Q5, 6: _Q6, 7: _Q7}
+
+
+class XmlQueries:
+    """
+    Answers the seven queries over microbiome.xml in a single iterparse pass.
+
+    Attributes:
+        path (str): The XML document.
+        arguments (dict): Query number to the arguments of Q2 and Q3.
+
+    Methods:
+        aggregate(self, queries): Runs the pass and returns the aggregations of the queries.
+        run(self, queries): Results of the queries, computed by one pass.
+        query(self, num_qry, *args): Result of one query.
+    """
+
+    def __init__(self, path: str, arguments: Dict[int, tuple] = None) -> None:
+        self.path = path
+        self.arguments = QUERY_ARGUMENTS if arguments is None else arguments
+
+    def aggregate(self, queries=QUERIES) -> Dict[int, Any]:
+        """
+        Reads the document once, feeding every patient to the aggregation of every query.
+
+        Returns:
+            dict: Query number to its aggregation, whose rows() method returns the result rows.
+        """
+        aggregations = {num_qry: _AGGREGATIONS[num_qry](*self.arguments.get(num_qry, ())) for num_qry in queries}
+        for patient, samples in iter_patients(self.path):
+            for aggregation in aggregations.values():
+                aggregation.add(patient, samples)
+        return aggregations
+
+    def run(self, queries=QUERIES) -> Dict[int, pd.DataFrame]:
+        """
+        Answers several queries with one pass over the document.
+
+        Returns:
+            dict: Query number to its result.
+        """
+        return {num_qry: pd.DataFrame.from_records(aggregation.rows(), columns=COLUMNS[num_qry])
+                for num_qry, aggregation in self.aggregate(queries).items()}
+
+    def query(self, num_qry: int, *args) -> pd.DataFrame:
+        """
+        Answers one query, with the given arguments or with those of the instance.
+        """
+        if args:
+            return XmlQueries(self.path, {**self.arguments, num_qry: args}).run([num_qry])[num_qry]
+        return self.run([num_qry])[num_qry]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Answer the seven queries over microbiome.xml in one pass.")
+    parser.add_argument('--xml', type=str, default=os.path.join("..", "data-files", "microbiome.xml"),
+                        help='XML document')
+    parser.add_argument('-q', '--queries', nargs='+', type=int, choices=QUERIES, default=list(QUERIES),
+                        help='Queries to answer')
+    parser.add_argument('--microorganism', type=str, default=QUERY_ARGUMENTS[2][0], help='Microorganism ID of Q2')
+    parser.add_argument('--disease', type=str, default=QUERY_ARGUMENTS[3][0], help='Disease of Q3')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Directory receiving one xml_query<n>.csv per query')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = XmlQueries(args.xml, {2: (args.microorganism,), 3: (args.disease,)}).run(args.queries)
+    print(f"{len(results)} queries answered in one pass in {time.perf_counter() - start:.3f}s")
+    for num_qry, result in results.items():
+        print(f"Q{num_qry}: {len(result)} rows")
+        if args.output:
+            os.makedirs(args.output, exist_ok=True)
+            result.to_csv(os.path.join(args.output, f"xml_query{num_qry}.csv"), index=False)
+    return 0
+
+
+if __name__ == "__main__":
+    main()